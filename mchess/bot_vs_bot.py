@@ -1,11 +1,15 @@
 # a script that allows to pitch 2 bots against each other and gives back their match results
 
-import chess_v3 as my_chess
+import chess_v5 as my_chess
 
 
-# put in two different bot versions here to let them play against each other
-#import chess_bot_v2_old as my_bot1
-import chess_bot_v2 as my_bot2
+# put in two different bot versions here to let them play against each other. the same version can also play against itself with different options, to test what a single search feature is worth (A/B test)
+import chess_bot_v4 as my_bot1
+import chess_bot_v4 as my_bot2
+
+# the keyword arguments each bot is created with, on top of the thinking time. by default, the search without null move pruning and late move reductions plays against the one with them. with "ponder": True, a bot goes on searching in a helper process while the other one thinks, which only makes sense if there is a free cpu core for it, otherwise it slows down the other bot
+PLAYER1_OPTIONS = {"null_move": False, "late_move_reductions": False}
+PLAYER2_OPTIONS = {"null_move": True, "late_move_reductions": True}
 
 THINKING_TIME_STANDARD = 3
 
@@ -20,23 +24,28 @@ TEST_POSITIONS = ["rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
                 "k6r/pp2q3/1r2bp1n/3pB1pp/2pP4/P1P4P/RP1N1PP1/3QR1K1 w - - 0 25"]
 
 # this function starts a match between 2 bot instances from a custom FEN (needs to be white to move!) and gives back the match end result. setting the thinking time can be used to see if a bot gets disproportionally stronger/ weaker with more/ less time
-def bot_match(fen, thinking_time=THINKING_TIME_STANDARD, player1=my_chess.WHITE):
+def bot_match(fen, thinking_time=THINKING_TIME_STANDARD, player1=my_chess.WHITE, tables=(None, None)):
     
     # setting up the board
     b = my_chess.Board()
     b.load_FEN(fen)
 
     # loading the board into 2 bot instances
-    p1 = my_bot1.Chessbot(b, thinking_time=thinking_time)
-    p2 = my_bot2.Chessbot(b, thinking_time=thinking_time)
+    p1 = my_bot1.Chessbot(b, thinking_time=thinking_time, transpositions=tables[0], **PLAYER1_OPTIONS)
+    p2 = my_bot2.Chessbot(b, thinking_time=thinking_time, transpositions=tables[1], **PLAYER2_OPTIONS)
 
     # setting the bot that will make the first move. if we want to allow FENs with black to move, then this line would need to be adjusted
     p = p1 if player1 == my_chess.WHITE else p2
     
-    # running the match in a loop, switching the bot that is to move after each move
-    while not b.gameover:
-        b.commit_move(p.search())
-        p = p1 if p==p2 else p2
+    # running the match in a loop, switching the bot that is to move after each move. the pondering of the bots is stopped in any case, also if the match is interrupted
+    try:
+        while not b.gameover:
+            b.commit_move(p.search())
+            p.start_pondering()
+            p = p1 if p==p2 else p2
+    finally:
+        p1.close()
+        p2.close()
 
     # creating the match result
     p1win, p2win, draw = 0,0,0
@@ -55,10 +64,15 @@ def bot_match(fen, thinking_time=THINKING_TIME_STANDARD, player1=my_chess.WHITE)
 
     return (p1win, p2win, draw)
 
-# a function that runs matches for a list of FENs, for a specified number of matches per FEN. note that only even numbers should be chosen, otherwise one of the 2 bots will have the white color more often, which will bias the result in its favor
+# the transposition table of a player, which it keeps for the whole tournament. it has to be in shared memory if the player searches with helper processes
+def player_table(bot_module, options):
+    return bot_module.TranspositionTable(options.get("hash_size", bot_module.TRANSPOSITION_TABLE_MB), shared=options.get("workers", 1) > 1 or options.get("ponder", False))
+
+# a function that runs matches for a list of FENs, for a specified number of matches per FEN. note that only even numbers should be chosen, otherwise one of the 2 bots will have the white color more often, which will bias the result in its favor. each player keeps its transposition table from one match to the next, because the same positions come up again with switched colors
 def bot_tournament(positions, matchcount=2, thinking_time=THINKING_TIME_STANDARD):
     
     results = {"p1win": 0, "p2win": 0, "draw": 0}
+    tables = (player_table(my_bot1, PLAYER1_OPTIONS), player_table(my_bot2, PLAYER2_OPTIONS))
 
     for fen in TEST_POSITIONS:
 
@@ -66,7 +80,7 @@ def bot_tournament(positions, matchcount=2, thinking_time=THINKING_TIME_STANDARD
         color1 = my_chess.WHITE
         for i in range(matchcount):
 
-            p1win,p2win,draw = bot_match(fen,thinking_time,player1=color1)
+            p1win,p2win,draw = bot_match(fen,thinking_time,player1=color1,tables=tables)
             
             # documenting the results after the match
             results['p1win'] += p1win
@@ -78,6 +92,9 @@ def bot_tournament(positions, matchcount=2, thinking_time=THINKING_TIME_STANDARD
             # switching colors for next match
             color1 = my_chess.BLACK if color1 == my_chess.WHITE else my_chess.WHITE
 
+    for table in tables:
+        table.close()
+
     return results
 
 
@@ -89,6 +89,9 @@ YX2INT = my_chess.YX2INT
 INT2YX = my_chess.INT2YX
 PIECE_SPLIT = my_chess.PIECE_SPLIT
 
+# the bot keeps thinking about the reply it expects while the player is to move (see Chessbot.start_pondering), so it can answer faster if the player plays that reply
+BOT_PONDER = True
+
 
 # endregion
 
@@ -98,7 +101,7 @@ class Game:
     # setting up a game by creating a new empty board instance and a bot instance
     def __init__(self):
         self.bc = my_chess.Board()
-        self.bot = my_bot.Chessbot(self.bc)
+        self.bot = my_bot.Chessbot(self.bc, ponder=BOT_PONDER)
     
     # this function creates the window layout for pysimpleGUI by looking at the pieces on the board. each square is represented by a button, and if there is a piece on the square, it is loaded with the appropriate png image
     def setup_graphical_board(self):
@@ -109,13 +112,20 @@ class Game:
     def new_game(self, player_color):
         self.player_color = player_color
         self.bc.new_game()
-        self.game_loop()
+        self.play()
 
     # loading a custom FEN
     def game_from_FEN(self, fen, player_color):
         self.player_color = player_color
         self.bc.load_FEN(fen)
-        self.game_loop()
+        self.play()
+
+    # running the game, and stopping the pondering of the bot once the window is closed, also if the game ends with an error
+    def play(self):
+        try:
+            self.game_loop()
+        finally:
+            self.bot.close()
 
     # this is the main function that runs as long as the game continues. it shows the graphical representation of the Board instance and allows the user to make moves by clicking
     def game_loop(self):
@@ -134,8 +144,9 @@ class Game:
         # the main loop for the game
         while True:
             
+            # the GUI works with the (y,x) coordinates of the squares, so the moves are translated to 5-tuples here, and back into the move ints of the board when one is played
             if not normal_moves:
-                normal_moves, promote_moves = self.bc.split_legal_moves()
+                normal_moves, promote_moves = ([my_chess.move2tuple(m) for m in moves] for moves in self.bc.split_legal_moves())
 
             # window is freezed once game over
             if self.bc.gameover:
@@ -162,7 +173,7 @@ class Game:
                                 new_move = (selected[0],selected[1], event[0],event[1],0)
                                 selected = None
 
-                                sqlist = self.bc.commit_move(new_move)
+                                sqlist = self.bc.commit_move(self.bc.tuple2move(new_move))
                                 normal_moves, promote_moves = None, None
                                 
                                 self.update_board_display(selected)
@@ -177,7 +188,7 @@ class Game:
                                     new_move = (selected[0],selected[1], event[0],event[1],my_chess.PIECE_INIT[promote])
                                     selected = None
                                     
-                                    sqlist = self.bc.commit_move(new_move)
+                                    sqlist = self.bc.commit_move(self.bc.tuple2move(new_move))
                                     normal_moves, promote_moves = None, None
 
                                     self.update_board_display(selected)
@@ -207,6 +218,9 @@ class Game:
                     normal_moves, promote_moves = None, None
                     self.update_squares(sqlist)
                     self.hightlight_last_move()
+
+                    # the bot thinks on in the background while the window waits for the player
+                    self.bot.start_pondering()
             
             self.w.refresh()
         
@@ -222,16 +236,16 @@ class Game:
     def hightlight_last_move(self):
         
         # clear previous move highlight
-        if len(self.bc.changes) > 1:
-            previous_move = self.bc.changes[-2]['last_move']
-            fy,fx,ty,tx,_ = previous_move
+        if self.bc.ply > 1:
+            previous_move = self.bc.records[self.bc.ply-1].last_move
+            fy,fx,ty,tx,_ = my_chess.move2tuple(previous_move)
 
             self.w[(fy,fx)].update(image_filename=PIECE_TILES[self.bc.board[YX2INT[(fy,fx)]]])
             self.w[(ty,tx)].update(image_filename=PIECE_TILES[self.bc.board[YX2INT[(ty,tx)]]])
 
         # add last move highlight
-        current_move = self.bc.changes[-1]['last_move']
-        fy,fx,ty,tx,_ = current_move
+        current_move = self.bc.record.last_move
+        fy,fx,ty,tx,_ = my_chess.move2tuple(current_move)
 
         highlighted_img = convert_to_bytes(overlay(PIECE_TILES[self.bc.board[YX2INT[(fy,fx)]]], FRAME_PATH))
         self.w[(fy,fx)].update(image_data=highlighted_img)
@@ -241,7 +255,7 @@ class Game:
     # this function clears previous square highlights, except those of the last move, and highlights new squares, based on the current selection and legal moves of the selected piece
     def update_board_display(self, selected, legal_moves=None):
 
-        last_move = self.bc.changes[-1]['last_move'] if self.bc.changes else None
+        last_move = my_chess.move2tuple(self.bc.record.last_move) if self.bc.ply else None
 
         # first clearing all previous highlights except the last move by re-loading the standard tiles
         if last_move:
@@ -1,13 +1,19 @@
-# updated to work with chess_v4, zobrist hashing moved to chess module, last pure python version
+# updated to work with chess_v5, whose move generation and static exchange evaluation run in the C extension. the search runs in several processes with multiprocessing (lazy SMP workers that share the transposition table, and a helper that ponders on the opponent's time), and evaluate_batch evaluates many positions at once with numpy, which is only imported for that
 
+from array import array
+from bisect import bisect_left
 from collections import defaultdict
-from circular_dict import CircularDict
+from multiprocessing import shared_memory
+import heapq
+import multiprocessing
+import mmap
+import queue
 import random
 import time
-import datetime
 import os
 import csv
 import json
+import tempfile
 
 import sys # for performance analysis
 import cProfile # for timing and performance optimization
@@ -18,30 +24,26 @@ import chess_v5 as my_chess
 """HELPER FUNCTIONS"""
 # region
 
-# translating uci move notation to our internal move notation
-def uci2move(uci):
+# this function lets the bot try a list of puzzles and tracks its performance. so far we only use a small sample of puzzles from the lichess database. all puzzles are searched with the same transposition table, each search only makes the entries of the earlier ones replaceable. with a snapshot file, the table starts from the snapshot (if there is one) and is saved to it at the end, so that the next run over the same puzzles starts with a warm table
+def test_puzzles(snapshot=None):
 
-    from_sq_uci, to_sq_uci = uci[0:2], uci[2:]
-    from_sq, to_sq = my_chess.cnote2tuple(from_sq_uci), my_chess.cnote2tuple(to_sq_uci)
-
-    if len(uci) == 5: #promotion move
-        promotion = uci[4]
-        if to_sq[0] == 7: # white has promoted
-            promotion = promo.upper()
-
-        move = (from_sq[0],from_sq[1],to_sq[0],to_sq[1],my_chess.PIECE_INIT[promotion])
-    
-    else:
-        move = (from_sq[0],from_sq[1],to_sq[0],to_sq[1],0)
+    # preparing results
+    results = {"correct_num": 0, "incorrect_num": 0, "correct_rating": [], "incorrect_rating": []}
 
-    return move
+    transpositions = TranspositionTable(snapshot=snapshot if snapshot and os.path.exists(snapshot) else None)
 
-# this function lets the bot try a list of puzzles and tracks its performance. so far we only use a small sample of puzzles from the lichess database
-def test_puzzles():
+    # the table is also saved if the function is terminated early
+    try:
+        run_puzzles(results, transpositions)
+    finally:
+        if snapshot:
+            transpositions.save(snapshot)
+        transpositions.close()
 
-    # preparing results
-    results = {"correct_num": 0, "incorrect_num": 0, "correct_rating": [], "incorrect_rating": []}
+    return results
 
+# the loop over the puzzles of test_puzzles, which fills in the results as it goes
+def run_puzzles(results, transpositions):
     with open(PUZZLES_FILE) as in1:
         in1c = csv.DictReader(in1, delimiter=',')
 
@@ -50,16 +52,14 @@ def test_puzzles():
             rating = int(row['Rating'])
             moves = row['Moves'].split()
 
-            first_move = uci2move(moves[0])
-            solution = uci2move(moves[1])
-    
             b = my_chess.Board()
             b.load_FEN(fen)
 
-            # the first move in the csv is the last opponents move, so it has to be played before we use the bot
-            b.commit_move(first_move)
+            # the first move in the csv is the last opponents move, so it has to be played before we use the bot. the uci moves can only be translated to our move ints in the position they are played in
+            b.commit_move(b.uci2move(moves[0]))
+            solution = b.uci2move(moves[1])
 
-            bot = Chessbot(b)
+            bot = Chessbot(b, transpositions=transpositions)
             botmove = bot.search()
 
             if botmove == solution:
@@ -81,7 +81,153 @@ def test_puzzles():
             print(f"avg correct rating: {avg_corr_rating:.2f}, avg incorrect rating: {avg_incorr_rating:.2f}")
             print(f"highest solved: {highest}, lowest failed: {lowest}")
 
-    return results
+# the search of one helper process in lazy smp mode (or of the pondering process, see Chessbot.start_pondering). the helper gets its own copy of the board (through fork, or pickled by the other start methods) and attaches to the shared transposition table of the main process by its name and number of buckets. it then searches the same root as the main process, but starting at a different depth, and sends every completed iteration back as (depth, evaluation, move). None is always sent last, so the main process knows when the helper is done
+def smp_helper(board, table_name, buckets, age, options, helper_id, soft_time, hard_time, results, stop):
+    transpositions = None
+    try:
+        transpositions = TranspositionTable(name=table_name, buckets=buckets)
+        transpositions.age = age
+        bot = Chessbot(board, transpositions=transpositions, **options)
+        bot.stop_event = stop
+        bot.iterative_deepening(soft_time, hard_time, first_depth=1 + helper_id % 2, results=results)
+    finally:
+        # the main process waits for None, so it is sent even if the table could not be attached
+        results.put(None)
+        if transpositions:
+            transpositions.close()
+
+# the moves of all openings in a list of tsv files as a stream of (zobrist hash, move), each in the position it is played in. the openings are read line by line and one board is reused for all of them (load_FEN clears everything of the previous opening), so any number of files of any size can go through
+def opening_moves(filenames):
+    board = my_chess.Board()
+    for filename in filenames:
+        with open(filename) as tsv_file:
+            for row in csv.DictReader(tsv_file, delimiter='\t'):
+                board.load_FEN(my_chess.FEN_START)
+                for uci in row['uci'].split():
+                    move = board.uci2move(uci)
+                    yield board.zobr_hash, move
+                    board.commit_move(move)
+
+# builds an opening book file (see OpeningBook) from a stream of (zobrist hash, move), where the weight of a book move is how often it comes up in the stream (the number of openings that play it). the moves are counted in a dict of at most max_entries different (hash, move) pairs. once it is full, its counts are sorted and written to a temporary run file and counting starts over, so the memory stays the same no matter how large the source is. at the end, the runs are merged in sorted order, the counts of the same pair in different runs are added up, and the entries go straight to the book file
+def build_opening_book(moves, path, max_entries=None):
+    max_entries = max_entries or OPENINGS_BOOK_BUILD_ENTRIES
+    runs = []
+    counts = defaultdict(int)
+    for zobr_hash, move in moves:
+        counts[(zobr_hash, move)] += 1
+        if len(counts) >= max_entries:
+            runs.append(write_book_run(counts))
+            counts = defaultdict(int)
+
+    # the last counts dont need to go through a file
+    sorted_counts = [(zobr_hash, move, count) for (zobr_hash, move), count in sorted(counts.items())]
+    del counts
+
+    entries = array('Q')
+    previous_hash, previous_move, weight = None, None, 0
+    with open(path, 'wb') as book_file:
+        for zobr_hash, move, count in heapq.merge(sorted_counts, *[read_book_run(run) for run in runs]):
+            if (zobr_hash, move) != (previous_hash, previous_move):
+                if weight:
+                    entries.extend((previous_hash, previous_move | min(weight, 0xFFFF) << 16))
+                    if len(entries) >= 2*BOOK_RUN_BLOCK:
+                        entries.tofile(book_file)
+                        entries = array('Q')
+                previous_hash, previous_move, weight = zobr_hash, move, 0
+            weight += count
+        if weight:
+            entries.extend((previous_hash, previous_move | min(weight, 0xFFFF) << 16))
+        entries.tofile(book_file)
+
+    for run in runs:
+        run.close()
+
+# writes the counts of build_opening_book to a temporary file (removed once it is closed) as sorted triples of 64 bit ints: hash, move and count
+def write_book_run(counts):
+    run = tempfile.TemporaryFile()
+    entries = array('Q')
+    for (zobr_hash, move), count in sorted(counts.items()):
+        entries.extend((zobr_hash, move, count))
+        if len(entries) >= 3*BOOK_RUN_BLOCK:
+            entries.tofile(run)
+            entries = array('Q')
+    entries.tofile(run)
+    run.seek(0)
+    return run
+
+# the triples of a run file as a stream, read in blocks
+def read_book_run(run):
+    while True:
+        entries = array('Q', run.read(3*8*BOOK_RUN_BLOCK))
+        if not entries:
+            return
+        for i in range(0, len(entries), 3):
+            yield entries[i], entries[i+1], entries[i+2]
+
+# the opening book that all bots of the process play from. it is only opened once, a lookup doesnt change it, so the bots can share it
+def shared_opening_book():
+    global OPENING_BOOK
+    if OPENING_BOOK is None:
+        OPENING_BOOK = OpeningBook()
+    return OPENING_BOOK
+
+# converts the old json openings database (zobrist hash -> list of moves, where a move appears once for every opening that plays it) to an opening book file
+def convert_openings_json(json_path=None, book_path=None):
+    with open(json_path or OPENINGS_DATABASE_JSON) as json_file:
+        openings = json.load(json_file)
+    build_opening_book(((int(key), move) for key, moves in openings.items() for move in moves), book_path or OPENINGS_BOOK_FILE)
+
+# encodes many positions for evaluate_batch. the positions can be boards or FEN strings, and they come back as an (N, 64) int8 array with the piece integer on every square and an (N,) int8 array with the color that is to move. numpy is only needed for the batch evaluation, so it is imported here instead of at the top of the module
+def encode_positions(positions):
+    import numpy as np
+
+    squares = np.zeros((len(positions), 64), dtype=np.int8)
+    to_move = np.zeros(len(positions), dtype=np.int8)
+    fen_board = None
+    for i, position in enumerate(positions):
+        if isinstance(position, str):
+            fen_board = fen_board or my_chess.Board()
+            fen_board.load_FEN(position)
+            position = fen_board
+        squares[i] = np.frombuffer(position.board, dtype=np.int8)
+        to_move[i] = position.to_move
+
+    return squares, to_move
+
+# the static evaluation of many positions at once (see encode_positions), for analysis jobs such as evaluating whole puzzle sets or game records. it computes the same terms as Chessbot.rel_evaluate (material, the endgame weight, the king to corner bonus and both piece-square bonuses, relative to the player to move), but for all positions together in numpy arrays, and gives back an array of N evaluations that are identical to rel_evaluate of each position
+def evaluate_batch(squares, to_move):
+    import numpy as np
+
+    squares = np.asarray(squares, dtype=np.int64)
+    to_move = np.asarray(to_move, dtype=np.int64)[:, None]
+    opponent = WHITE + BLACK - to_move
+
+    # the packed piece-square scores of every square (see PIECE_SCORES), summed up separately for the player to move and the opponent. the piece color is the part of the piece integer above the piece type
+    packed = np.array(PIECE_SCORES, dtype=np.uint64)[squares, np.arange(64)]
+    colors = squares & (WHITE | BLACK)
+    own = np.where(colors == to_move, packed, 0).sum(axis=1, dtype=np.uint64)
+    opp = np.where(colors == opponent, packed, 0).sum(axis=1, dtype=np.uint64)
+    own_terms = [((own >> np.uint64(i*SCORE_BITS)) & np.uint64(SCORE_MASK)).astype(np.int64) for i in range(4)]
+    opp_terms = [((opp >> np.uint64(i*SCORE_BITS)) & np.uint64(SCORE_MASK)).astype(np.int64) for i in range(4)]
+
+    # materialcount and the endgame weight
+    materialcount = own_terms[0] - opp_terms[0]
+    endgame_weight = np.maximum(1 - (opp_terms[0] / ENDGAME_INDICATOR), 0)
+
+    # king_to_corner_endgame, with the king squares split into rank and file
+    own_king = np.argmax(squares == to_move + KING, axis=1)
+    oppo_king = np.argmax(squares == opponent + KING, axis=1)
+    own_rank, own_file = own_king >> 3, own_king & 7
+    oppo_rank, oppo_file = oppo_king >> 3, oppo_king & 7
+    oppo_dist_center = np.maximum(3-oppo_rank, oppo_rank-4) + np.maximum(3-oppo_file, oppo_file-4)
+    dist_between_kings = np.abs(own_rank-oppo_rank) + np.abs(own_file-oppo_file)
+    king_to_corner = (oppo_dist_center * 3 + 14 - dist_between_kings) * FORCE_KING_WEIGHT * endgame_weight
+
+    # opening_positioning and endgame_positioning
+    opening_bonus = (own_terms[2] - opp_terms[2]) * OPENING_BONUS_WEIGHT * (1 - endgame_weight)
+    endgame_bonus = (own_terms[3] - opp_terms[3]) * ENDGAME_BONUS_WEIGHT * endgame_weight
+
+    return materialcount + king_to_corner + opening_bonus + endgame_bonus
 
 # endregion
 
@@ -123,6 +269,9 @@ PIECE_SPLIT = my_chess.PIECE_SPLIT
 YX2INT = my_chess.YX2INT
 INT2YX = my_chess.INT2YX
 
+FLAG_CAPTURE = my_chess.FLAG_CAPTURE
+FLAG_PROMOTION = my_chess.FLAG_PROMOTION
+
 # piece values for materialcount evaluation
 PIECE_VALUES = {PAWN: 100,
             KNIGHT: 300,
@@ -135,8 +284,41 @@ PIECE_VALUES = {PAWN: 100,
 ALPHA_INITIAL = -float('inf')
 BETA_INITIAL = float('inf')
 
+# the width of the null window that principal variation search uses for all moves after the first one. the evaluation is in centipawns, so 1 is the smallest difference that matters for the move choice
+PVS_WINDOW = 1
+
+# every iteration after the first one starts with a window of this many centipawns around the evaluation of the previous iteration. if the result falls outside, that side of the window is widened by the same amount, which then doubles, until it is larger than the maximum and the side is opened completely. after the given number of failed searches, the next one uses the full window
+ASPIRATION_WINDOW = 50
+ASPIRATION_MAX = 800
+ASPIRATION_MAX_FAILS = 6
+
+# null move pruning: if the opponent could move twice in a row and still not get below beta, the real moves will be even better, so the node is cut off after a search with this much less depth. it is not tried in check (passing would be illegal), below the minimum depth, or if the player to move has less material than this besides pawns, because in such endgames passing is often better than any move (zugzwang) and the cutoff would be wrong
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_MIN_MATERIAL = 500
+
+# late move reductions: quiet moves that come late in the move ordering are rarely the best ones, so from this move on they are searched with one ply less depth first, and only searched again with the full depth if they beat alpha after all
+LMR_MIN_MOVE = 3
+LMR_MIN_DEPTH = 3
+LMR_REDUCTION = 1
+
+# evaluations beyond this are mate scores, which change by more than any window from one iteration to the next, so they are searched with the full window
+MATE_THRESHOLD = 10**5
+
 BOT_THINKING_TIME = 3
 
+# the thinking time is a soft limit: once it is over, no new iteration of the search is started. the iteration that is running may go on until the hard limit, which is this many times the thinking time if it is not given explicitly
+HARD_TIME_FACTOR = 2
+
+# the number of processes that search at the same time in lazy smp mode, including the main process. 1 searches in the main process only, without starting any helpers
+SEARCH_WORKERS = 1
+
+# the pondering helper stops on its own after this many seconds, so it doesnt keep a core busy if the opponent thinks for very long or the bot is never asked for a move again
+PONDER_MAX_TIME = 60
+
+# the clock is only read every this many nodes, because reading it at every node would cost a noticeable part of the search time. the bot searches some tens of thousands of nodes per second, so 256 nodes take around 5 to 10 milliseconds, which is how far the search can run past the hard limit (or past a stop of the main process)
+TIME_CHECK_NODES = 256
+
 FORCE_KING_WEIGHT = 10
 
 # bonus values for piece positions in the opening
@@ -207,6 +389,14 @@ for key, value in OPENING_BONUS_VALUES[WHITE].items():
 
     OPENING_BONUS_VALUES[BLACK][key] = new_bonus
 
+# the memory the transposition table of a bot takes, in MB
+TRANSPOSITION_TABLE_MB = 16
+
+# what kind of value is stored in a transposition table entry. an exact value was found if a move raised alpha without reaching beta, a lower bound comes from a beta cutoff (the position is at least this good, the other moves were not looked at) and an upper bound from a position where no move raised alpha (it is at most this good)
+EXACT = 1
+LOWER_BOUND = 2
+UPPER_BOUND = 3
+
 # how strong we consider the bonuses given in the according table
 OPENING_BONUS_WEIGHT = 1
 
@@ -252,35 +442,215 @@ ENDGAME_BONUS_WEIGHT = 0.8
 # at this materialcount will we start to consider that we are in the endgame, going linearly from 0 to 1, with 1 being reached at a materialcount of 0
 ENDGAME_INDICATOR = 1200
 
+# the parts of the evaluation that only depend on which piece stands on which square are summed up by the board itself and kept up to date in every move (see Board.set_piece_scores), instead of going through all pieces at every evaluation. the score of a piece on a square packs 4 terms of 16 bits: its material value (bits 0-15), its material value if it is not a pawn (bits 16-31, for null move pruning), its opening bonus (bits 32-47) and its endgame bonus (bits 48-63). none of them is negative, and even the sums of all pieces of a color stay far below 2^16, so they never run into each other
+SCORE_BITS = 16
+SCORE_MASK = (1 << SCORE_BITS) - 1
+
+PIECE_SCORES = [[0 for sq in range(64)] for piece in range(BLACK+QUEEN+1)]
+for color in (WHITE, BLACK):
+    for piece_type in (KING, PAWN, KNIGHT, BISHOP, ROOK, QUEEN):
+        non_pawn_value = PIECE_VALUES[piece_type] if piece_type != PAWN else 0
+        for sq in range(64):
+            PIECE_SCORES[color + piece_type][sq] = (PIECE_VALUES[piece_type] | non_pawn_value << SCORE_BITS
+                | OPENING_BONUS_VALUES[color][piece_type][sq] << 2*SCORE_BITS | ENDGAME_BONUS_VALUES[color][piece_type][sq] << 3*SCORE_BITS)
+
 # raw files paths for the openings. loading these files takes time, so it should not be done unless you want to update something in the openings or use a larger database etc.
 OPENINGS_DATABASE_PATH = os.path.join(ABS_DIR_PATH, "rawdata/openings")
 OPENINGS_DATABASE_FILES = [os.path.join(OPENINGS_DATABASE_PATH, "a.tsv"),os.path.join(OPENINGS_DATABASE_PATH, "b.tsv"),os.path.join(OPENINGS_DATABASE_PATH, "c.tsv"),os.path.join(OPENINGS_DATABASE_PATH, "d.tsv"),os.path.join(OPENINGS_DATABASE_PATH, "e.tsv")]
 
-# using this json file for quick loading of openings
+# the openings as json, the format before the opening book file. it is only read to convert it to a book file (see convert_openings_json)
 OPENINGS_DATABASE_JSON = os.path.join(ABS_DIR_PATH, "data/openings_database.json")
 
+# the opening book file the bot plays its book moves from, see OpeningBook
+OPENINGS_BOOK_FILE = os.path.join(ABS_DIR_PATH, "data/openings_book.bin")
+
+# the opening book of this process, opened the first time a bot is created and then shared by all bots (see shared_opening_book)
+OPENING_BOOK = None
+
+# building a book counts at most this many different (position, move) pairs in memory before it writes them out to a temporary file (see build_opening_book), and the temporary files and the book are written and read in blocks of this many entries
+OPENINGS_BOOK_BUILD_ENTRIES = 1 << 18
+BOOK_RUN_BLOCK = 1 << 12
+
 EXTENSION_LIMIT = 8
 
+# move ordering from earlier beta cutoffs. every ply of the search keeps the last 2 moves that caused a cutoff there (killer moves), because a move that refuted one move of the opponent often refutes its other moves too. the countermove of a move is the move that refuted it last, no matter where in the tree. the history table counts for each side and each from and to square how often (weighted with the square of the depth) a move caused a cutoff, and each count gives a bonus of HISTORY_SCALE, up to HISTORY_BIAS. captures are included, because a capture that refuted a move in one line (also in the capture search) is often good in the others as well, which their piece values alone dont tell
 KILLER_BIAS = 500
+COUNTERMOVE_BIAS = 400
+HISTORY_BIAS = 450
+HISTORY_SCALE = 16
+
+# the plies of the search that have their own killer slots, deeper plies share the last slots. it is also the deepest iteration that iterative deepening starts
+MAX_SEARCH_PLY = 128
+
+# when a history count reaches the maximum, all counts are halved, and they are also halved at the start of every search, so that older cutoffs count less than new ones
+HISTORY_MAX = 1 << 16
 
 # endregion
 
 
+# the transposition table remembers positions that were already searched, so that they dont need to be searched again if they come up through a different move order, in the next iteration or in the next search (a table can also be passed from one bot to the next, and saved to a snapshot file). the table is allocated once with a fixed size and every entry is 2 ints of 64 bits in one array: the zobrist hash of the position (stored xored with the data int, see below) and a packed data int with the best move (bits 0-15), the depth (bits 16-23), the bound (bits 24-25), the age (bits 26-31, the search it was stored in) and the score (bits 32-63, in 1/16 centipawns with an offset, so it is never negative). the entries are grouped in buckets of 2: the first one keeps the entry with the highest depth (unless it is from an older search), the second one always takes the newest entry, so that deep results survive while shallow ones still have a place to go. a shared table lives in shared memory instead of an array, so the processes of a lazy smp search can all read and write it. there is no lock, so a process may read an entry while another one is writing it and get the hash of one entry with the data of another. because the hash is stored xored with the data, such a torn entry doesnt match its hash anymore and is simply not found
+class TranspositionTable:
+
+    ENTRY_BYTES = 16
+    SCORE_SCALE = 16
+    SCORE_OFFSET = 1 << 31
+
+    # with shared, a new table is created in shared memory, with name, an existing shared table is attached to. with snapshot, the table starts with the entries of a snapshot file (see save) and has its size. buckets gives the size directly instead of size_mb, a process that attaches to a table has to use the number of buckets of the table, otherwise it would look for the positions in different buckets
+    def __init__(self, size_mb=TRANSPOSITION_TABLE_MB, shared=False, name=None, snapshot=None, buckets=None):
+        size = size_mb * 2**20 if snapshot is None else os.path.getsize(snapshot)
+        self.buckets = buckets or max(1, size // (2*self.ENTRY_BYTES))
+        self.age = 0
+        self.memory = None
+        self.mapping = None
+        if shared or name:
+            self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=self.buckets * 2*self.ENTRY_BYTES)
+            self.owner = name is None
+            self.table = self.memory.buf.cast('Q')
+            if snapshot is not None and self.owner:
+                with open(snapshot, 'rb') as snapshot_file:
+                    snapshot_file.readinto(self.memory.buf)
+        elif snapshot is not None:
+            # the snapshot file is mapped into memory copy on write: the pages are only read from the file when the search touches them, the entries that are stored go to private copies of the pages and the file itself stays as it is. processes that load the same snapshot share the pages that none of them changed
+            with open(snapshot, 'rb') as snapshot_file:
+                self.mapping = mmap.mmap(snapshot_file.fileno(), self.buckets * 2*self.ENTRY_BYTES, access=mmap.ACCESS_COPY)
+            self.table = memoryview(self.mapping).cast('Q')
+        else:
+            self.table = array('Q', bytes(self.buckets * 2*self.ENTRY_BYTES))
+
+    # a shared table has to be closed by every process that uses it, and is removed from the system when the process that created it closes it. a table from a snapshot gives back its mapping of the file
+    def close(self):
+        if self.memory:
+            self.table.release()
+            self.memory.close()
+            if self.owner:
+                self.memory.unlink()
+            self.memory = None
+        elif self.mapping:
+            self.table.release()
+            self.mapping.close()
+            self.mapping = None
+
+    # saving the table to a snapshot file, which is simply all entries as they are in memory. the ages of the entries are kept, but a table that starts from the snapshot counts its searches from 0 again, so they are only as replaceable as their depth says. the file is written under a temporary name and then renamed, so that a table that was started from the same file (and still maps it) is not affected
+    def save(self, path):
+        with open(path + ".tmp", 'wb') as snapshot_file:
+            snapshot_file.write(self.table)
+        os.replace(path + ".tmp", path)
+
+    # a new search makes all entries of the previous searches replaceable, without having to clear the table
+    def new_search(self):
+        self.age = (self.age + 1) & 63
+
+    # returns (depth, score, bound, best move) for a position, or None if it is not in the table. an empty entry has a data int of 0, because the bound is never 0
+    def probe(self, zobr_hash):
+        table = self.table
+        i = (zobr_hash % self.buckets) * 4
+        data = table[i+1]
+        if not data or table[i] ^ data != zobr_hash:
+            data = table[i+3]
+            if not data or table[i+2] ^ data != zobr_hash:
+                return None
+        return ((data >> 16) & 255, ((data >> 32) - self.SCORE_OFFSET) / self.SCORE_SCALE, (data >> 24) & 3, (data & 0xFFFF) or None)
+
+    def store(self, zobr_hash, depth, score, bound, move):
+        table = self.table
+        i = (zobr_hash % self.buckets) * 4
+        data = (move or 0) | (min(depth, 255) << 16) | (bound << 24) | (self.age << 26) | ((round(score * self.SCORE_SCALE) + self.SCORE_OFFSET) << 32)
+
+        # the depth preferred entry is replaced by the same position, a deeper or equally deep search, or anything if it is old or empty. the entry it held moves on to the always replace slot instead of being lost. if it was the same position, an older copy of the position in the always replace slot is cleared, so that probe cant find its outdated bound anymore
+        old_key, old = table[i], table[i+1]
+        if not old or old_key ^ old == zobr_hash or (old >> 26) & 63 != self.age or depth >= (old >> 16) & 255:
+            table[i], table[i+1] = zobr_hash ^ data, data
+            if old and old_key ^ old != zobr_hash:
+                table[i+2], table[i+3] = old_key, old
+            elif table[i+3] and table[i+2] ^ table[i+3] == zobr_hash:
+                table[i+2], table[i+3] = 0, 0
+        else:
+            table[i+2], table[i+3] = zobr_hash ^ data, data
+
+
+# the opening book: a flat binary file of entries of 2 ints of 64 bits, the zobrist hash of a position and a packed int with a book move (bits 0-15) and its weight (bits 16-31, how many openings play it), sorted by the hash and then the move. the file is mapped into memory instead of being read and parsed, so opening a book costs next to nothing, the pages are only read when a lookup touches them, and all processes that open the same book share them. a position is looked up by binary search over the hashes, which are every other int of the file
+class OpeningBook:
+
+    def __init__(self, path=OPENINGS_BOOK_FILE):
+        self.mapping = None
+        if os.path.getsize(path):
+            with open(path, 'rb') as book_file:
+                self.mapping = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.entries = memoryview(self.mapping).cast('Q')
+        else:
+            self.entries = memoryview(array('Q'))
+        self.hashes = self.entries[0::2]
+
+    def close(self):
+        if self.mapping:
+            self.hashes.release()
+            self.entries.release()
+            self.mapping.close()
+            self.mapping = None
+
+    # the book moves of a position as a list of (move, weight), an empty list if the position is not in the book
+    def lookup(self, zobr_hash):
+        hashes, entries = self.hashes, self.entries
+        book_moves = []
+        i = bisect_left(hashes, zobr_hash)
+        while i < len(hashes) and hashes[i] == zobr_hash:
+            data = entries[2*i + 1]
+            book_moves.append((data & 0xFFFF, data >> 16))
+            i += 1
+        return book_moves
+
+    # a random book move of a position, chosen by the weights, or None if the position is not in the book
+    def choose(self, zobr_hash):
+        book_moves = self.lookup(zobr_hash)
+        if not book_moves:
+            return None
+        return random.choices([move for move, weight in book_moves], weights=[weight for move, weight in book_moves])[0]
+
+
+# raised from inside the search once the hard time limit is reached, so that the running iteration is left from any depth of the recursion at once
+class SearchTimeout(Exception):
+    pass
+
+
 class Chessbot:
 
     # connecting the bot with a board and also setting bot parameters and variables
-    def __init__(self, board, thinking_time=BOT_THINKING_TIME):
+    def __init__(self, board, thinking_time=BOT_THINKING_TIME, hash_size=TRANSPOSITION_TABLE_MB, workers=SEARCH_WORKERS, transpositions=None, null_move=True, late_move_reductions=True, ponder=False):
         
-        self.thinking_time = datetime.timedelta(seconds=thinking_time)
-        self.killer_moves = set()
-
-        # preparing circular dict for transposition table
-        self.transpositions = CircularDict(maxlen=0.5 * 10**6)
-
-        # loading openings database
+        self.thinking_time = thinking_time
+
+        # the move ordering tables. killers has 2 slots per search ply, countermoves and history are indexed by the from and to square of a move (its lowest 12 bits), plus 4096 if black is to move
+        self.killers = array('H', bytes(2*2*MAX_SEARCH_PLY))
+        self.countermoves = array('H', bytes(2*2*4096))
+        self.history = array('Q', bytes(8*2*4096))
+
+        # the pruning and reduction techniques of the search can be switched off, to measure what they are worth in bot_vs_bot
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+
+        # with more than one worker, the bot searches in lazy smp mode, and with ponder, it goes on searching in a helper process while the opponent thinks. in both cases its transposition table has to be in shared memory
+        self.workers = workers
+        self.ponder = ponder
+        self.pondering = None
+        self.stop_event = None
+
+        # preparing the transposition table, hash_size is its size in MB. an existing table can be passed in, which is how the helpers of a lazy smp search use the shared table of the main process, and how the entries of one bot are kept for the next one. a table that is passed in has to be in shared memory for lazy smp and pondering, and it is closed by whoever created it, not by the bot
+        if transpositions is not None and transpositions.memory is None and (workers > 1 or ponder):
+            raise ValueError("lazy smp and pondering need a transposition table in shared memory (TranspositionTable(shared=True))")
+        self.own_transpositions = transpositions is None
+        self.transpositions = transpositions or TranspositionTable(hash_size, shared=workers > 1 or ponder)
+
+        # opening the opening book
         self.load_openings_database()
 
         self.board = board
+        board.set_piece_scores(PIECE_SCORES)
+
+    # stopping the pondering and giving back the shared memory of the transposition table, if the bot created the table. only needed in lazy smp and ponder mode, but can always be called once the bot is not used anymore
+    def close(self):
+        self.stop_pondering(0)
+        if self.own_transpositions:
+            self.transpositions.close()
 
     # random (legal) move, just for testing the bot initially
     def random_move(self):
@@ -289,92 +659,228 @@ class Chessbot:
             return random.choice(self.board.legal_moves())
 
     def load_openings_database(self):
-        with open(OPENINGS_DATABASE_JSON) as json_file:
-            temp_db = json.load(json_file)
+        self.opening_book = shared_opening_book()
 
-        self.openings_database = {int(key): [tuple(m) for m in value] for key, value in temp_db.items()}
+    # building an opening book from the openings of several tsv files, see build_opening_book. this function only needs to be run if you change the zobrist mask or the openings. otherwise, just opening the already existing book file is of course much faster. the book is written under a new name, so that the book in use is not replaced by accident
+    def create_openings_database(self, filenames=None, path="new_openings_book.bin"):
+        build_opening_book(opening_moves(filenames or OPENINGS_DATABASE_FILES), path)
 
-    # loading a selection of openings from several tsv files and converting them to internal move notation, saving as json. this function only needs to be run if you change the zobrist mask. otherwise, just loading in the already existing json file is of course much faster
-    def create_openings_database(self):
-        openings_database = defaultdict(list)
+    # the main search function wrapper. it iteratively increases the search depth, taking the best previously found move as the starting move for the next iteration. no new iteration is started after the soft time limit (the thinking time of the bot, unless given here), and an iteration that is still running at the hard time limit is aborted. its result is then thrown away, because a half searched depth may have missed the best reply to its best move, and the best move of the last completed depth is returned instead
+    def search(self, soft_time=None, hard_time=None):
 
-        for filename in OPENINGS_DATABASE_FILES:
+        soft_time = self.thinking_time if soft_time is None else soft_time
+        hard_time = soft_time * HARD_TIME_FACTOR if hard_time is None else hard_time
 
-            with open(filename) as in1:
-                in1c = csv.DictReader(in1, delimiter='\t')
+        # if the bot was pondering on the reply that was actually played, the search is already done (or finished in the rest of the thinking time)
+        depth, best_eval, best_move = self.stop_pondering(soft_time)
+        if best_move is not None:
+            print(f"ponder hit: depth {depth}")
+            return best_move
 
-                for row in in1c:
-                    # resetting to the starting position for each opening
-                    self.board = my_chess.Board()
-                    self.board.load_FEN(my_chess.FEN_START)
-                    current_hash = self.board.zobr_hash
+        # if we are still in the opening, lets select a random valid bookmove from the opening database, if we find the current position in it
+        if self.board.full_moves <= 15:
+            bookmove = self.opening_book.choose(self.board.zobr_hash)
+            if bookmove is not None:
+                return bookmove
 
-                    uci_moves = row['uci'].strip('\n').split()
-                    for m in uci_moves:
+        # another bot (or another version of this one) may have set its own scores on the same board
+        if self.board.piece_scores is not PIECE_SCORES:
+            self.board.set_piece_scores(PIECE_SCORES)
 
-                        # converting to our internal move notation
-                        move = uci2move(m)
+        # the entries of earlier searches can now be replaced, the killers of the last search belong to different plies and are forgotten, and the history counts become less important
+        self.transpositions.new_search()
+        self.killers = array('H', bytes(2*2*MAX_SEARCH_PLY))
+        self.age_history()
 
-                        # appending the move to the current position as a possibility
-                        openings_database[current_hash].append(move)
+        if self.workers > 1:
+            depth, best_eval, best_move = self.smp_search(soft_time, hard_time)
+        else:
+            depth, best_eval, best_move = self.iterative_deepening(soft_time, hard_time)
+        return best_move
 
-                        self.board.commit_move(move)
-                        current_hash = self.board.zobr_hash
+    # the iterative deepening loop of the search, starting at first_depth and going no deeper than MAX_SEARCH_PLY. it gives back (depth, evaluation, move) of the deepest completed iteration. with a results queue (in a lazy smp helper), every completed iteration is sent there instead of being printed
+    def iterative_deepening(self, soft_time, hard_time, first_depth=1, results=None):
+
+        # setting the stop marks
+        start = time.perf_counter()
+        soft_stop, hard_stop = start + soft_time, start + hard_time
+        self.nodes = 0
+
+        # when the search is aborted, the moves that are still on the board are taken back down to this ply. the killers are indexed by the ply counted from here
+        root_ply = self.root_ply = self.board.ply
+
+        depth = first_depth
+        prev_best_move, prev_eval = None, None
+        completed = (0, None, None)
+        while depth <= MAX_SEARCH_PLY and (depth == first_depth or time.perf_counter() < soft_stop):
+
+            # the first iteration always runs to the end, so there is a move to return in any case (unless a lazy smp helper is stopped by the main process)
+            self.hard_stop = hard_stop if depth > first_depth else float('inf')
+            try:
+                best_eval, best_move = self.aspiration_search(depth, prev_eval, prev_best_move)
+            except SearchTimeout:
+                while self.board.ply > root_ply:
+                    self.board.undo_move(commited=True)
+                if results is None:
+                    print(f"depth {depth} aborted after {self.nodes} nodes")
+                break
+            
+            completed = (depth, best_eval, best_move)
+            if results is not None:
+                results.put(completed)
+            else:
+                # print debug info
+                print(depth)
+                print(best_eval)
+                print(best_move)
 
+            # a root without a move (a position that is already drawn or lost) gives the same result at every depth, so there is nothing to deepen
+            if best_move is None:
+                break
 
-        # serializing json
-        json_object = json.dumps(openings_database, indent=4)
-        
-        # writing to sample.json
-        with open("new_openings_database.json", "w") as outfile:
-            outfile.write(json_object)
-        # clearing board variable just in case
-        
-        del self.board
+            # starting with the best found move for the next iteration to maximize alpha-beta-pruning, and with a window around its evaluation
+            prev_best_move, prev_eval = best_move, best_eval
 
-    # the main search function wrapper. it iteratively increases the search depth, taking the best previously found move as the starting move for the next iteration. so far it will stop the iteration after the thinking time is reached, but will still complete the last search iteration. it would also be possible to abort the search, but that is more tricky and the bot is not that fast anyways, so we use this implementation for now
-    def search(self):
+            depth += 1
 
-        # if we are still in the opening, lets select a random valid bookmove from the opening database, if we find the current position in it
-        if self.board.full_moves <= 15:
-            current_hash = self.board.zobr_hash
-            if current_hash in self.openings_database:
-                bookmoves = self.openings_database[current_hash]
-                return random.choice(bookmoves)
+        return completed
 
-        # setting the stop mark
-        stop = datetime.datetime.now() + self.thinking_time
+    # searching the root with an aspiration window: most of the time the evaluation changes only a little from one depth to the next, and a narrow window around the previous one prunes a lot more than the full window. a search that fails high or low outside the window gives back no move (the search is fail hard), so it is repeated with a wider window on the side where it failed
+    def aspiration_search(self, depth, prev_eval, prev_best_move):
+        if prev_eval is None or abs(prev_eval) >= MATE_THRESHOLD:
+            return self.recursive_search(depth, ALPHA_INITIAL, BETA_INITIAL, start_move=prev_best_move)
 
-        depth = 1
-        prev_best_move = None
-        while datetime.datetime.now() < stop:
-            
-            best_eval, best_move = self.recursive_search(depth, ALPHA_INITIAL, BETA_INITIAL, start_move=prev_best_move)
-            
-            # print debug info
-            print(depth)
-            print(best_eval)
-            print(best_move)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = prev_eval - delta, prev_eval + delta
+        fails = 0
+        while True:
+            best_eval, best_move = self.recursive_search(depth, alpha, beta, start_move=prev_best_move)
 
-            # starting with the best found move for the next iteration to maximize alpha-beta-pruning
-            prev_best_move = best_move
+            # a score inside the window is the real one, even without a move (a root that is already drawn has none, and no wider window would change that)
+            if best_move is not None or alpha < best_eval < beta or (alpha == ALPHA_INITIAL and beta == BETA_INITIAL):
+                return (best_eval, best_move)
 
-            depth += 1
-        
-        # when we move on from this search, the killer moves storage needs to be cleared
-        self.killer_moves.clear()
-        return best_move
+            fails += 1
+            if fails >= ASPIRATION_MAX_FAILS:
+                alpha, beta = ALPHA_INITIAL, BETA_INITIAL
+            elif best_eval <= alpha:
+                alpha = alpha - delta if delta < ASPIRATION_MAX else ALPHA_INITIAL
+            else:
+                beta = beta + delta if delta < ASPIRATION_MAX else BETA_INITIAL
+            delta *= 2
+
+    # lazy smp: the helper processes search the same root as the main process, each on its own copy of the board, and they all share the transposition table. every process searches the full tree, but the entries that one of them stores let the others skip positions, so together they get deeper than one process alone. half of the helpers start one depth ahead of the main process, so that the processes spread out over different depths instead of searching the same nodes in the same order. once the main process is done, the helpers are stopped and the deepest completed result of any process is returned, the one of the main process if it is as deep as the others
+    def smp_search(self, soft_time, hard_time):
+        results, stop = multiprocessing.Queue(), multiprocessing.Event()
+        helpers = [multiprocessing.Process(target=smp_helper, args=(self.board, self.transpositions.memory.name, self.transpositions.buckets, self.transpositions.age, self.helper_options(), helper_id, soft_time, hard_time, results, stop), daemon=True) for helper_id in range(1, self.workers)]
+        for helper in helpers:
+            helper.start()
+
+        best = self.iterative_deepening(soft_time, hard_time)
+        stop.set()
+
+        # the queue is read until every helper has sent its last message, before the helpers are joined. a process that still has messages in a queue cannot end
+        finished = 0
+        while finished < len(helpers):
+            result = results.get()
+            if result is None:
+                finished += 1
+            elif result[0] > best[0]:
+                best = result
+        for helper in helpers:
+            helper.join()
+
+        print(f"lazy smp: depth {best[0]} with {self.workers} workers")
+        return best
+
+    # the options a helper process creates its bot with, so that it searches the same way as this bot
+    def helper_options(self):
+        return {"null_move": self.null_move, "late_move_reductions": self.late_move_reductions}
+
+    # pondering: once the bot has played its move, it can go on thinking while the opponent is to move. the reply it expects is the best move of the opponent from its own search, which is still in the transposition table, and a helper process (the same as in lazy smp) searches the position after that reply in the shared table, until the next search of the bot stops it (or at most PONDER_MAX_TIME seconds, and never deeper than MAX_SEARCH_PLY). the bot itself is free in the meantime, so this function returns right away. it does nothing if the bot was not created with ponder, or if no reply can be guessed
+    def start_pondering(self):
+        if not self.ponder or self.pondering or self.board.gameover:
+            return
+
+        entry = self.transpositions.probe(self.board.zobr_hash)
+        if not entry or not entry[3] or entry[3] not in self.board.legal_moves():
+            return
+
+        # the pondering counts as the next search, so its entries are not replaced as old ones. the helper gets the board with the expected reply on it, which is taken back right after the helper started (it has its own copy then, through fork or pickling)
+        self.transpositions.new_search()
+        self.board.commit_move(entry[3])
+        if not self.board.gameover:
+            results, stop = multiprocessing.Queue(), multiprocessing.Event()
+            helper = multiprocessing.Process(target=smp_helper, args=(self.board, self.transpositions.memory.name, self.transpositions.buckets, self.transpositions.age, self.helper_options(), 0, PONDER_MAX_TIME, PONDER_MAX_TIME, results, stop), daemon=True)
+            helper.start()
+            self.pondering = (helper, results, stop, self.board.zobr_hash, time.perf_counter())
+        self.board.undo_move(commited=True)
+
+    # stopping the pondering helper (if there is one) and giving back (depth, evaluation, move) of its deepest completed iteration, if it searched the position that is on the board now (a ponder hit), otherwise (0, None, None). on a ponder hit, the helper first gets the rest of the thinking time, counted from the start of the pondering, so if the opponent took longer than that to move, the result comes back right away
+    def stop_pondering(self, soft_time):
+        best = (0, None, None)
+        if not self.pondering:
+            return best
+
+        helper, results, stop, ponder_hash, start = self.pondering
+        self.pondering = None
+        hit = self.board.zobr_hash == ponder_hash
+
+        finished = False
+        while hit and not finished:
+            remaining = start + soft_time - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                result = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if result is None:
+                finished = True
+            elif result[0] > best[0]:
+                best = result
+        stop.set()
+
+        # as in smp_search, the queue has to be read to the end before the helper can be joined
+        while not finished:
+            result = results.get()
+            if result is None:
+                finished = True
+            elif hit and result[0] > best[0]:
+                best = result
+        helper.join()
+
+        return best
+
+    # counting a node and looking at the clock every once in a while. the search is aborted at the hard time limit, or when a lazy smp helper is told to stop
+    def count_node(self):
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_NODES == 0:
+            if time.perf_counter() > self.hard_stop or (self.stop_event is not None and self.stop_event.is_set()):
+                raise SearchTimeout
 
     # the core search function. it goes through every possible move combination up until the depth limit and uses alpha-beta-pruning to save time. this means, that once a move is found that is better for the opponent, than any move that was previously looked at, then we will not consider this move at all (prune it!) because it gives us a worse position.
     def recursive_search(self, depth, alpha, beta, start_move=None, ext_count=0):
 
+        # counting the node and looking at the clock every once in a while
+        self.count_node()
+
         best_move = None
         current_hash = self.board.zobr_hash
 
-        # early termination if the position was already evaluated
-        if current_hash in self.transpositions:
-            if self.transpositions[current_hash][0] >= depth:
-                return self.transpositions[current_hash][1]
+        # early termination if the position was already searched deep enough. a bound can only end the search if it is outside the alpha beta window, otherwise its best move is still the best guess to search first
+        entry = self.transpositions.probe(current_hash)
+        if entry:
+            tt_depth, tt_score, tt_bound, tt_move = entry
+            if tt_depth >= depth:
+                if tt_bound == EXACT:
+                    return (tt_score, tt_move)
+                if tt_bound == LOWER_BOUND and tt_score >= beta:
+                    return (beta, None)
+                if tt_bound == UPPER_BOUND and tt_score <= alpha:
+                    return (alpha, None)
+            if start_move is None:
+                start_move = tt_move
 
         # if we dont include this condition, the bot can repeat moves in a winning position until the game is drawn
         if self.board.gameover:
@@ -384,31 +890,47 @@ class Chessbot:
         # upon reaching the depth limit, we start another search, that only looks at captures
         if depth == 0:
             return self.search_all_captures(alpha, beta)
+
+        # null move pruning, only in the null window nodes of the principal variation search, and never twice in a row (the last move of a null move is 0)
+        if self.null_move and depth >= NULL_MOVE_MIN_DEPTH and beta - alpha <= PVS_WINDOW and abs(beta) < MATE_THRESHOLD and not self.board.in_check and self.board.record.last_move != 0 and self.non_pawn_material() >= NULL_MOVE_MIN_MATERIAL:
+            self.board.make_null_move()
+            evaluation = -self.recursive_search(depth-1-NULL_MOVE_REDUCTION, -beta, -beta+PVS_WINDOW, ext_count=ext_count)[0]
+            self.board.undo_move(commited=True)
+            if evaluation >= beta:
+                self.transpositions.store(current_hash, depth, beta, LOWER_BOUND, None)
+                return (beta, None)
         
-        # if the move list is empty, that means it must be checkmate (if we also stand in check at the same time). we dont need to check for stalemate, as this is already covered by the gameover == 0.5 condition earlier
-        moves = self.board.legal_moves()
-        if not moves:
-            if self.board.in_check:
-                return (-(10**6+depth), None)
-        
-        # the moves are ordered from best to worse to take maximum advantage of the alpha-beta-pruning
-        ordered_moves = self.order_moves(moves, start_move)
+        # the moves are tried from best to worse (as far as we can guess) to take maximum advantage of the alpha-beta-pruning, and the move picker only generates and scores them as far as they are needed
+        ply = min(self.board.ply - self.root_ply, MAX_SEARCH_PLY-1)
+        reduce_late_moves = self.late_move_reductions and depth >= LMR_MIN_DEPTH and not self.board.in_check
 
         # trying every move and then returning the inverse of the opponents evaluation (note that we also pass the inverse of alpha and beta in switched positions for that), then undoing the move
-        for move in ordered_moves:
+        i = -1
+        for i, move in enumerate(self.pick_moves(start_move, ply)):
             self.board.commit_move(move)
 
             # certain move types are more promising than others and can warrant an extension of search depth
             extension = self.calculate_extension(move, ext_count)
+            new_depth, new_ext_count = depth-1+extension, ext_count+extension
 
-            evaluation, _ = self.recursive_search(depth-1+extension, -beta, -alpha, ext_count=(ext_count+extension))
-            evaluation = -evaluation
+            # principal variation search: with good move ordering the first move is usually the best one, so only the first move is searched with the full window. the later moves only have to be proven worse, which a search with a null window just above alpha does much faster. only if a move turns out better than alpha after all, it is searched again with the full window to get its real evaluation
+            if i == 0:
+                evaluation = -self.recursive_search(new_depth, -beta, -alpha, ext_count=new_ext_count)[0]
+            else:
+                # late quiet moves are searched with less depth first (unless they give check, which is extended instead). only a move that beats alpha like that gets the full depth
+                reduction = LMR_REDUCTION if reduce_late_moves and i >= LMR_MIN_MOVE and not extension and not move >> 12 & (FLAG_CAPTURE | FLAG_PROMOTION) and move != self.killers[2*ply] and move != self.killers[2*ply+1] else 0
+                evaluation = -self.recursive_search(new_depth-reduction, -alpha-PVS_WINDOW, -alpha, ext_count=new_ext_count)[0]
+                if reduction and evaluation > alpha:
+                    evaluation = -self.recursive_search(new_depth, -alpha-PVS_WINDOW, -alpha, ext_count=new_ext_count)[0]
+                if alpha < evaluation < beta and beta - alpha > PVS_WINDOW:
+                    evaluation = -self.recursive_search(new_depth, -beta, -alpha, ext_count=new_ext_count)[0]
             self.board.undo_move(commited=True)
 
             # move was too good, opponent will avoid this position (alpha-beta-pruning)
             if evaluation >= beta:
-                # adding this move to the killer move set, for later consideration
-                self.killer_moves.add(move)
+                # the move that caused the cutoff is remembered for the move ordering
+                self.update_cutoff(move, ply, depth)
+                self.transpositions.store(current_hash, depth, beta, LOWER_BOUND, move)
                 return (beta, None)
         
             # move is better than previously found move
@@ -416,13 +938,20 @@ class Chessbot:
                 alpha = evaluation
                 best_move = move
             
-        # storing the newly found evaluation and best move in the transposition table before returning
-        self.transpositions[current_hash] = (depth,(alpha, best_move))
+        # if there was no move, that means it must be checkmate (if we also stand in check at the same time). we dont need to check for stalemate, as this is already covered by the gameover == 0.5 condition earlier
+        if i < 0 and self.board.in_check:
+            return (-(10**6+depth), None)
+
+        # storing the newly found evaluation and best move in the transposition table before returning. a node without moves that isnt marked as game over (a position loaded in stalemate) can leave alpha at the infinite bound of the root window, which the table has no room for, so that is not stored
+        if alpha != ALPHA_INITIAL:
+            self.transpositions.store(current_hash, depth, alpha, EXACT if best_move else UPPER_BOUND, best_move)
         return (alpha, best_move)
 
     # this search only considers capture moves. the rest of the functionality is identical to the search function, but notably this one doesnt have a depth limit and will continue until there are no more captures possible
     def search_all_captures(self, alpha, beta):
 
+        self.count_node()
+
         # see if any good non-captures exist first, otherwise we might return a bad evaluation of a good position if only bad captures are available
         evaluation = self.rel_evaluate()
         if evaluation >= beta:
@@ -430,75 +959,156 @@ class Chessbot:
 
         alpha = max(alpha, evaluation)
 
+        # the captures are ordered by their static exchange evaluation, and the ones that lose material by it are not searched at all. they could only be good because of something else than the material on their target square, which this search doesnt look for anyway, and skipping them keeps long capture sequences in tactical positions from exploding
         capture_moves = self.board.legal_moves(onlycaptures=True)
-        ordered_capture_moves = self.order_moves(capture_moves)
+        exchange = self.board.static_exchange(capture_moves)
+        ordered_capture_moves = [(score, move) for (score, move), value in zip(self.score_moves(capture_moves, exchange=exchange), exchange) if value >= 0]
+        ordered_capture_moves.sort(reverse=True)
 
-        for move in ordered_capture_moves:
+        for _, move in ordered_capture_moves:
             self.board.commit_move(move)
             evaluation, _ = self.search_all_captures(-beta, -alpha)
             evaluation = -evaluation
             self.board.undo_move(commited=True)
 
             if evaluation >= beta:
-                self.killer_moves.add(move)
                 return (beta, None)
             
             alpha = max(alpha, evaluation)
 
         return (alpha, None)
 
-    # this function orders moves from best to worse and is a support function for our search. of course we dont know in advance how good a move is, so we need to guess.
-    def order_moves(self, movelist, start_move=None):
+    # remembering a move that caused a beta cutoff at a ply of the search in the history table, and if it is a quiet move, also as killer move and as countermove to the move before it. the move picker only tries quiet killers and countermoves, a capture there would only push out a quiet one
+    def update_cutoff(self, move, ply, depth):
+        side = 4096 if self.board.to_move == BLACK else 0
+        if not move >> 12 & FLAG_CAPTURE:
+            killers = self.killers
+            if killers[2*ply] != move:
+                killers[2*ply+1] = killers[2*ply]
+                killers[2*ply] = move
+
+            last_move = self.board.record.last_move
+            if last_move:
+                self.countermoves[side + (last_move & 4095)] = move
+
+        i = side + (move & 4095)
+        self.history[i] += depth * depth
+        if self.history[i] >= HISTORY_MAX:
+            self.age_history()
+
+    # halving all history counts
+    def age_history(self):
+        self.history = array('Q', [count >> 1 for count in self.history])
+
+    # the move picker of the search. instead of generating, scoring and sorting all moves before the first one is tried, it gives out the moves one at a time in stages, and the work of a stage is only done once the search asks for its first move. most nodes are cut off by the move from the transposition table or by a good capture, and then the quiet moves are never generated or scored. the stages are: the move from the table (start_move), the captures that dont lose material by their guessed score, the killer moves and the countermove that are quiet, the other quiet moves and last the captures that lose material by their static exchange evaluation. the moves are scored with score_moves
+    def pick_moves(self, start_move, ply):
+        board = self.board
+
+        # the move from the table could belong to a different position with the same hash, so it is only tried if it is legal here. that is checked on its own, so a cutoff by this move doesnt generate any other moves (the board is the same again whenever the search asks for the next move)
+        if start_move:
+            if board.is_legal(start_move):
+                yield start_move
+            else:
+                start_move = 0
+
+        # the captures are scored by their static exchange evaluation, and the ones that lose material by it come last
+        captures = board.legal_moves(onlycaptures=True)
+        exchange = board.static_exchange(captures)
+        scored_captures = [(score, value, move) for (score, move), value in zip(self.score_moves(captures, ply, exchange), exchange)]
+        scored_captures.sort(reverse=True)
+        bad_captures = []
+        for score, value, move in scored_captures:
+            if move == start_move:
+                continue
+            if value < 0:
+                bad_captures.append(move)
+            else:
+                yield move
 
-        ordered_moves = []
+        quiets = board.quiet_moves()
 
-        for move in movelist:
-            y_from, x_from, y_to, x_to, prom = move
+        # a killer move or countermove from a different position is only tried if it is a legal quiet move here
+        side = 4096 if board.to_move == BLACK else 0
+        last_move = board.record.last_move
+        special = [self.killers[2*ply], self.killers[2*ply+1], self.countermoves[side + (last_move & 4095)] if last_move else 0]
+        for i, move in enumerate(special):
+            if move and move != start_move and move not in special[:i] and not move >> 12 & FLAG_CAPTURE and move in quiets:
+                yield move
+            else:
+                special[i] = 0
 
-            move_score_guess = 0
-            moved_piece_type = PIECE_SPLIT[self.board.board[YX2INT[(y_from,x_from)]]][1]
-            captured_piece_type = PIECE_SPLIT[self.board.board[YX2INT[(y_to,x_to)]]][1]
+        scored_quiets = self.score_moves(quiets, ply)
+        scored_quiets.sort(reverse=True)
+        for score, move in scored_quiets:
+            if move != start_move and move not in special:
+                yield move
 
-            # capturing a high value piece with a low value piece is usually good
-            if captured_piece_type != NO_PIECE:
-                move_score_guess += PIECE_VALUES[captured_piece_type] - PIECE_VALUES[moved_piece_type]
-            
-            # promoting a pawn is usually also strong
-            if prom != 0:
-                move_score_guess += PIECE_VALUES[PIECE_SPLIT[prom][1]]
-            
-            # moving into opponents pawn capture range with a piece other than a pawn is often bad
-            if YX2INT[(y_to, x_to)] in self.board.reachable[self.board.opponent]['pawn_attack']:
-                move_score_guess -= PIECE_VALUES[moved_piece_type]
+        for move in bad_captures:
+            yield move
 
-            # killer moves are potentially really strong moves, that might be playable, even if the position changed slightly. this means we should consider them with high priority in the search
-            if move in self.killer_moves:
-                move_score_guess += KILLER_BIAS
+    # this function orders moves from best to worse and is a support function for our search. of course we dont know in advance how good a move is, so we need to guess
+    def order_moves(self, movelist, start_move=None, ply=None):
 
-            ordered_moves.append((move_score_guess, move))
-        
+        ordered_moves = self.score_moves(movelist, ply)
         ordered_moves.sort(reverse=True)
         
         # if a move is manually passed to the function, that means we want this exact move to be at the very start of the list
         if start_move:
-            list1 = [x[1] for x in ordered_moves]
-            #try:
-                #list1.remove(start_move)
-            #except ValueError:
-                #print(start_move)
-                #print(list1)
-                #print(movelist)
-                #raise Exception("unknown error!")
-            return [start_move] + list1
+            return [start_move] + [x[1] for x in ordered_moves if x[1] != start_move]
         else:
             return [x[1] for x in ordered_moves]
 
+    # the guessed score of each move, as a list of (score, move). if the static exchange evaluation of the moves is given, it replaces the guess from the captured, moving and promoted pieces. the killers of the ply (if given), the countermove and the history counts come on top of the guess
+    def score_moves(self, movelist, ply=None, exchange=None):
+
+        ordered_moves = []
+
+        side = 4096 if self.board.to_move == BLACK else 0
+        killer1, killer2 = (self.killers[2*ply], self.killers[2*ply+1]) if ply is not None else (0, 0)
+        last_move = self.board.record.last_move
+        countermove = self.countermoves[side + (last_move & 4095)] if last_move else 0
+        history = self.history
+
+        for i, move in enumerate(movelist):
+            from_sq, to_sq, flags = move & 63, (move >> 6) & 63, move >> 12
+
+            if exchange is not None:
+                # the exchange evaluation already counts what the move captures and promotes to and if the piece is lost on its target square
+                move_score_guess = exchange[i]
+            else:
+                move_score_guess = 0
+                moved_piece_type = PIECE_SPLIT[self.board.board[from_sq]][1]
+                captured_piece_type = PIECE_SPLIT[self.board.board[to_sq]][1]
+
+                # capturing a high value piece with a low value piece is usually good
+                if captured_piece_type != NO_PIECE:
+                    move_score_guess += PIECE_VALUES[captured_piece_type] - PIECE_VALUES[moved_piece_type]
+                
+                # promoting a pawn is usually also strong
+                if flags & FLAG_PROMOTION:
+                    move_score_guess += PIECE_VALUES[KNIGHT + (flags & 3)]
+                
+                # moving into opponents pawn capture range with a piece other than a pawn is often bad
+                if to_sq in self.board.reachable[self.board.opponent]['pawn_attack']:
+                    move_score_guess -= PIECE_VALUES[moved_piece_type]
+
+            # killer moves are potentially really strong moves, that might be playable, even if the position changed slightly. this means we should consider them with high priority in the search, followed by the countermove
+            if move == killer1 or move == killer2:
+                move_score_guess += KILLER_BIAS
+            elif move == countermove:
+                move_score_guess += COUNTERMOVE_BIAS
+            move_score_guess += min(history[side + (move & 4095)] * HISTORY_SCALE, HISTORY_BIAS)
+
+            ordered_moves.append((move_score_guess, move))
+
+        return ordered_moves
+
     # we want to extend our search depth for promising moves. so far, checks and pawns that are about to promote are implemented. there is also a limit to how far these extensions can go.
     def calculate_extension(self, move, ext_count):
 
-        from_y, from_x, to_y, _, _ = move
+        from_sq, to_y = move & 63, ((move >> 6) & 63) >> 3
 
-        moved_piece = PIECE_SPLIT[self.board.board[YX2INT[(from_y,from_x)]]][1]
+        moved_piece = PIECE_SPLIT[self.board.board[from_sq]][1]
 
         extension = 0
         if ext_count < EXTENSION_LIMIT:
@@ -510,6 +1120,10 @@ class Chessbot:
             
         return extension
 
+    # the material of the player to move without pawns and king, which tells if null move pruning is safe to use
+    def non_pawn_material(self):
+        return (self.board.scores[self.board.to_move] >> SCORE_BITS) & SCORE_MASK
+
     # this function combines all evaluations such as materialcount and other bonuses into a final relative evaluation. that means, if the bot thinks its own side is winning, the evaluation will be positive. the reason is, it is easier to implement the search that way, and should we be interested in the "standard" way of evaluating (white is better -> positive, black is better -> negative), then we can give back the relative evaluation and factor in the played color
     def rel_evaluate(self):
         
@@ -517,10 +1131,10 @@ class Chessbot:
 
         return evaluation
 
-    # counting the material according to the piece values. note that this count is relative (instead of based on the color), meaning if the player that is to move is leading in material, the count will come back positive
+    # counting the material according to the piece values (summed up by the board, see PIECE_SCORES). note that this count is relative (instead of based on the color), meaning if the player that is to move is leading in material, the count will come back positive
     def materialcount(self):
-        sumown = sum([PIECE_VALUES[PIECE_SPLIT[self.board.board[sq]][1]] for sq in self.board.piece_loc[self.board.to_move]])
-        sumopp = sum([PIECE_VALUES[PIECE_SPLIT[self.board.board[sq]][1]] for sq in self.board.piece_loc[self.board.opponent]])
+        sumown = self.board.scores[self.board.to_move] & SCORE_MASK
+        sumopp = self.board.scores[self.board.opponent] & SCORE_MASK
         
         materialcount = (sumown - sumopp)
 
@@ -554,8 +1168,8 @@ class Chessbot:
 
     # evaluating bonus values for how the pieces are positioned on the board in the opening stage (until midgame). once the endgame is reached, these bonuses will become zero
     def opening_positioning(self):
-        sumown = sum([OPENING_BONUS_VALUES[self.board.to_move][PIECE_SPLIT[self.board.board[sq]][1]][sq] for sq in self.board.piece_loc[self.board.to_move]])
-        sumopp = sum([OPENING_BONUS_VALUES[self.board.opponent][PIECE_SPLIT[self.board.board[sq]][1]][sq] for sq in self.board.piece_loc[self.board.opponent]])
+        sumown = (self.board.scores[self.board.to_move] >> 2*SCORE_BITS) & SCORE_MASK
+        sumopp = (self.board.scores[self.board.opponent] >> 2*SCORE_BITS) & SCORE_MASK
         
         opening_bonus = (sumown - sumopp)
 
@@ -563,8 +1177,8 @@ class Chessbot:
 
     # evaluating bonus values for how the pieces are positioned on the board in the endgame stage. if we are not in the endgame yet, the bonuses will be zero
     def endgame_positioning(self):
-        sumown = sum([ENDGAME_BONUS_VALUES[self.board.to_move][PIECE_SPLIT[self.board.board[sq]][1]][sq] for sq in self.board.piece_loc[self.board.to_move]])
-        sumopp = sum([ENDGAME_BONUS_VALUES[self.board.opponent][PIECE_SPLIT[self.board.board[sq]][1]][sq] for sq in self.board.piece_loc[self.board.opponent]])
+        sumown = self.board.scores[self.board.to_move] >> 3*SCORE_BITS
+        sumopp = self.board.scores[self.board.opponent] >> 3*SCORE_BITS
         
         endgame_bonus = (sumown - sumopp)
 
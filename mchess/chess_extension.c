@@ -1,4 +1,6 @@
 #include <Python.h>
+#include "structmember.h"
+#include <stdint.h>
 
 // CONSTANTS
 
@@ -66,9 +68,23 @@ struct directions PAWN_MOVE = {1,{{1,{{1,0}}}}};
 struct directions PAWN_DOUBLE_MOVE = {1,{{1,{{2,0}}}}};
 struct directions PAWN_CAPTURE = {2,{{1,{{1,-1}}},{1,{{1,1}}}}};
 
-// promotion options for either color
-int PROMOTE_WHITE[4] = {14,13,12,11};
-int PROMOTE_BLACK[4] = {22,21,20,19};
+// moves are packed into 16 bits, the same way as in the python module (see pack_move there): from square (bits 0-5), to square (bits 6-11) and 4 bits of flags that tell what kind of move it is
+#define MOVE(from, to, flags) ((from) | ((to) << 6) | ((flags) << 12))
+#define MOVE_FROM(move) ((move) & 63)
+#define MOVE_TO(move) (((move) >> 6) & 63)
+#define MOVE_FLAGS(move) ((move) >> 12)
+
+// the capture bit is also set for en passant, the promotion bit for every promotion, with the promotion piece (counted from the knight) in the lowest 2 bits
+#define FLAG_QUIET 0
+#define FLAG_DOUBLE_PUSH 1
+#define FLAG_KING_CASTLE 2
+#define FLAG_QUEEN_CASTLE 3
+#define FLAG_CAPTURE 4
+#define FLAG_EN_PASSANT 5
+#define FLAG_PROMOTION 8
+
+// promotion options (queen, rook, bishop, knight) as move flags, which are the same for both colors
+int PROMOTE_FLAGS[4] = {11,10,9,8};
 
 // castles empty field arrays
 int CASTLE_EMPTY_WKING[2] = {5,6};
@@ -76,6 +92,31 @@ int CASTLE_EMPTY_WQUEEN[3] = {1,2,3};
 int CASTLE_EMPTY_BKING[2] = {61,62};
 int CASTLE_EMPTY_BQUEEN[3] = {57,58,59};
 
+// a bitboard has one bit per square, using the same square numbers as the board array
+typedef uint64_t bitboard;
+
+// "fancy" magic bitboards for the sliding pieces: for each square, the relevant occupancy (mask) is multiplied by a magic number, and the highest bits of the result are a collision free index into that squares part of the attack table. all magics are searched at module init, so nothing needs to be hardcoded
+struct magic {bitboard mask; bitboard magic; bitboard* attacks; int shift;};
+struct magic ROOK_MAGICS[64];
+struct magic BISHOP_MAGICS[64];
+
+// the table sizes are the sum of 2^(bits in mask) over all squares
+bitboard ROOK_TABLE[102400];
+bitboard BISHOP_TABLE[5248];
+
+// the squares strictly between two squares on the same rank, file or diagonal (0 if they are not on one line), also filled at module init
+bitboard BETWEEN[64][64];
+
+// the squares a knight, king or pawn (per color index, see COLOR_INDEX) attacks from each square
+bitboard KNIGHT_ATTACKS[64];
+bitboard KING_ATTACKS[64];
+bitboard PAWN_ATTACKS[2][64];
+
+bitboard RANK_1_BB = 0xFFULL;
+bitboard RANK_8_BB = 0xFFULL << 56;
+bitboard FILE_A_BB = 0x0101010101010101ULL;
+bitboard FILE_H_BB = 0x0101010101010101ULL << 7;
+
 
 // HELPER FUNCTIONS
 
@@ -97,194 +138,209 @@ int oppositecolor(int color){
     return 0; // shouldnt happen
 }
 
-// loading in the board array from python. this functionality is needed multiple times and so we outsource it to this function. caller needs to malloc the array, pass in the pointer to it, and free memory after processing
-int load_board(PyObject* py_board, int* board){
-
-    // loading the board as array by first loading it as an iterator, then iterating through it and copying the values to a C array
-    PyObject *board_iter = PyObject_GetIter(py_board);
-    if (!board_iter) {
-        printf("board is not iterable!");
-        return 1; // error in case no iterator
-    }    
-    int p; // declaring before loop
-    for (int i = 0; i < 64; i++) {
-        PyObject *next_p = PyIter_Next(board_iter);
-        if (!next_p) {
-            printf("board did not have 64 squares!");
-            // nothing left in the iterator
-            return 1;
-        }
+// returns the lowest set square of a bitboard and removes it from the bitboard
+int pop_lsb(bitboard* b){
+    int sq = __builtin_ctzll(*b);
+    *b &= *b - 1;
+    return sq;
+}
 
-        if (!PyLong_Check(next_p)) {
-            printf("board values are not integer!");
-            return 1;
-            // error, we were expecting an int value. note that PyLong_Check checks for long and int, there is no "PyInt_Check"
+// the attacks of a rook or bishop calculated by walking the rays square by square. this is only used to fill the magic attack tables at module init
+bitboard sliding_attacks_slow(int sq, bitboard occupied, int piece_type){
+    bitboard attacks = 0;
+    struct directions pattern = PIECE_MOVEMENT_PATTERNS[piece_type];
+    struct coord yx = INT2YX[sq];
+    struct coord offset;
+    int new_field;
+
+    for (int i = 0; i < pattern.num_dir; i++) {
+        for (int j = 0; j < pattern.direction[i].num_off; j++) {
+            offset = pattern.direction[i].offset[j];
+            if (outofbounds(yx.y+offset.y, yx.x+offset.x)) {
+                break;
+            }
+            new_field = YX2INT[yx.y+offset.y][yx.x+offset.x];
+            attacks |= 1ULL << new_field;
+            if (occupied & (1ULL << new_field)) {
+                break;
+            }
         }
-
-        p = PyLong_AsLong(next_p);
-        Py_DECREF(next_p); // need to decref this object, otherwise we get a memory leak
-        board[i] = p;
     }
+    return attacks;
+}
 
-    Py_DECREF(board_iter); // also decref the whole iterator after finishing
+// simple xorshift random number generator, seeded per rank with values that are known to find magics quickly (the same seeds that stockfish uses), so the search only takes a few milliseconds and gives the same magics on every run
+bitboard MAGIC_SEEDS[8] = {728, 10316, 55013, 32803, 12281, 15100, 16645, 255};
+bitboard prng_state;
+bitboard prng_next(void){
+    prng_state ^= prng_state >> 12;
+    prng_state ^= prng_state << 25;
+    prng_state ^= prng_state >> 27;
+    return prng_state * 2685821657736338717ULL;
+}
 
-    if (PyErr_Occurred()) {
-        return 1;
-        /* propagate error */
+// finding the magic numbers for one sliding piece type and filling its attack table. candidate magics are random numbers with few bits set, which are tried until every occupancy maps to an index that is either unused or holds the same attacks
+void init_magics(int piece_type, struct magic* magics, bitboard* table){
+    bitboard occupancy[4096], reference[4096];
+    int epoch[4096] = {0};
+    int attempt = 0;
+    bitboard* attacks = table;
+
+    for (int sq = 0; sq < 64; sq++) {
+        struct magic* m = &magics[sq];
+
+        // the board edges only matter if the piece stands on that edge itself, because a piece on the last square of a ray doesnt hide anything
+        bitboard edges = ((RANK_1_BB | RANK_8_BB) & ~(RANK_1_BB << (8*INT2YX[sq].y))) | ((FILE_A_BB | FILE_H_BB) & ~(FILE_A_BB << INT2YX[sq].x));
+        m->mask = sliding_attacks_slow(sq, 0, piece_type) & ~edges;
+        m->shift = 64 - __builtin_popcountll(m->mask);
+        m->attacks = attacks;
+
+        // going through all subsets of the mask (carry rippler trick) and storing the true attacks for each
+        int size = 0;
+        bitboard b = 0;
+        do {
+            occupancy[size] = b;
+            reference[size] = sliding_attacks_slow(sq, b, piece_type);
+            size++;
+            b = (b - m->mask) & m->mask;
+        } while (b);
+
+        // trying magics until one works for all occupancies. epoch lets us reuse the attack table entries without clearing them after each failed attempt
+        prng_state = MAGIC_SEEDS[INT2YX[sq].y];
+        int i = 0;
+        while (i < size) {
+            do {
+                m->magic = prng_next() & prng_next() & prng_next();
+            } while (__builtin_popcountll((m->magic * m->mask) >> 56) < 6);
+
+            attempt++;
+            for (i = 0; i < size; i++) {
+                unsigned int idx = (unsigned int)(((occupancy[i] & m->mask) * m->magic) >> m->shift);
+                if (epoch[idx] < attempt) {
+                    epoch[idx] = attempt;
+                    m->attacks[idx] = reference[i];
+                }
+                else if (m->attacks[idx] != reference[i]) {
+                    break;
+                }
+            }
+        }
+        attacks += size;
     }
-
-    return 0; // function execution successful
 }
 
+// walking the queen rays from every square and remembering which squares were passed on the way to each square
+void init_between(void){
+    struct directions pattern = PIECE_MOVEMENT_PATTERNS[QUEEN];
+    struct coord yx, offset;
+    bitboard between;
+    int new_field;
 
-// PYTHON EXTENSION FUNCTIONS
-
-// this function works almost identical to pseudo_legal_moves, but instead of appending all moves to a list, it just checks whether the enemy king can be captured or not and returns as early as possible to save time.
-static PyObject* king_capt(PyObject* self, PyObject* args) {
-    // declare arguments as C type
-    PyObject *piece_loc, *py_board; // these are borrowed references! we dont need to decref them
-    int color;
-
-    // reading in the passed arguments, note that color is referenced directly because it is an int, but for the PyObjects we need more work
-    if (!PyArg_ParseTuple(args, "OOi", &piece_loc, &py_board, &color))
-        return NULL;
-
-    // loading in the chess board
-    int* board = malloc(64*sizeof(int));
-    if (!board) {
-        printf("memory allocation for board failed!");
-        return NULL;
-    }
-    if (load_board(py_board, board) != 0) {
-        printf("board could not be copied to array!");
-        return NULL;
-    }
-
-    // loading piece_loc as an iterator
-    PyObject *piece_loc_iter = PyObject_GetIter(piece_loc);
-    if (!piece_loc_iter) {
-        printf("piece_loc is not iterable!");
-        return NULL; // error in case no iterator
+    for (int sq = 0; sq < 64; sq++) {
+        yx = INT2YX[sq];
+        for (int i = 0; i < pattern.num_dir; i++) {
+            between = 0;
+            for (int j = 0; j < pattern.direction[i].num_off; j++) {
+                offset = pattern.direction[i].offset[j];
+                if (outofbounds(yx.y+offset.y, yx.x+offset.x)) {
+                    break;
+                }
+                new_field = YX2INT[yx.y+offset.y][yx.x+offset.x];
+                BETWEEN[sq][new_field] = between;
+                between |= 1ULL << new_field;
+            }
+        }
     }
+}
 
-    // declaring as many variables as possible before the loop
-    int sq,y,x,f,piece_type,new_field;
-    struct coord yx,offset,new_field_coord;
-    struct directions pattern;
+// the pieces that only move one step per direction can use the same walk as the sliding pieces, they stop after the first offset anyway. pawn captures are mirrored for black
+void init_leapers(void){
+    struct coord yx, offset;
 
-    // iterating through piece_loc (all squares that contain a piece)
-    while (1) {
-        PyObject *next_sq = PyIter_Next(piece_loc_iter);
-        if (!next_sq) {
-            // nothing left in the iterator
-            break;
-        }
+    for (int sq = 0; sq < 64; sq++) {
+        KNIGHT_ATTACKS[sq] = sliding_attacks_slow(sq, 0, KNIGHT);
+        KING_ATTACKS[sq] = sliding_attacks_slow(sq, 0, KING);
 
-        if (!PyLong_Check(next_sq)) {
-            printf("piece_loc values are not integer!");
-            return NULL;
-            // error, we were expecting an int value. note that PyLong_Check checks for long and int, there is no "PyInt_Check"
+        yx = INT2YX[sq];
+        PAWN_ATTACKS[0][sq] = PAWN_ATTACKS[1][sq] = 0;
+        for (int i = 0; i < PAWN_CAPTURE.num_dir; i++) {
+            offset = PAWN_CAPTURE.direction[i].offset[0];
+            if (!outofbounds(yx.y+offset.y, yx.x+offset.x)) {
+                PAWN_ATTACKS[0][sq] |= 1ULL << YX2INT[yx.y+offset.y][yx.x+offset.x];
+            }
+            if (!outofbounds(yx.y-offset.y, yx.x+offset.x)) {
+                PAWN_ATTACKS[1][sq] |= 1ULL << YX2INT[yx.y-offset.y][yx.x+offset.x];
+            }
         }
+    }
+}
 
-        sq = PyLong_AsLong(next_sq);
-        Py_DECREF(next_sq);
-        
-        yx = INT2YX[sq];
-        y = yx.y;
-        x = yx.x;
-        f = board[sq];
-        piece_type = PIECE_SPLIT[f].type;
+bitboard rook_attacks(int sq, bitboard occupied){
+    struct magic* m = &ROOK_MAGICS[sq];
+    return m->attacks[((occupied & m->mask) * m->magic) >> m->shift];
+}
 
-        // calculating all pieces except pawns
-        if (piece_type != PAWN) {
-            pattern = PIECE_MOVEMENT_PATTERNS[piece_type];
-            for (int i = 0; i < pattern.num_dir; i++) {
-                for (int j = 0; j < pattern.direction[i].num_off; j++) {
-                    offset = pattern.direction[i].offset[j];
-                    new_field_coord = (struct coord){.y= y+offset.y, .x= x+offset.x};
+bitboard bishop_attacks(int sq, bitboard occupied){
+    struct magic* m = &BISHOP_MAGICS[sq];
+    return m->attacks[((occupied & m->mask) * m->magic) >> m->shift];
+}
 
-                    if (outofbounds(new_field_coord.y,new_field_coord.x)) {
-                        break;
-                    }
-                    else {
-                        new_field = YX2INT[new_field_coord.y][new_field_coord.x];
-                    }
+// attacks of a bishop, rook or queen with a single table lookup (two for the queen)
+bitboard slider_attacks(int sq, bitboard occupied, int piece_type){
+    if (piece_type == ROOK) {
+        return rook_attacks(sq, occupied);
+    }
+    else if (piece_type == BISHOP) {
+        return bishop_attacks(sq, occupied);
+    }
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied);
+}
 
-                    // new field is empty and therefore a valid target field
-                    if (board[new_field] == NO_PIECE) {
-                        continue;
-                    }
-                    // new field occupied by own piece, break this direction early
-                    else if (PIECE_SPLIT[board[new_field]].color == color) {
-                        break;
-                    }
-                    // new field occupied by opponents king
-                    else if (board[new_field] == oppositecolor(color)+KING){
-                        free(board);
-
-                        Py_DECREF(piece_loc_iter);
-                        if (PyErr_Occurred()) {
-                            return NULL;
-                            /* propagate error */
-                        }
+int is_slider(int piece_type){
+    return (piece_type == BISHOP || piece_type == ROOK || piece_type == QUEEN);
+}
 
-                        return Py_BuildValue("i", 1);
-                    }
-                    // new field occupied by an enemy piece that is not the king
-                    else {
-                        break;
-                    }
-                }
-            }
+// all occupied squares of the board array as a bitboard
+bitboard occupancy_bb(const unsigned char* board){
+    bitboard occupied = 0;
+    for (int i = 0; i < 64; i++) {
+        if (board[i] != NO_PIECE) {
+            occupied |= 1ULL << i;
         }
-        // calculating pawns separately because they have special move rules
-        else {
-            // implementation of the capturing move for pawns which goes sideways
-            pattern = PAWN_CAPTURE;
-            for (int i = 0; i < pattern.num_dir; i++) {
-                for (int j = 0; j < pattern.direction[i].num_off; j++) {
-                    offset = pattern.direction[i].offset[j];
-
-                    if (color == WHITE) {
-                        new_field_coord = (struct coord){.y=y+offset.y, .x=x+offset.x};
-                    }
-                    else {
-                        new_field_coord = (struct coord){.y= y-offset.y, .x= x-offset.x};
-                    }
+    }
+    return occupied;
+}
 
-                    // checking for out of bounds, which is possible with sideways capture
-                    if (outofbounds(new_field_coord.y,new_field_coord.x)) {
-                        break;
-                    }
-                    // new field is occupied by enemy king
-                    else if (board[YX2INT[new_field_coord.y][new_field_coord.x]] == oppositecolor(color)+KING) {
-                        free(board);
-
-                        Py_DECREF(piece_loc_iter);
-                        if (PyErr_Occurred()) {
-                            return NULL;
-                            /* propagate error */
-                        }
+// every move int that is handed to python is only created once and then kept, so that returning a list of moves does not allocate a new python int for each move (python itself only keeps the ints up to 256). the caller gets a new reference, the same as from PyLong_FromLong
+PyObject* MOVE_OBJECTS[1 << 16];
 
-                        return Py_BuildValue("i", 1);
-                    }
-                }
-            }
+PyObject* move_object(int move){
+    if (!MOVE_OBJECTS[move]) {
+        MOVE_OBJECTS[move] = PyLong_FromLong(move);
+        if (!MOVE_OBJECTS[move]) {
+            return NULL;
         }
-    
     }
-    
+    Py_INCREF(MOVE_OBJECTS[move]);
+    return MOVE_OBJECTS[move];
+}
 
-    Py_DECREF(piece_loc_iter);
-    if (PyErr_Occurred()) {
-        return NULL;
-        /* propagate error */
+// getting direct access to the board of the python module. it is a bytearray of 64 squares, which exposes its memory through the buffer protocol, so the extension can read it in place and nothing has to be allocated, copied or converted. the caller needs to release the buffer after processing
+int get_board(PyObject* py_board, Py_buffer* view){
+    if (PyObject_GetBuffer(py_board, view, PyBUF_FORMAT) != 0) {
+        return 1;
     }
-
-    free(board);
-    return Py_BuildValue("i", 0);
+    if (view->len != 64 || view->itemsize != 1 || strcmp(view->format, "B") != 0) {
+        PyBuffer_Release(view);
+        PyErr_SetString(PyExc_TypeError, "board has to be a bytearray of 64 squares");
+        return 1;
+    }
+    return 0;
 }
 
+
+// PYTHON EXTENSION FUNCTIONS
+
 // this function keeps track of what the opponent can do on the board. it gives back a dict that is divided into a part that includes all directly reachable squares (by reachable it means takeable here) and a second part that checks if there are lines towards the king, that are currently blocked by enemy pieces. that way we can easily access this information to check if a move we want to make is legal or would result in our king standing in check
 static PyObject* update_reachable(PyObject* self, PyObject* args) {
     // declare arguments as C type
@@ -295,16 +351,12 @@ static PyObject* update_reachable(PyObject* self, PyObject* args) {
     if (!PyArg_ParseTuple(args, "OOi", &piece_loc, &py_board, &color))
         return NULL;
 
-    // loading in the chess board
-    int* board = malloc(64*sizeof(int));
-    if (!board) {
-        printf("memory allocation for board failed!");
-        return NULL;
-    }
-    if (load_board(py_board, board) != 0) {
-        printf("board could not be copied to array!");
+    // reading the chess board in place
+    Py_buffer board_view;
+    if (get_board(py_board, &board_view) != 0) {
         return NULL;
     }
+    const unsigned char* board = board_view.buf;
 
     // creating an empty python dict, which we will process and then return later
     PyObject* reachable = PyDict_New();
@@ -318,9 +370,24 @@ static PyObject* update_reachable(PyObject* self, PyObject* args) {
     PyObject *piece_loc_iter = PyObject_GetIter(piece_loc);
     if (!piece_loc_iter) {
         printf("piece_loc is not iterable!");
+        PyBuffer_Release(&board_view);
         return NULL; // error in case no iterator
     }
 
+    // occupancy of the board and the enemy king, which the sliding pieces need for their lookups
+    bitboard occupied = occupancy_bb(board);
+    bitboard enemy_pieces = 0;
+    int enemy_king_sq = -1;
+    for (int i = 0; i < 64; i++) {
+        if (PIECE_SPLIT[board[i]].color == oppositecolor(color)) {
+            enemy_pieces |= 1ULL << i;
+            if (PIECE_SPLIT[board[i]].type == KING) {
+                enemy_king_sq = i;
+            }
+        }
+    }
+    bitboard attacks, between;
+
     // declaring variables
     int sq,y,x,f,piece_type,blocking_piece,new_field;
     struct coord yx,offset,new_field_coord;
@@ -350,8 +417,27 @@ static PyObject* update_reachable(PyObject* self, PyObject* args) {
         f = board[sq];
         piece_type = PIECE_SPLIT[f].type;
 
-        // calculating all pieces except pawns
-        if (piece_type != PAWN) {
+        // sliding pieces look up their attacks in the magic tables. everything they attack is reachable, own pieces included, since that means protecting them
+        if (is_slider(piece_type)) {
+            attacks = slider_attacks(sq, occupied, piece_type);
+            while (attacks) {
+                tmp = Py_BuildValue("i",pop_lsb(&attacks));
+                PySet_Add(all_direct, tmp);
+                Py_DECREF(tmp);
+            }
+
+            // a line towards the enemy king that is blocked by exactly one enemy piece means that piece can not move freely
+            if (enemy_king_sq != -1 && (slider_attacks(sq, 0, piece_type) & (1ULL << enemy_king_sq))) {
+                between = BETWEEN[sq][enemy_king_sq] & occupied;
+                if (between && !(between & (between - 1)) && (between & enemy_pieces)) {
+                    tmp = Py_BuildValue("i",__builtin_ctzll(between));
+                    PySet_Add(king_indirect_blocked, tmp);
+                    Py_DECREF(tmp);
+                }
+            }
+        }
+        // calculating the other pieces except pawns
+        else if (piece_type != PAWN) {
             pattern = PIECE_MOVEMENT_PATTERNS[piece_type];
             for (int i = 0; i < pattern.num_dir; i++) {
                 blocking_piece = -1;
@@ -467,12 +553,13 @@ static PyObject* update_reachable(PyObject* self, PyObject* args) {
     Py_DECREF(pawn_attack);
 
     if (PyErr_Occurred()) {
+        PyBuffer_Release(&board_view);
         return NULL;
         /* propagate error */
     }
 
     // returning the newly created reachable dict
-    free(board);
+    PyBuffer_Release(&board_view);
     return reachable;
 }
 
@@ -486,16 +573,12 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
     if (!PyArg_ParseTuple(args, "OOOii", &piece_loc, &py_board, &castling_rights, &color, &en_passant_target))
         return NULL;
 
-    // loading in the chess board
-    int* board = malloc(64*sizeof(int));
-    if (!board) {
-        printf("memory allocation for board failed!");
-        return NULL;
-    }
-    if (load_board(py_board, board) != 0) {
-        printf("board could not be copied to array!");
+    // reading the chess board in place
+    Py_buffer board_view;
+    if (get_board(py_board, &board_view) != 0) {
         return NULL;
     }
+    const unsigned char* board = board_view.buf;
 
     // creating the list objects that we return later
     PyObject* noncaptures = PyList_New(0);
@@ -505,9 +588,13 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
     PyObject *piece_loc_iter = PyObject_GetIter(piece_loc);
     if (!piece_loc_iter) {
         printf("piece_loc is not iterable!");
+        PyBuffer_Release(&board_view);
         return NULL; // error in case no iterator
     }
 
+    bitboard occupied = occupancy_bb(board);
+    bitboard attacks;
+
     // declaring variables
     int sq,y,x,f,piece_type,new_field,c,blocked;
     struct coord yx,offset,new_field_coord,through_coord;
@@ -537,8 +624,27 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
         f = board[sq];
         piece_type = PIECE_SPLIT[f].type;
 
-        // calculating all pieces except pawns
-        if (piece_type != PAWN) {
+        // sliding pieces look up their attacks in the magic tables, then the attacked squares are sorted into empty squares and enemy pieces
+        if (is_slider(piece_type)) {
+            attacks = slider_attacks(sq, occupied, piece_type);
+            while (attacks) {
+                new_field = pop_lsb(&attacks);
+                new_field_coord = INT2YX[new_field];
+
+                if (board[new_field] == NO_PIECE) {
+                    tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], FLAG_QUIET));
+                    PyList_Append(noncaptures, tmp);
+                    Py_DECREF(tmp);
+                }
+                else if (PIECE_SPLIT[board[new_field]].color == oppositecolor(color)) {
+                    tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], FLAG_CAPTURE));
+                    PyList_Append(captures, tmp);
+                    Py_DECREF(tmp);
+                }
+            }
+        }
+        // calculating the other pieces except pawns
+        else if (piece_type != PAWN) {
             pattern = PIECE_MOVEMENT_PATTERNS[piece_type];
             for (int i = 0; i < pattern.num_dir; i++) {
                 for (int j = 0; j < pattern.direction[i].num_off; j++) {
@@ -554,7 +660,7 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
 
                     // new field is empty and therefore a valid target field
                     if (board[new_field] == NO_PIECE) {
-                        tmp = Py_BuildValue("(iiiii)",y,x,new_field_coord.y,new_field_coord.x,0);
+                        tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], FLAG_QUIET));
                         PyList_Append(noncaptures, tmp);
                         Py_DECREF(tmp);
                     }
@@ -564,7 +670,7 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
                     }
                     // new field occupied by opponents piece, break, but allow this move (to capture)
                     else if (PIECE_SPLIT[board[new_field]].color == oppositecolor(color)) {
-                        tmp = Py_BuildValue("(iiiii)",y,x,new_field_coord.y,new_field_coord.x,0);
+                        tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], FLAG_CAPTURE));
                         PyList_Append(captures, tmp);
                         Py_DECREF(tmp);
                         break;
@@ -594,20 +700,20 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
                     else if (board[YX2INT[new_field_coord.y][new_field_coord.x]] == NO_PIECE) {
                         if (new_field_coord.y == 7 && color == WHITE) {
                             for (int k = 0; k < 4; k++) {
-                                tmp = Py_BuildValue("(iiiii)",y,x,new_field_coord.y,new_field_coord.x,PROMOTE_WHITE[k]);
+                                tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], PROMOTE_FLAGS[k]));
                                 PyList_Append(noncaptures, tmp);
                                 Py_DECREF(tmp);
                             }
                         }
                         else if (new_field_coord.y == 0 && color == BLACK) {
                             for (int k = 0; k < 4; k++) {
-                                tmp = Py_BuildValue("(iiiii)",y,x,new_field_coord.y,new_field_coord.x,PROMOTE_BLACK[k]);
+                                tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], PROMOTE_FLAGS[k]));
                                 PyList_Append(noncaptures, tmp);
                                 Py_DECREF(tmp);
                             }
                         }
                         else {
-                            tmp = Py_BuildValue("(iiiii)",y,x,new_field_coord.y,new_field_coord.x,0);
+                            tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], FLAG_QUIET));
                             PyList_Append(noncaptures, tmp);
                             Py_DECREF(tmp);
                         }
@@ -637,7 +743,7 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
 
                         // new field is empty and therefore a valid target field AND the field before that is also empty
                         if (board[YX2INT[new_field_coord.y][new_field_coord.x]] == NO_PIECE && board[YX2INT[through_coord.y][through_coord.x]] == NO_PIECE) {
-                            tmp = Py_BuildValue("(iiiii)",y,x,new_field_coord.y,new_field_coord.x,0);
+                            tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], FLAG_DOUBLE_PUSH));
                             PyList_Append(noncaptures, tmp);
                             Py_DECREF(tmp);
                         }
@@ -665,26 +771,26 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
                     else if (PIECE_SPLIT[board[YX2INT[new_field_coord.y][new_field_coord.x]]].color == oppositecolor(color)) {
                         if (new_field_coord.y == 7 && color == WHITE) {
                             for (int k = 0; k < 4; k++) {
-                                tmp = Py_BuildValue("(iiiii)",y,x,new_field_coord.y,new_field_coord.x,PROMOTE_WHITE[k]);
+                                tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], PROMOTE_FLAGS[k] | FLAG_CAPTURE));
                                 PyList_Append(captures, tmp);
                                 Py_DECREF(tmp);
                             }
                         }
                         else if (new_field_coord.y == 0 && color == BLACK) {
                             for (int k = 0; k < 4; k++) {
-                                tmp = Py_BuildValue("(iiiii)",y,x,new_field_coord.y,new_field_coord.x,PROMOTE_BLACK[k]);
+                                tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], PROMOTE_FLAGS[k] | FLAG_CAPTURE));
                                 PyList_Append(captures, tmp);
                                 Py_DECREF(tmp);
                             }
                         }
                         else {
-                            tmp = Py_BuildValue("(iiiii)",y,x,new_field_coord.y,new_field_coord.x,0);
+                            tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], FLAG_CAPTURE));
                             PyList_Append(captures, tmp);
                             Py_DECREF(tmp);
                         }
                     }
                     else if (YX2INT[new_field_coord.y][new_field_coord.x] == en_passant_target) {
-                        tmp = Py_BuildValue("(iiiii)",y,x,new_field_coord.y,new_field_coord.x,0);
+                        tmp = move_object(MOVE(sq, YX2INT[new_field_coord.y][new_field_coord.x], FLAG_EN_PASSANT));
                         PyList_Append(captures, tmp);
                         Py_DECREF(tmp);
                     }
@@ -700,6 +806,7 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
     PyObject *castling_iter = PyObject_GetIter(castling_rights);
     if (!castling_iter) {
         printf("castling_rights is not iterable!");
+        PyBuffer_Release(&board_view);
         return NULL; // error in case no iterator
     }
 
@@ -731,7 +838,7 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
                     }
                 }
                 if (blocked == 0) {
-                    tmp = Py_BuildValue("(iiiii)",0,4,0,6,0);
+                    tmp = move_object(MOVE(4, 6, FLAG_KING_CASTLE));
                     PyList_Append(noncaptures, tmp);
                     Py_DECREF(tmp);
                 }
@@ -744,7 +851,7 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
                     }
                 }
                 if (blocked == 0) {
-                    tmp = Py_BuildValue("(iiiii)",0,4,0,2,0);
+                    tmp = move_object(MOVE(4, 2, FLAG_QUEEN_CASTLE));
                     PyList_Append(noncaptures, tmp);
                     Py_DECREF(tmp);
                 }
@@ -757,7 +864,7 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
                     }
                 }
                 if (blocked == 0) {
-                    tmp = Py_BuildValue("(iiiii)",7,4,7,6,0);
+                    tmp = move_object(MOVE(60, 62, FLAG_KING_CASTLE));
                     PyList_Append(noncaptures, tmp);
                     Py_DECREF(tmp);
                 }
@@ -770,19 +877,21 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
                     }
                 }
                 if (blocked == 0) {
-                    tmp = Py_BuildValue("(iiiii)",7,4,7,2,0);
+                    tmp = move_object(MOVE(60, 58, FLAG_QUEEN_CASTLE));
                     PyList_Append(noncaptures, tmp);
                     Py_DECREF(tmp);
                 }
                 break;
             default:
                 printf("provided castling rights do not match any of the 4 castle possibilities!");
+                PyBuffer_Release(&board_view);
                 return NULL;
         }
     }
     Py_DECREF(castling_iter);
 
     if (PyErr_Occurred()) {
+        PyBuffer_Release(&board_view);
         return NULL;
         /* propagate error */
     }
@@ -792,17 +901,809 @@ static PyObject* pseudo_legal(PyObject* self, PyObject* args) {
     Py_DECREF(captures);
 
     // returning a tuple of both lists
-    free(board);
+    PyBuffer_Release(&board_view);
+    return tmp_return;
+}
+
+
+// POSITION TYPE
+
+// the functions above get the board passed in from python on every call. a Position instead keeps its own copy of the game state as bitboards, so that perft can make and take back moves, generate legal moves and hash positions without going through python for every node. the bot does not search on it, it would first need the game over rules and the piece scores of the python board. moves are the same packed ints as in the python module, so they are passed through the interface as they are. the legal move generator is also available for the python board (fully_legal_moves), which builds the bitboards from its board for each call
+
+#define MAX_MOVES 256
+#define MAX_GAME_PLY 1024
+
+// white pieces use index 0, black pieces index 1 in all arrays that have an entry per color
+#define COLOR_INDEX(color) ((color) >> 4)
+
+// the castling rights are bits of one int here. the python module uses the piece ints of the king and queen for them, in this order
+int CASTLING_RIGHT_PIECES[4] = {9, 14, 17, 22};
+
+// for every square, the castling rights that are kept if a piece moves from or to that square (the king and rook squares remove their rights)
+int CASTLING_KEEP[64] = {
+    13,15,15,15,12,15,15,14,
+    15,15,15,15,15,15,15,15,
+    15,15,15,15,15,15,15,15,
+    15,15,15,15,15,15,15,15,
+    15,15,15,15,15,15,15,15,
+    15,15,15,15,15,15,15,15,
+    15,15,15,15,15,15,15,15,
+     7,15,15,15, 3,15,15,11
+};
+
+// everything about a castling move that is needed to check it and to move the rook along
+struct castle {int right; int king_from; int king_to; int king_passes; int rook_from; int rook_to; bitboard empty;};
+struct castle CASTLES[4] = {
+    {1, 4, 6, 5, 7, 5, (1ULL << 5) | (1ULL << 6)},
+    {2, 4, 2, 3, 0, 3, (1ULL << 1) | (1ULL << 2) | (1ULL << 3)},
+    {4, 60, 62, 61, 63, 61, (1ULL << 61) | (1ULL << 62)},
+    {8, 60, 58, 59, 56, 59, (1ULL << 57) | (1ULL << 58) | (1ULL << 59)}
+};
+
+// the zobrist mask of the python module, loaded with set_zobrist. the castling keys are combined for every possible set of rights, so a change of rights is one xor
+bitboard ZOBRIST_PIECES[64][23];
+bitboard ZOBRIST_BLACK;
+bitboard ZOBRIST_CASTLING[16];
+bitboard ZOBRIST_EN_PASSANT[8];
+int zobrist_loaded = 0;
+
+struct move_list {int count; int moves[MAX_MOVES];};
+
+// the game state without any history, so that it can also be built on the stack for a single call
+struct position {
+    int board[64];
+    bitboard pieces[23];
+    bitboard colors[2];
+    int kings[2];
+    int to_move;
+    int castling;
+    int en_passant;
+    int half_moves;
+    bitboard hash;
+};
+
+// what make_move changes and unmake_move can not find out by itself
+struct undo_record {int move; int captured; int castling; int en_passant; int half_moves; bitboard hash;};
+
+typedef struct {
+    PyObject_HEAD
+    struct position pos;
+    int ply;
+    struct undo_record history[MAX_GAME_PLY];
+} PositionObject;
+
+void put_piece(struct position* pos, int sq, int piece){
+    struct piece_tuple split = PIECE_SPLIT[piece];
+    pos->board[sq] = piece;
+    pos->pieces[piece] |= 1ULL << sq;
+    pos->colors[COLOR_INDEX(split.color)] |= 1ULL << sq;
+    pos->hash ^= ZOBRIST_PIECES[sq][piece];
+    if (split.type == KING) {
+        pos->kings[COLOR_INDEX(split.color)] = sq;
+    }
+}
+
+void remove_piece(struct position* pos, int sq){
+    int piece = pos->board[sq];
+    pos->board[sq] = NO_PIECE;
+    pos->pieces[piece] ^= 1ULL << sq;
+    pos->colors[COLOR_INDEX(PIECE_SPLIT[piece].color)] ^= 1ULL << sq;
+    pos->hash ^= ZOBRIST_PIECES[sq][piece];
+}
+
+// the en passant file is only part of the hash if a pawn stands next to the pawn that just moved 2 squares and could capture it, the same rule as in the python module
+bitboard en_passant_key(struct position* pos){
+    if (pos->en_passant < 0) {
+        return 0;
+    }
+    int pusher = pos->en_passant < 32 ? WHITE : BLACK;
+    if (PAWN_ATTACKS[COLOR_INDEX(pusher)][pos->en_passant] & pos->pieces[oppositecolor(pusher) + PAWN]) {
+        return ZOBRIST_EN_PASSANT[pos->en_passant & 7];
+    }
+    return 0;
+}
+
+// all pieces of a color that attack a square, found by looking from the square outwards with each piece type and checking if an enemy piece of that type is found
+bitboard attackers_to(struct position* pos, int sq, int by, bitboard occupied){
+    bitboard* p = pos->pieces;
+    return (PAWN_ATTACKS[1 - COLOR_INDEX(by)][sq] & p[by+PAWN]) |
+        (KNIGHT_ATTACKS[sq] & p[by+KNIGHT]) |
+        (KING_ATTACKS[sq] & p[by+KING]) |
+        (bishop_attacks(sq, occupied) & (p[by+BISHOP] | p[by+QUEEN])) |
+        (rook_attacks(sq, occupied) & (p[by+ROOK] | p[by+QUEEN]));
+}
+
+// the same, but returning as soon as one attacker is found
+int square_attacked(struct position* pos, int sq, int by, bitboard occupied){
+    bitboard* p = pos->pieces;
+    return ((PAWN_ATTACKS[1 - COLOR_INDEX(by)][sq] & p[by+PAWN]) ||
+        (KNIGHT_ATTACKS[sq] & p[by+KNIGHT]) ||
+        (KING_ATTACKS[sq] & p[by+KING]) ||
+        (bishop_attacks(sq, occupied) & (p[by+BISHOP] | p[by+QUEEN])) ||
+        (rook_attacks(sq, occupied) & (p[by+ROOK] | p[by+QUEEN])));
+}
+
+int position_in_check(struct position* pos){
+    int color = pos->to_move;
+    return square_attacked(pos, pos->kings[COLOR_INDEX(color)], oppositecolor(color), pos->colors[0] | pos->colors[1]);
+}
+
+void make_move(struct position* pos, struct undo_record* record, int move){
+    int from = MOVE_FROM(move), to = MOVE_TO(move), flags = MOVE_FLAGS(move);
+    int piece = pos->board[from];
+    int color = pos->to_move;
+    int piece_type = PIECE_SPLIT[piece].type;
+
+    record->move = move;
+    record->captured = pos->board[to];
+    record->castling = pos->castling;
+    record->en_passant = pos->en_passant;
+    record->half_moves = pos->half_moves;
+    record->hash = pos->hash;
+
+    pos->hash ^= en_passant_key(pos);
+
+    // the captured piece, which for en passant stands next to the target square
+    if (flags == FLAG_EN_PASSANT) {
+        int capture_sq = color == WHITE ? to - 8 : to + 8;
+        record->captured = pos->board[capture_sq];
+        remove_piece(pos, capture_sq);
+    }
+    else if (flags & FLAG_CAPTURE) {
+        remove_piece(pos, to);
+    }
+
+    remove_piece(pos, from);
+    put_piece(pos, to, (flags & FLAG_PROMOTION) ? color + KNIGHT + (flags & 3) : piece);
+
+    // castling moves the rook along with the king
+    if (flags == FLAG_KING_CASTLE || flags == FLAG_QUEEN_CASTLE) {
+        struct castle c = CASTLES[2*COLOR_INDEX(color) + (flags == FLAG_QUEEN_CASTLE)];
+        put_piece(pos, c.rook_to, pos->board[c.rook_from]);
+        remove_piece(pos, c.rook_from);
+    }
+
+    int castling = pos->castling & CASTLING_KEEP[from] & CASTLING_KEEP[to];
+    pos->hash ^= ZOBRIST_CASTLING[pos->castling] ^ ZOBRIST_CASTLING[castling];
+    pos->castling = castling;
+
+    pos->en_passant = flags == FLAG_DOUBLE_PUSH ? (from + to) / 2 : -1;
+    pos->half_moves = (piece_type == PAWN || record->captured != NO_PIECE) ? 0 : pos->half_moves + 1;
+
+    pos->to_move = oppositecolor(color);
+    pos->hash ^= ZOBRIST_BLACK ^ en_passant_key(pos);
+}
+
+void unmake_move(struct position* pos, struct undo_record* record){
+    int from = MOVE_FROM(record->move), to = MOVE_TO(record->move), flags = MOVE_FLAGS(record->move);
+    int color = oppositecolor(pos->to_move);
+    int piece = (flags & FLAG_PROMOTION) ? color + PAWN : pos->board[to];
+
+    pos->to_move = color;
+
+    remove_piece(pos, to);
+    put_piece(pos, from, piece);
+
+    if (flags == FLAG_EN_PASSANT) {
+        put_piece(pos, color == WHITE ? to - 8 : to + 8, record->captured);
+    }
+    else if (flags & FLAG_CAPTURE) {
+        put_piece(pos, to, record->captured);
+    }
+
+    if (flags == FLAG_KING_CASTLE || flags == FLAG_QUEEN_CASTLE) {
+        struct castle c = CASTLES[2*COLOR_INDEX(color) + (flags == FLAG_QUEEN_CASTLE)];
+        put_piece(pos, c.rook_from, pos->board[c.rook_to]);
+        remove_piece(pos, c.rook_to);
+    }
+
+    pos->castling = record->castling;
+    pos->en_passant = record->en_passant;
+    pos->half_moves = record->half_moves;
+    pos->hash = record->hash;
+}
+
+void add_moves(struct move_list* list, int from, bitboard targets, int flags){
+    while (targets) {
+        list->moves[list->count++] = MOVE(from, pop_lsb(&targets), flags);
+    }
+}
+
+// a pawn that reaches the last rank adds one move for each promotion piece, in the same order as the python module
+void add_pawn_moves(struct move_list* list, int from, bitboard targets, int flags){
+    int to;
+    while (targets) {
+        to = pop_lsb(&targets);
+        if (to < 8 || to > 55) {
+            for (int i = 0; i < 4; i++) {
+                list->moves[list->count++] = MOVE(from, to, flags | PROMOTE_FLAGS[i]);
+            }
+        }
+        else {
+            list->moves[list->count++] = MOVE(from, to, flags);
+        }
+    }
+}
+
+// generating only legal moves, without playing any of them. first the pieces that give check are found: in a double check only the king can move, in a single check the other pieces have to capture the checking piece or block its line (the evasion mask). then the pinned pieces are found, which may only move along the line between the king and the pinning piece. the king itself may go to every square that is not attacked once it is lifted from the board. only en passant, which removes two pawns from a line at once, is checked by looking at the position after the move. captures and noncaptures are written to two lists, the caller decides how to combine them
+void generate_legal(struct position* pos, struct move_list* captures, struct move_list* noncaptures, int onlycaptures){
+    int color = pos->to_move, enemy = oppositecolor(color), ci = COLOR_INDEX(color);
+    bitboard own = pos->colors[ci], opp = pos->colors[1-ci], occupied = own | opp;
+    int king_sq = pos->kings[ci];
+    bitboard king_bb = 1ULL << king_sq;
+    bitboard enemy_rooks = pos->pieces[enemy+ROOK] | pos->pieces[enemy+QUEEN];
+    bitboard enemy_bishops = pos->pieces[enemy+BISHOP] | pos->pieces[enemy+QUEEN];
+    bitboard targets, attacks, pieces, allowed;
+    int from, to;
+
+    captures->count = 0;
+    noncaptures->count = 0;
+
+    // king moves, checking the target squares with the king taken off the board, so it cant hide behind itself on the line of a slider
+    targets = KING_ATTACKS[king_sq] & (onlycaptures ? opp : ~own);
+    while (targets) {
+        to = pop_lsb(&targets);
+        if (!square_attacked(pos, to, enemy, occupied ^ king_bb)) {
+            if ((1ULL << to) & opp) {
+                captures->moves[captures->count++] = MOVE(king_sq, to, FLAG_CAPTURE);
+            }
+            else {
+                noncaptures->moves[noncaptures->count++] = MOVE(king_sq, to, FLAG_QUIET);
+            }
+        }
+    }
+
+    bitboard checkers = attackers_to(pos, king_sq, enemy, occupied);
+    bitboard evasion_mask = ~0ULL;
+    if (checkers & (checkers - 1)) {
+        return;
+    }
+    else if (checkers) {
+        evasion_mask = checkers | BETWEEN[king_sq][__builtin_ctzll(checkers)];
+    }
+
+    // a piece is pinned if it is the only piece between the king and an enemy slider on the same line
+    bitboard pinned = 0;
+    bitboard pin_line[64];
+    bitboard snipers = (rook_attacks(king_sq, 0) & enemy_rooks) | (bishop_attacks(king_sq, 0) & enemy_bishops);
+    while (snipers) {
+        int sniper_sq = pop_lsb(&snipers);
+        bitboard blockers = BETWEEN[king_sq][sniper_sq] & occupied;
+        if (blockers && !(blockers & (blockers - 1)) && (blockers & own)) {
+            pinned |= blockers;
+            pin_line[__builtin_ctzll(blockers)] = BETWEEN[king_sq][sniper_sq] | (1ULL << sniper_sq);
+        }
+    }
+
+    bitboard capture_mask = opp & evasion_mask;
+    bitboard quiet_mask = onlycaptures ? 0 : ~occupied & evasion_mask;
+
+    // knights, bishops, rooks and queens
+    for (int piece_type = KNIGHT; piece_type <= QUEEN; piece_type++) {
+        pieces = pos->pieces[color + piece_type];
+        while (pieces) {
+            from = pop_lsb(&pieces);
+            attacks = piece_type == KNIGHT ? KNIGHT_ATTACKS[from] : slider_attacks(from, occupied, piece_type);
+            allowed = (pinned & (1ULL << from)) ? pin_line[from] : ~0ULL;
+            add_moves(captures, from, attacks & capture_mask & allowed, FLAG_CAPTURE);
+            add_moves(noncaptures, from, attacks & quiet_mask & allowed, FLAG_QUIET);
+        }
+    }
+
+    // pawns. the quiet promotions go into the noncaptures, the same as in pseudo_legal_moves
+    int forward = color == WHITE ? 8 : -8;
+    int start_rank = color == WHITE ? 1 : 6;
+    pieces = pos->pieces[color + PAWN];
+    while (pieces) {
+        from = pop_lsb(&pieces);
+        allowed = (pinned & (1ULL << from)) ? pin_line[from] : ~0ULL;
+        add_pawn_moves(captures, from, PAWN_ATTACKS[ci][from] & capture_mask & allowed, FLAG_CAPTURE);
+
+        to = from + forward;
+        if (!onlycaptures && !(occupied & (1ULL << to))) {
+            add_pawn_moves(noncaptures, from, (1ULL << to) & evasion_mask & allowed, FLAG_QUIET);
+            if (INT2YX[from].y == start_rank && !(occupied & (1ULL << (to + forward)))) {
+                add_moves(noncaptures, from, (1ULL << (to + forward)) & evasion_mask & allowed, FLAG_DOUBLE_PUSH);
+            }
+        }
+    }
+
+    // en passant. the position after the capture is checked directly, because the captured pawn and the capturing pawn can both leave the same line at once
+    if (pos->en_passant >= 0) {
+        int capture_sq = color == WHITE ? pos->en_passant - 8 : pos->en_passant + 8;
+        pieces = PAWN_ATTACKS[1-ci][pos->en_passant] & pos->pieces[color + PAWN];
+        while (pieces) {
+            from = pop_lsb(&pieces);
+            bitboard after = (occupied ^ (1ULL << from) ^ (1ULL << capture_sq)) | (1ULL << pos->en_passant);
+            bitboard remaining_checkers = checkers & ~(1ULL << capture_sq);
+            if (remaining_checkers && !((1ULL << pos->en_passant) & evasion_mask)) {
+                continue;
+            }
+            if (!(rook_attacks(king_sq, after) & enemy_rooks) && !(bishop_attacks(king_sq, after) & enemy_bishops)) {
+                captures->moves[captures->count++] = MOVE(from, pos->en_passant, FLAG_EN_PASSANT);
+            }
+        }
+    }
+
+    // castling, only out of a position without check and if the king does not pass through or land on an attacked square
+    if (!onlycaptures && !checkers && pos->castling) {
+        for (int i = 2*ci; i < 2*ci + 2; i++) {
+            struct castle c = CASTLES[i];
+            if ((pos->castling & c.right) && !(occupied & c.empty) &&
+                !square_attacked(pos, c.king_passes, enemy, occupied) && !square_attacked(pos, c.king_to, enemy, occupied)) {
+                noncaptures->moves[noncaptures->count++] = MOVE(c.king_from, c.king_to, c.king_to > c.king_from ? FLAG_KING_CASTLE : FLAG_QUEEN_CASTLE);
+            }
+        }
+    }
+}
+
+// counting the leaf nodes of the move tree. the last ply only needs the number of legal moves, they dont have to be played. stack points to the undo record for the next move, so each ply uses the one after it
+long long perft(struct position* pos, struct undo_record* stack, int depth){
+    struct move_list captures, noncaptures;
+    long long nodes = 0;
+
+    if (depth == 0) {
+        return 1;
+    }
+
+    generate_legal(pos, &captures, &noncaptures, 0);
+    if (depth == 1) {
+        return captures.count + noncaptures.count;
+    }
+
+    for (int i = 0; i < captures.count; i++) {
+        make_move(pos, stack, captures.moves[i]);
+        nodes += perft(pos, stack + 1, depth - 1);
+        unmake_move(pos, stack);
+    }
+    for (int i = 0; i < noncaptures.count; i++) {
+        make_move(pos, stack, noncaptures.moves[i]);
+        nodes += perft(pos, stack + 1, depth - 1);
+        unmake_move(pos, stack);
+    }
+    return nodes;
+}
+
+// the piece values of the static exchange evaluation, by piece type. the king is worth more than everything else together, so it only takes part in an exchange as the last capture
+int SEE_VALUES[7] = {0, 20000, 100, 300, 300, 500, 900};
+
+// the order in which the pieces of a side capture on the exchange square, least valuable first
+int SEE_ORDER[6] = {2, 3, 4, 5, 6, 1};
+
+// static exchange evaluation: the material a capture (or a quiet move to a square) wins or loses if both sides keep capturing on its target square, always with their least valuable piece, and every side may stop capturing when that is better for it. gain[d] is the balance for the side that makes capture d, if the piece it captures with is taken back afterwards. sliding pieces behind a piece that captured become attackers as soon as it leaves the line (x-rays). pins are not looked at
+int see(struct position* pos, int move){
+    int from = MOVE_FROM(move), to = MOVE_TO(move), flags = MOVE_FLAGS(move);
+    int gain[32], d = 0;
+    int side = PIECE_SPLIT[pos->board[from]].color;
+    int piece_type = PIECE_SPLIT[pos->board[from]].type;
+    bitboard* p = pos->pieces;
+    bitboard occupied = pos->colors[0] | pos->colors[1];
+    bitboard diagonal = p[WHITE+BISHOP] | p[WHITE+QUEEN] | p[BLACK+BISHOP] | p[BLACK+QUEEN];
+    bitboard straight = p[WHITE+ROOK] | p[WHITE+QUEEN] | p[BLACK+ROOK] | p[BLACK+QUEEN];
+
+    gain[0] = SEE_VALUES[PIECE_SPLIT[pos->board[to]].type];
+    if (flags == FLAG_EN_PASSANT) {
+        gain[0] = SEE_VALUES[PAWN];
+        occupied ^= 1ULL << (side == WHITE ? to - 8 : to + 8);
+    }
+    if (flags & FLAG_PROMOTION) {
+        piece_type = KNIGHT + (flags & 3);
+        gain[0] += SEE_VALUES[piece_type] - SEE_VALUES[PAWN];
+    }
+
+    bitboard attackers = attackers_to(pos, to, WHITE, occupied) | attackers_to(pos, to, BLACK, occupied);
+    bitboard from_bb = 1ULL << from;
+    do {
+        d++;
+        gain[d] = SEE_VALUES[piece_type] - gain[d-1];
+
+        // the piece that captured last leaves its square, which can uncover a slider behind it
+        occupied ^= from_bb;
+        attackers |= (bishop_attacks(to, occupied) & diagonal) | (rook_attacks(to, occupied) & straight);
+        attackers &= occupied;
+
+        side = oppositecolor(side);
+        from_bb = 0;
+        bitboard own = attackers & pos->colors[COLOR_INDEX(side)];
+        for (int i = 0; i < 6 && own; i++) {
+            bitboard candidates = own & p[side + SEE_ORDER[i]];
+            if (candidates) {
+                from_bb = candidates & -candidates;
+                piece_type = SEE_ORDER[i];
+                break;
+            }
+        }
+
+        // the king may only capture if the square is not defended anymore
+        if (piece_type == KING && from_bb && (attackers & pos->colors[COLOR_INDEX(oppositecolor(side))])) {
+            from_bb = 0;
+        }
+    } while (from_bb && d < 31);
+
+    // going back through the exchange, every side only continues if that is better than stopping. the last gain is not used, because nobody was left to capture there
+    while (--d) {
+        gain[d-1] = -(-gain[d-1] > gain[d] ? -gain[d-1] : gain[d]);
+    }
+    return gain[0];
+}
+
+// filling a position from the values of the python board class. castling_rights is one iterable of rights, for one or both colors
+int load_position(struct position* pos, PyObject* py_board, int to_move, PyObject* castling_rights, int en_passant, int half_moves){
+    Py_buffer board_view;
+
+    if (get_board(py_board, &board_view) != 0) {
+        return -1;
+    }
+    const unsigned char* board = board_view.buf;
+
+    memset(pos, 0, sizeof(struct position));
+    for (int sq = 0; sq < 64; sq++) {
+        if (board[sq] != NO_PIECE) {
+            put_piece(pos, sq, board[sq]);
+        }
+    }
+    PyBuffer_Release(&board_view);
+
+    PyObject* castling_iter = PyObject_GetIter(castling_rights);
+    if (!castling_iter) {
+        return -1;
+    }
+    PyObject* right;
+    while ((right = PyIter_Next(castling_iter))) {
+        long r = PyLong_AsLong(right);
+        Py_DECREF(right);
+        for (int i = 0; i < 4; i++) {
+            if (CASTLING_RIGHT_PIECES[i] == r) {
+                pos->castling |= 1 << i;
+            }
+        }
+    }
+    Py_DECREF(castling_iter);
+    if (PyErr_Occurred()) {
+        return -1;
+    }
+
+    pos->to_move = to_move;
+    pos->en_passant = en_passant;
+    pos->half_moves = half_moves;
+    pos->hash ^= ZOBRIST_CASTLING[pos->castling] ^ en_passant_key(pos);
+    if (to_move == BLACK) {
+        pos->hash ^= ZOBRIST_BLACK;
+    }
+    return 0;
+}
+
+// appending the moves of a move list to a python list, as the shared move ints
+int append_moves(PyObject* py_list, struct move_list* list){
+    for (int i = 0; i < list->count; i++) {
+        PyObject* move = move_object(list->moves[i]);
+        if (!move) {
+            return -1;
+        }
+        int result = PyList_Append(py_list, move);
+        Py_DECREF(move);
+        if (result < 0) {
+            return -1;
+        }
+    }
+    return 0;
+}
+
+// loading the zobrist mask of the python module: a list of 64 dicts (piece int -> key), the key for black to move, a dict of castling right -> key and a list of 8 en passant file keys
+static PyObject* set_zobrist(PyObject* self, PyObject* args) {
+    PyObject *board_mask, *castling_mask, *en_passant_mask, *square_mask, *key;
+    unsigned long long black_mask;
+    bitboard castling_keys[4];
+
+    if (!PyArg_ParseTuple(args, "OKOO", &board_mask, &black_mask, &castling_mask, &en_passant_mask)) {
+        return NULL;
+    }
+
+    for (int sq = 0; sq < 64; sq++) {
+        square_mask = PySequence_GetItem(board_mask, sq);
+        if (!square_mask) {
+            return NULL;
+        }
+        for (int piece = 0; piece < 23; piece++) {
+            ZOBRIST_PIECES[sq][piece] = 0;
+            if (PIECE_SPLIT[piece].type <= 0) {
+                continue;
+            }
+            key = PyLong_FromLong(piece);
+            if (!key) {
+                Py_DECREF(square_mask);
+                return NULL;
+            }
+            PyObject* value = PyObject_GetItem(square_mask, key);
+            Py_DECREF(key);
+            if (!value) {
+                Py_DECREF(square_mask);
+                return NULL;
+            }
+            ZOBRIST_PIECES[sq][piece] = PyLong_AsUnsignedLongLong(value);
+            Py_DECREF(value);
+        }
+        Py_DECREF(square_mask);
+    }
+
+    for (int i = 0; i < 4; i++) {
+        key = PyLong_FromLong(CASTLING_RIGHT_PIECES[i]);
+        if (!key) {
+            return NULL;
+        }
+        PyObject* value = PyObject_GetItem(castling_mask, key);
+        Py_DECREF(key);
+        if (!value) {
+            return NULL;
+        }
+        castling_keys[i] = PyLong_AsUnsignedLongLong(value);
+        Py_DECREF(value);
+    }
+    for (int rights = 0; rights < 16; rights++) {
+        ZOBRIST_CASTLING[rights] = 0;
+        for (int i = 0; i < 4; i++) {
+            if (rights & (1 << i)) {
+                ZOBRIST_CASTLING[rights] ^= castling_keys[i];
+            }
+        }
+    }
+
+    for (int file = 0; file < 8; file++) {
+        PyObject* value = PySequence_GetItem(en_passant_mask, file);
+        if (!value) {
+            return NULL;
+        }
+        ZOBRIST_EN_PASSANT[file] = PyLong_AsUnsignedLongLong(value);
+        Py_DECREF(value);
+    }
+
+    ZOBRIST_BLACK = black_mask;
+
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+    zobrist_loaded = 1;
+    Py_RETURN_NONE;
+}
+
+// the legal moves for the python board class, with the same arguments as pseudo_legal_moves (but without piece_loc) and the same return value, a tuple of noncaptures and captures
+static PyObject* fully_legal_moves(PyObject* self, PyObject* args) {
+    PyObject *py_board, *castling_rights;
+    int color, en_passant_target, onlycaptures = 0;
+    struct position pos;
+    struct move_list captures, noncaptures;
+
+    if (!PyArg_ParseTuple(args, "OOii|p", &py_board, &castling_rights, &color, &en_passant_target, &onlycaptures)) {
+        return NULL;
+    }
+    if (load_position(&pos, py_board, color, castling_rights, en_passant_target, 0) != 0) {
+        return NULL;
+    }
+
+    generate_legal(&pos, &captures, &noncaptures, onlycaptures);
+
+    PyObject* py_noncaptures = PyList_New(0);
+    PyObject* py_captures = PyList_New(0);
+    if (!py_noncaptures || !py_captures || append_moves(py_noncaptures, &noncaptures) != 0 || append_moves(py_captures, &captures) != 0) {
+        Py_XDECREF(py_noncaptures);
+        Py_XDECREF(py_captures);
+        return NULL;
+    }
+
+    PyObject* tmp_return = Py_BuildValue("(OO)", py_noncaptures, py_captures);
+    Py_DECREF(py_noncaptures);
+    Py_DECREF(py_captures);
     return tmp_return;
 }
 
+// whether a move is legal on the python board, with the same arguments as fully_legal_moves followed by the move. the legal moves are only generated into C lists (only the captures, if the move is one), so no python list or int is built for them. this is meant for a single move that may come from a different position, like the move of a transposition table entry
+static PyObject* legal_move(PyObject* self, PyObject* args) {
+    PyObject *py_board, *castling_rights;
+    int color, en_passant_target, move;
+    struct position pos;
+    struct move_list captures, noncaptures;
+
+    if (!PyArg_ParseTuple(args, "OOiii", &py_board, &castling_rights, &color, &en_passant_target, &move)) {
+        return NULL;
+    }
+    if (load_position(&pos, py_board, color, castling_rights, en_passant_target, 0) != 0) {
+        return NULL;
+    }
+
+    int is_capture = (move >> 12) & FLAG_CAPTURE;
+    generate_legal(&pos, &captures, &noncaptures, is_capture);
+
+    struct move_list* list = is_capture ? &captures : &noncaptures;
+    for (int i = 0; i < list->count; i++) {
+        if (list->moves[i] == move) {
+            Py_RETURN_TRUE;
+        }
+    }
+    Py_RETURN_FALSE;
+}
+
+// the static exchange evaluation of a list of moves on a python board, given back as a list of ints in the same order. the position is only loaded once for all of them
+static PyObject* static_exchange(PyObject* self, PyObject* args) {
+    PyObject *py_board, *py_moves;
+    Py_buffer board_view;
+    struct position pos;
+
+    if (!PyArg_ParseTuple(args, "OO", &py_board, &py_moves)) {
+        return NULL;
+    }
+    if (get_board(py_board, &board_view) != 0) {
+        return NULL;
+    }
+    const unsigned char* board = board_view.buf;
+    memset(&pos, 0, sizeof(struct position));
+    for (int sq = 0; sq < 64; sq++) {
+        if (board[sq] != NO_PIECE) {
+            put_piece(&pos, sq, board[sq]);
+        }
+    }
+    PyBuffer_Release(&board_view);
+
+    PyObject* moves = PySequence_Fast(py_moves, "moves must be a sequence");
+    if (!moves) {
+        return NULL;
+    }
+    Py_ssize_t count = PySequence_Fast_GET_SIZE(moves);
+    PyObject* values = PyList_New(count);
+    if (!values) {
+        Py_DECREF(moves);
+        return NULL;
+    }
+    for (Py_ssize_t i = 0; i < count; i++) {
+        long move = PyLong_AsLong(PySequence_Fast_GET_ITEM(moves, i));
+        if (move == -1 && PyErr_Occurred()) {
+            Py_DECREF(moves);
+            Py_DECREF(values);
+            return NULL;
+        }
+        PyObject* value = PyLong_FromLong(see(&pos, move & 0xFFFF));
+        if (!value) {
+            Py_DECREF(moves);
+            Py_DECREF(values);
+            return NULL;
+        }
+        PyList_SET_ITEM(values, i, value);
+    }
+    Py_DECREF(moves);
+    return values;
+}
+
+// Position(board, to_move, castling_rights, en_passant_target, half_moves), with the same values as the python board class (castling_rights is one iterable for both colors)
+static int Position_init(PositionObject* self, PyObject* args, PyObject* kwds) {
+    PyObject *py_board, *castling_rights;
+    int to_move, en_passant, half_moves;
+
+    if (!zobrist_loaded) {
+        PyErr_SetString(PyExc_RuntimeError, "set_zobrist has to be called before creating a Position");
+        return -1;
+    }
+
+    if (!PyArg_ParseTuple(args, "OiOii", &py_board, &to_move, &castling_rights, &en_passant, &half_moves)) {
+        return -1;
+    }
+    self->ply = 0;
+    return load_position(&self->pos, py_board, to_move, castling_rights, en_passant, half_moves);
+}
+
+// the move is trusted to be legal, the same as for the move function of the python board class
+static PyObject* Position_make(PositionObject* self, PyObject* args) {
+    int move;
+
+    if (!PyArg_ParseTuple(args, "i", &move)) {
+        return NULL;
+    }
+    if (self->ply == MAX_GAME_PLY) {
+        PyErr_SetString(PyExc_IndexError, "too many moves made on this position");
+        return NULL;
+    }
+    make_move(&self->pos, &self->history[self->ply++], move & 0xFFFF);
+    Py_RETURN_NONE;
+}
+
+static PyObject* Position_unmake(PositionObject* self, PyObject* Py_UNUSED(ignored)) {
+    if (self->ply == 0) {
+        PyErr_SetString(PyExc_IndexError, "no move to take back");
+        return NULL;
+    }
+    unmake_move(&self->pos, &self->history[--self->ply]);
+    Py_RETURN_NONE;
+}
+
+// the captures come first, the same as in the legal_moves function of the python board class
+static PyObject* Position_legal_moves(PositionObject* self, PyObject* args, PyObject* kwds) {
+    static char* kwlist[] = {"onlycaptures", NULL};
+    int onlycaptures = 0;
+    struct move_list captures, noncaptures;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|p", kwlist, &onlycaptures)) {
+        return NULL;
+    }
+    generate_legal(&self->pos, &captures, &noncaptures, onlycaptures);
+
+    PyObject* moves = PyList_New(0);
+    if (!moves || append_moves(moves, &captures) != 0 || append_moves(moves, &noncaptures) != 0) {
+        Py_XDECREF(moves);
+        return NULL;
+    }
+    return moves;
+}
+
+static PyObject* Position_hash(PositionObject* self, PyObject* Py_UNUSED(ignored)) {
+    return PyLong_FromUnsignedLongLong(self->pos.hash);
+}
+
+static PyObject* Position_in_check(PositionObject* self, PyObject* Py_UNUSED(ignored)) {
+    return PyBool_FromLong(position_in_check(&self->pos));
+}
+
+static PyObject* Position_see(PositionObject* self, PyObject* args) {
+    int move;
+
+    if (!PyArg_ParseTuple(args, "i", &move)) {
+        return NULL;
+    }
+    return PyLong_FromLong(see(&self->pos, move & 0xFFFF));
+}
+
+static PyObject* Position_perft(PositionObject* self, PyObject* args) {
+    int depth;
+
+    if (!PyArg_ParseTuple(args, "i", &depth)) {
+        return NULL;
+    }
+    if (depth < 0 || self->ply + depth > MAX_GAME_PLY) {
+        PyErr_SetString(PyExc_ValueError, "invalid perft depth");
+        return NULL;
+    }
+    return PyLong_FromLongLong(perft(&self->pos, &self->history[self->ply], depth));
+}
+
+static PyMethodDef Position_methods[] = {
+    {"make", (PyCFunction)Position_make, METH_VARARGS, "Plays a move given as packed int"},
+    {"unmake", (PyCFunction)Position_unmake, METH_NOARGS, "Takes back the last move"},
+    {"legal_moves", (PyCFunction)(void(*)(void))Position_legal_moves, METH_VARARGS | METH_KEYWORDS, "Returns a list of all legal moves, or only the captures"},
+    {"hash", (PyCFunction)Position_hash, METH_NOARGS, "Returns the zobrist hash of the position"},
+    {"in_check", (PyCFunction)Position_in_check, METH_NOARGS, "Returns if the player to move stands in check"},
+    {"perft", (PyCFunction)Position_perft, METH_VARARGS, "Counts the leaf nodes of the move tree to the given depth"},
+    {"see", (PyCFunction)Position_see, METH_VARARGS, "Returns the static exchange evaluation of a move"},
+    {NULL, NULL, 0, NULL} /* Sentinel */
+};
+
+static PyMemberDef Position_members[] = {
+    {"to_move", T_INT, offsetof(PositionObject, pos.to_move), READONLY, "The color to move"},
+    {"en_passant_target", T_INT, offsetof(PositionObject, pos.en_passant), READONLY, "The en passant square or -1"},
+    {"half_moves", T_INT, offsetof(PositionObject, pos.half_moves), READONLY, "Half moves since the last capture or pawn move"},
+    {"ply", T_INT, offsetof(PositionObject, ply), READONLY, "Number of moves that can be taken back"},
+    {NULL} /* Sentinel */
+};
+
+static PyTypeObject PositionType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "chess_extension.Position",
+    .tp_doc = "Chess position that makes and takes back moves in C",
+    .tp_basicsize = sizeof(PositionObject),
+    .tp_itemsize = 0,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)Position_init,
+    .tp_methods = Position_methods,
+    .tp_members = Position_members,
+};
+
 
 // MODULE INIT
 
 static PyMethodDef ChessExtensionMethods[] = {
-    {"check_possible_king_capt", king_capt, METH_VARARGS, "Checks if the king could be captured"},
     {"update_reachable", update_reachable, METH_VARARGS, "Updates the reachable dict and returns it"},
     {"pseudo_legal_moves", pseudo_legal, METH_VARARGS, "Returns 2 lists, that combine to all the pseudo legal moves in the position"},
+    {"fully_legal_moves", fully_legal_moves, METH_VARARGS, "Returns 2 lists, that combine to all the legal moves in the position"},
+    {"set_zobrist", set_zobrist, METH_VARARGS, "Loads the zobrist mask that Position objects use for their hash"},
+    {"legal_move", legal_move, METH_VARARGS, "Checks if a single move is legal in the position"},
+    {"static_exchange", static_exchange, METH_VARARGS, "Returns the static exchange evaluation of each move in a list"},
     {NULL, NULL, 0, NULL} /* Sentinel */
 };
 
@@ -815,5 +1716,27 @@ static struct PyModuleDef chess_extension_module = {
 };
 
 PyMODINIT_FUNC PyInit_chess_extension(void) {
-    return PyModule_Create(&chess_extension_module);
+    // filling the attack tables of the sliding pieces once, before any function of the module can be called
+    init_magics(ROOK, ROOK_MAGICS, ROOK_TABLE);
+    init_magics(BISHOP, BISHOP_MAGICS, BISHOP_TABLE);
+    init_between();
+    init_leapers();
+
+    if (PyType_Ready(&PositionType) < 0) {
+        return NULL;
+    }
+
+    PyObject* module = PyModule_Create(&chess_extension_module);
+    if (!module) {
+        return NULL;
+    }
+
+    Py_INCREF(&PositionType);
+    if (PyModule_AddObject(module, "Position", (PyObject*)&PositionType) < 0) {
+        Py_DECREF(&PositionType);
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    return module;
 }
\ No newline at end of file
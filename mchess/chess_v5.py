@@ -1,6 +1,6 @@
-# tweaked version that changes internal board (2d->1d), move (mixed->5-tuple) and piece (class->int) mechanics to be more compatible with planned C extension
+# tweaked version that changes internal board (2d->1d), move (mixed->packed int) and piece (class->int) mechanics to be compatible with the C extension
 # includes zobrist hash functionality, which was moved from bot module to here for potentially faster calculation
-# this is the last "standalone"/ pure python version, the next versions will include C extensions
+# the move generation and static exchange evaluation run in the C extension, together with the Position class that perft uses to count whole move trees in C (chess_extension.c, see setup.py), which has to be built before this module can be imported. the last pure python version is kept in pure_python_standalone
 
 from collections import defaultdict
 import json
@@ -8,9 +8,13 @@ import os
 import random
 
 # functions written in C
-from chess_extension import check_possible_king_capt
 from chess_extension import update_reachable
 from chess_extension import pseudo_legal_moves
+from chess_extension import fully_legal_moves
+from chess_extension import set_zobrist
+from chess_extension import static_exchange
+from chess_extension import legal_move
+from chess_extension import Position
 
 import cProfile # for timing and performance optimization
 
@@ -27,22 +31,27 @@ def cnote2tuple(cnote):
     x = "abcdefgh".index(char)
     return (y,x)
 
+# moves are packed into a single int of 16 bits: the from square (bits 0-5), the to square (bits 6-11) and 4 bits of flags (bits 12-15) that tell what kind of move it is, see the FLAG constants. this int is what the C extension generates, what the board plays and what the bot sorts and stores, so no move tuple has to be created or unpacked on the way
+def pack_move(from_sq, to_sq, flags=0):
+    return from_sq | (to_sq << 6) | (flags << 12)
+
+# converting a packed move to the 5-tuple (from_y, from_x, to_y, to_x, promotion piece) that was used as move notation before, e.g. for the GUI, which works with the (y,x) coordinates of the squares. a promoting pawn always belongs to the color whose last rank it reaches
+def move2tuple(move):
+    from_sq, to_sq, flags = move & 63, (move >> 6) & 63, move >> 12
+    prom = 0
+    if flags & FLAG_PROMOTION:
+        prom = (WHITE if to_sq > 55 else BLACK) + KNIGHT + (flags & 3)
+    return INT2YX[from_sq] + INT2YX[to_sq] + (prom,)
+
 # converting a move of our own chess game to the uci notation used by python chess module
 def move2uci(move):
+    uci = SQUARE_NAMES[move & 63] + SQUARE_NAMES[(move >> 6) & 63]
 
-    fy,fx,ty,tx,prom = move
+    # special case promotion, the uci notation appends the lowercase piece letter
+    if move >> 12 & FLAG_PROMOTION:
+        uci += "nbrq"[move >> 12 & 3]
 
-    c_convert = "abcdefgh"
-    uci_c_from, uci_c_to = c_convert[fx], c_convert[tx]
-    uci_d_from, uci_d_to = fy+1, ty+1
-
-    uci = [uci_c_from, str(uci_d_from), uci_c_to, str(uci_d_to)]
-
-    # special case promotion, when our move tuple has a third component
-    if prom != 0:
-        uci.append(PIECE_PROMOTION[prom].lower())
-    
-    return "".join(uci)
+    return uci
 
 # this function runs tests on pre-defined and known positions to see if our created board class works correctly. it is mainly an extension to the already existing Board.find_variations_compare, but allows to test multiple positions. i use it to test the class after each major change in the code
 def test_module():
@@ -66,6 +75,23 @@ def test_module():
         # running the test and printing the result
         print(b.find_variations_compare(depth, c))
 
+# loading in the previously created zobrist mask, only once per process. the json file has a dict of piece -> number for every square, which is turned into tuples indexed by the piece integer (0 where there is no such piece), so that all boards can share the same mask without being able to change it, and still look up the numbers as before. gives back (board mask, black mask, castling mask, en passant mask)
+def load_zobrist():
+    global ZOBRIST_MASK
+    if ZOBRIST_MASK is None:
+        with open(ZOBRIST_FILE) as json_file:
+            temp_zobr = json.load(json_file)
+
+        pieces = range(BLACK+QUEEN+1)
+        board_mask = tuple(tuple(square_mask.get(str(piece), 0) for piece in pieces) for square_mask in temp_zobr['board_mask'])
+        castling_mask = tuple(temp_zobr['castling_mask'].get(str(piece), 0) for piece in pieces)
+        ZOBRIST_MASK = (board_mask, temp_zobr['black_mask'], castling_mask, tuple(temp_zobr['en_passant_mask']))
+
+        # the C positions hash with the same mask, so that their hashes can be used interchangeably with ours
+        set_zobrist(*ZOBRIST_MASK)
+
+    return ZOBRIST_MASK
+
 # endregion
 
 
@@ -78,12 +104,18 @@ TEST_POSITIONS_FILE = os.path.join(ABS_DIR_PATH, "testing/debug_positions.json")
 
 ZOBRIST_FILE = os.path.join(ABS_DIR_PATH, "data/zobrist_mask.json")
 
+# the zobrist mask of this process, loaded from the file the first time a board is created and then shared by all boards (see load_zobrist)
+ZOBRIST_MASK = None
+
 # mapping of rank/file to internal board square number
 YX2INT = {(0, 0): 0, (0, 1): 1, (0, 2): 2, (0, 3): 3, (0, 4): 4, (0, 5): 5, (0, 6): 6, (0, 7): 7, (1, 0): 8, (1, 1): 9, (1, 2): 10, (1, 3): 11, (1, 4): 12, (1, 5): 13, (1, 6): 14, (1, 7): 15, (2, 0): 16, (2, 1): 17, (2, 2): 18, (2, 3): 19, (2, 4): 20, (2, 5): 21, (2, 6): 22, (2, 7): 23, (3, 0): 24, (3, 1): 25, (3, 2): 26, (3, 3): 27, (3, 4): 28, (3, 5): 29, (3, 6): 30, (3, 7): 31, (4, 0): 32, (4, 1): 33, (4, 2): 34, (4, 3): 35, (4, 4): 36, (4, 5): 37, (4, 6): 38, (4, 7): 39, (5, 0): 40, (5, 1): 41, (5, 2): 42, (5, 3): 43, (5, 4): 44, (5, 5): 45, (5, 6): 46, (5, 7): 47, (6, 0): 48, (6, 1): 49, (6, 2): 50, (6, 3): 51, (6, 4): 52, (6, 5): 53, (6, 6): 54, (6, 7): 55, (7, 0): 56, (7, 1): 57, (7, 2): 58, (7, 3): 59, (7, 4): 60, (7, 5): 61, (7, 6): 62, (7, 7): 63}
 
 # opposite mapping of board square to rank/file
 INT2YX = {value: key for key, value in YX2INT.items()}
 
+# the chess notation of every board square, e.g. "e4"
+SQUARE_NAMES = ["abcdefgh"[sq % 8] + str(sq // 8 + 1) for sq in range(64)]
+
 FEN_START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 
 # pieces and colors have an integer assigned to speed up comparison processes. the combination of color+piece is uniquely identifiable
@@ -133,53 +165,73 @@ PIECE_MOVEMENT_PATTERNS = {
     KNIGHT: [[(2,1)],[(1,2)],[(-1,2)],[(-2,1)],[(-2,-1)],[(-1,-2)],[(1,-2)],[(2,-1)]],
     PAWN: {"move": [[(1,0)]], "double_move": [[(2,0)]], "capture": [[(1,-1)],[(1,1)]]}}
 
+# the flags in the upper 4 bits of a packed move (see pack_move). the capture bit (4) is set for every capture including en passant, the promotion bit (8) for every promotion, in which case the lowest 2 bits give the promotion piece, counted from the knight (0 knight, 1 bishop, 2 rook, 3 queen). the C extension uses the same numbers
+FLAG_QUIET = 0
+FLAG_DOUBLE_PUSH = 1
+FLAG_KING_CASTLE = 2
+FLAG_QUEEN_CASTLE = 3
+FLAG_CAPTURE = 4
+FLAG_EN_PASSANT = 5
+FLAG_PROMOTION = 8
+
 # lookup for everything related to the special move castle
 CASTLE = {
     "empty": {WKING: [5,6], WQUEEN: [1,2,3],
             BKING: [61,62], BQUEEN: [57,58,59]},
-    "kingmove": {WKING: (0,4,0,6,0), WQUEEN: (0,4,0,2,0),
-            BKING: (7,4,7,6,0), BQUEEN: (7,4,7,2,0)},
-    "rookmove": {(0,4,0,6,0): (0,7,0,5,0), (0,4,0,2,0): (0,0,0,3,0),
-            (7,4,7,6,0): (7,7,7,5,0), (7,4,7,2,0): (7,0,7,3,0)},
-    "check": {(0,4,0,6,0): [4,5,6], (0,4,0,2,0): [4,3,2],
-            (7,4,7,6,0): [60,61,62], (7,4,7,2,0): [60,59,58]},
-    "update": {(0,4,0,6,0): [4,5,6,7], (0,4,0,2,0): [4,3,2,0],
-            (7,4,7,6,0): [60,61,62,63], (7,4,7,2,0): [60,59,58,56]},
+    "kingmove": {WKING: pack_move(4,6,FLAG_KING_CASTLE), WQUEEN: pack_move(4,2,FLAG_QUEEN_CASTLE),
+            BKING: pack_move(60,62,FLAG_KING_CASTLE), BQUEEN: pack_move(60,58,FLAG_QUEEN_CASTLE)},
+    "rookmove": {pack_move(4,6,FLAG_KING_CASTLE): pack_move(7,5), pack_move(4,2,FLAG_QUEEN_CASTLE): pack_move(0,3),
+            pack_move(60,62,FLAG_KING_CASTLE): pack_move(63,61), pack_move(60,58,FLAG_QUEEN_CASTLE): pack_move(56,59)},
+    "check": {pack_move(4,6,FLAG_KING_CASTLE): [4,5,6], pack_move(4,2,FLAG_QUEEN_CASTLE): [4,3,2],
+            pack_move(60,62,FLAG_KING_CASTLE): [60,61,62], pack_move(60,58,FLAG_QUEEN_CASTLE): [60,59,58]},
+    "update": {pack_move(4,6,FLAG_KING_CASTLE): [4,5,6,7], pack_move(4,2,FLAG_QUEEN_CASTLE): [4,3,2,0],
+            pack_move(60,62,FLAG_KING_CASTLE): [60,61,62,63], pack_move(60,58,FLAG_QUEEN_CASTLE): [60,59,58,56]},
     "rights": {0: WQUEEN, 7: WKING, 56: BQUEEN, 63: BKING}}
 
-# lookup to handle everything related to special move promotion
+# lookup to handle everything related to special move promotion. the flags are those of the options (queen, rook, bishop, knight), which are the same for both colors
 PROMOTE = {
     "rank": {WHITE: 7, BLACK: 0},
-    "options": {WHITE: [WQUEEN,WROOK,WBISHOP,WKNIGHT], BLACK: [BQUEEN,BROOK,BBISHOP,BKNIGHT]}}
-
-# lookup for everything related to the special move en passant
-EN_PASSANT = {WHITE: {"to_rank": 3, "from_rank": 1, "target": 2}, BLACK: {"to_rank": 4, "from_rank": 6, "target": 5}}
-
-# the following dict keys will be used a lot for the undo_move functionality, and to speed it up slightly, we assign integer values
-BOARD = 30
-KINGS = 31
-IN_CHECK = 32
-THREEFOLD = 33
-PIECE_LOC = 34
-REACHABLE = 35
-EN_PASSANT_TARGET = 36
-HALF_MOVES = 37
-FULL_MOVES = 38
-CASTLING_RIGHTS = 39
-GAMEOVER = 40
-LAST_MOVE = 41
-ADD = 42
-REMOVE = 43
-SUBTRACT = 44
-REPLACE = 45
-ZOBR_HASH = 46
-
-# mapping the key string (which are needed for debugging) to the according integers
-CHANGES_KEYS = {"board": BOARD, "kings": KINGS, "in_check": IN_CHECK, "threefold": THREEFOLD, "piece_loc": PIECE_LOC, "reachable": REACHABLE, "en_passant_target": EN_PASSANT_TARGET, "half_moves": HALF_MOVES, "full_moves": FULL_MOVES, "castling_rights": CASTLING_RIGHTS, "gameover": GAMEOVER, "last_move": LAST_MOVE, "add": ADD, "remove": REMOVE, "subtract": SUBTRACT, "replace": REPLACE, "zobr_hash": ZOBR_HASH}
+    "options": {WHITE: [WQUEEN,WROOK,WBISHOP,WKNIGHT], BLACK: [BQUEEN,BROOK,BBISHOP,BKNIGHT]},
+    "flags": [FLAG_PROMOTION | (QUEEN-KNIGHT), FLAG_PROMOTION | (ROOK-KNIGHT), FLAG_PROMOTION | (BISHOP-KNIGHT), FLAG_PROMOTION | (KNIGHT-KNIGHT)]}
+
+# the maximum number of squares (castling changes 4) and castling rights (a king or a rook capturing a rook on its starting square can remove up to 4) that one move can change. this is the room reserved in each undo record
+RECORD_SQUARES = 4
+RECORD_RIGHTS = 4
+
+# the piece-square scores the board keeps for each color until a table is set with Board.set_piece_scores, one list of 64 squares for every piece integer
+NO_PIECE_SCORES = [[0 for sq in range(64)] for piece in range(BLACK+QUEEN+1)]
 
 # endregion
 
 
+# everything a move changes is stored in one of these records, so that undo_move can restore it field by field without having to look up what was stored. every record has the same layout and the board keeps a pool of them, one per ply, that is reused for every move instead of building new dicts and lists. the fields that are only changed by commit are only valid if the move was committed
+class MoveRecord:
+    __slots__ = ("last_move", "squares", "pieces", "n_squares", "rights", "n_rights", "en_passant_target", "zobr_hash", "king_color", "king_sq",
+        "reachable_color", "reachable", "half_moves", "full_moves", "in_check", "gameover", "threefold")
+
+    def __init__(self):
+        self.last_move = None
+        # the changed squares and the pieces that stood on them before the move
+        self.squares = [0 for i in range(RECORD_SQUARES)]
+        self.pieces = [0 for i in range(RECORD_SQUARES)]
+        self.n_squares = 0
+        # the castling rights that were lost in the move
+        self.rights = [0 for i in range(RECORD_RIGHTS)]
+        self.n_rights = 0
+        self.en_passant_target = -1
+        self.zobr_hash = 0
+        self.king_color = WHITE
+        self.king_sq = 0
+        self.reachable_color = WHITE
+        self.reachable = None
+        self.half_moves = 0
+        self.full_moves = 0
+        self.in_check = False
+        self.gameover = None
+        # the threefold dict that was replaced after a capture or pawn move, or None if the current position was only counted once more
+        self.threefold = None
+
+
 class Board:
 
     # note that some instance variables are initialized later, in their according functions
@@ -189,15 +241,21 @@ class Board:
         self.in_check = False
         self.threefold = defaultdict(int)
         self.piece_loc = {WHITE: set(), BLACK: set()}
-        self.changes = [{}]
+        # the sum of the piece-square scores of all pieces of each color, see set_piece_scores
+        self.piece_scores = NO_PIECE_SCORES
+        self.scores = {WHITE: 0, BLACK: 0}
+        # the undo records, where index 0 belongs to the position that was loaded and each move uses the next one. ply is the index of the record of the last move, record is that record itself. a record is created the first time a game or search reaches its ply, and reused from then on
+        self.records = [MoveRecord()]
+        self.ply = 0
+        self.record = self.records[0]
         self.reachable = {WHITE: {"all_direct": set(), "king_indirect_blocked": set()},
                         BLACK: {"all_direct": set(), "king_indirect_blocked": set()}}
 
         self.init_zobrist()
 
-    # sets up a 1d-array with 0 as default to represent an empty field. this was changed from a previous 2d array. to interact with C, 1d arrays are much more suitable (at least in my opinion), and we can easily translate between the coordinate form (y,x) and the int form of a square with the according const dicts
+    # sets up a 1d-array with 0 as default to represent an empty field. this was changed from a previous 2d array. to interact with C, 1d arrays are much more suitable (at least in my opinion), and we can easily translate between the coordinate form (y,x) and the int form of a square with the according const dicts. the squares are kept in a bytearray instead of a list (all piece ints fit into a byte), because the C extension can read its memory directly, instead of converting 64 python ints on every call
     def empty_board(self):
-        self.board = [0 for i in range(64)]
+        self.board = bytearray(64)
 
     # setting up a new game from the standard chess starting position
     def new_game(self):
@@ -207,8 +265,19 @@ class Board:
     def load_FEN(self, fen):
         self.gameover = None
 
-        # reset the board first
+        # forgetting all moves that were made before, also for the threefold repetition rule
+        self.ply = 0
+        self.record = self.records[0]
+        self.threefold = defaultdict(int)
+
+        # reset the board first, together with everything that place_piece and refresh_reachable fill in from it
         self.empty_board()
+        self.piece_loc = {WHITE: set(), BLACK: set()}
+        self.kings = {}
+        self.in_check = False
+        self.scores = {WHITE: 0, BLACK: 0}
+        self.reachable = {WHITE: {"all_direct": set(), "king_indirect_blocked": set()},
+                        BLACK: {"all_direct": set(), "king_indirect_blocked": set()}}
         # split the FEN in its 6 components
         fen_fields = fen.split()
         
@@ -236,32 +305,17 @@ class Board:
             x = 0
             for c in sfen[y]:
                 if c.isalpha():
-                    sq = YX2INT[(y,x)]
-                    self.board[sq] = PIECE_INIT[c]
-                    color = PIECE_SPLIT[self.board[sq]][0]
-                    self.piece_loc[color].add(sq)
-                    if c == "k":
-                        self.kings[BLACK] = sq
-                    if c == "K":
-                        self.kings[WHITE] = sq
+                    self.place_piece(YX2INT[(y,x)], PIECE_INIT[c])
                     x += 1
                 else:
                     x += int(c)
 
         # update reachable, only needed for the current opponent
-        # C ext
-        self.reachable[OPPOSITE[self.to_move]] = update_reachable(self.piece_loc[OPPOSITE[self.to_move]], self.board, OPPOSITE[self.to_move])
-
-        # python
-        #self.update_reachable(OPPOSITE[self.to_move])
-
+        self.refresh_reachable(OPPOSITE[self.to_move])
 
         # lastly checking if the current player to move is standing in check
         self.update_in_check()
 
-        # removing the current changes entry, because this is the special case of setup and we can not yet undo a move, because we havent made one. the appending to changes is a side effect of the functions we use here and it makes more sense to pop a useless item once, than to constantly track this special case
-        self.changes.pop()
-
         # creating the zobrist hash for the current board position for the first time
         self.zobr_hash = self.hash_zobrist()
 
@@ -269,6 +323,30 @@ class Board:
         #snap = self.snapshot()
         self.threefold[self.zobr_hash] += 1
 
+    # puts a piece on an empty square while setting up a position and keeps track of where the pieces and kings are. this is only used for loading a position, during the game the move function takes care of these variables
+    def place_piece(self, sq, piece):
+        self.board[sq] = piece
+        color, piece_type = PIECE_SPLIT[piece]
+        self.piece_loc[color].add(sq)
+        self.scores[color] += self.piece_scores[piece][sq]
+        if piece_type == KING:
+            self.kings[color] = sq
+
+    # sets the table of piece-square scores, a list of 64 ints for every piece integer (see NO_PIECE_SCORES), and sums it up for the pieces of each color. from then on, every move and undo_move keeps the sums in scores up to date by only adding and subtracting the scores of the squares they change, so an evaluation made of such scores (like the bot's material and square bonuses) doesnt have to go through all pieces. the scores should never be negative, then a user can pack several of them into one int, as long as no sum overflows into the next one
+    def set_piece_scores(self, piece_scores):
+        self.piece_scores = piece_scores
+        self.scores = {color: sum([piece_scores[self.board[sq]][sq] for sq in self.piece_loc[color]]) for color in (WHITE, BLACK)}
+
+    # recalculating the reachable squares of one color, after saving the old ones in the undo record
+    def refresh_reachable(self, color):
+        self.record.reachable_color = color
+        self.record.reachable = self.reachable[color]
+        # C ext
+        self.reachable[color] = update_reachable(self.piece_loc[color], self.board, color)
+
+        # python
+        #self.update_reachable(color)
+
     # python version of the C ext. keep for debug
     def pseudo_legal_moves(self, color):
         noncaptures, captures = [],[]
@@ -295,13 +373,13 @@ class Board:
                         
                         # new field is empty and therefore a valid target field
                         if self.board[new_field] == NO_PIECE:
-                            noncaptures.append((y,x,new_field_coord[0],new_field_coord[1],0))
+                            noncaptures.append(pack_move(sq, new_field))
                         # new field occupied by own piece, break this direction early
                         elif target_color == color:
                             break
                         # new field occupied by opponents piece, break, but allow this move (to capture)
                         elif target_color == OPPOSITE[color]:
-                            captures.append((y,x,new_field_coord[0],new_field_coord[1],0))
+                            captures.append(pack_move(sq, new_field, FLAG_CAPTURE))
                             break
             
             # calculating pawns separately because they have special move rules
@@ -317,10 +395,10 @@ class Board:
                         # new field is empty and therefore a valid target field, all other cases are an illegal move because pawns capture sideways, which will be implemented in the third loop
                         elif self.board[YX2INT[new_field]] == NO_PIECE:
                             if new_field[0] == PROMOTE['rank'][color]:
-                                for p in PROMOTE['options'][color]:
-                                    noncaptures.append((y,x,new_field[0],new_field[1],p))
+                                for flags in PROMOTE['flags']:
+                                    noncaptures.append(pack_move(sq, YX2INT[new_field], flags))
                             else:
-                                noncaptures.append((y,x,new_field[0],new_field[1],0))
+                                noncaptures.append(pack_move(sq, YX2INT[new_field]))
 
                 # the special pawn move (forward by 2) is only possible if the pawn is on the 2nd rank for white or 7th rank for black, so we check this
                 if (color == WHITE and y == 1) or (color == BLACK and y == 6):
@@ -332,7 +410,7 @@ class Board:
                             
                             # new field is empty and therefore a valid target field AND the field before that is also empty
                             if self.board[YX2INT[new_field]] == NO_PIECE and self.board[YX2INT[through]] == NO_PIECE:
-                                noncaptures.append((y,x,new_field[0],new_field[1],0))
+                                noncaptures.append(pack_move(sq, YX2INT[new_field], FLAG_DOUBLE_PUSH))
 
                 # implementation of the capturing move for pawns which goes sideways
                 pattern = PIECE_MOVEMENT_PATTERNS[piece_type]['capture']
@@ -346,12 +424,12 @@ class Board:
                         # new field is occupied by an enemy piece and therefore a valid target field
                         elif PIECE_SPLIT[self.board[YX2INT[new_field]]][0] == OPPOSITE[color]:
                             if new_field[0] == PROMOTE['rank'][color]:
-                                for p in PROMOTE['options'][color]:
-                                    captures.append((y,x,new_field[0],new_field[1],p))
+                                for flags in PROMOTE['flags']:
+                                    captures.append(pack_move(sq, YX2INT[new_field], flags | FLAG_CAPTURE))
                             else:
-                                captures.append((y,x,new_field[0],new_field[1],0))
+                                captures.append(pack_move(sq, YX2INT[new_field], FLAG_CAPTURE))
                         elif YX2INT[new_field] == self.en_passant_target:
-                            captures.append((y,x,new_field[0],new_field[1],0))
+                            captures.append(pack_move(sq, YX2INT[new_field], FLAG_EN_PASSANT))
 
         # checking if special move castle is possible, seeing if own pieces are in the way, but not yet checking if we move through opponents check. this will be implemented in another function
         for c in self.castling_rights[color]:
@@ -360,77 +438,25 @@ class Board:
 
         return noncaptures, captures
 
-    # this function creates a list of pseudo legal moves and then filters out all moves that would be illegal, e.g. if the move would put the own king in check by the opponent
+    # this function returns all legal moves, captures first. the C extension finds the checking and the pinned pieces once per position and then only generates moves that are legal, so no move needs to be simulated to find out if it leaves the own king in check
     def legal_moves(self, onlycaptures=False):
-        legal = []
-
         
         # C ext
-        pseudo_noncaptures, pseudo_captures = pseudo_legal_moves(self.piece_loc[self.to_move],self.board,self.castling_rights[self.to_move],self.to_move,self.en_passant_target)
-
-        # python
-        #pseudo_noncaptures, pseudo_captures = self.pseudo_legal_moves(self.to_move)
+        noncaptures, captures = fully_legal_moves(self.board,self.castling_rights[self.to_move],self.to_move,self.en_passant_target,onlycaptures)
 
-        own_pseudo_legal = pseudo_captures if onlycaptures else pseudo_captures+pseudo_noncaptures
+        return captures if onlycaptures else captures+noncaptures
 
-        opponents_pseudo_reachable = self.reachable[self.opponent]['all_direct']
+    # only the legal moves that are not captures, for a move picker that goes through legal_moves(onlycaptures=True) first and needs the rest later. the C extension always generates the quiet moves as their own list, so they dont have to be cut off the list of all moves
+    def quiet_moves(self):
+        return fully_legal_moves(self.board,self.castling_rights[self.to_move],self.to_move,self.en_passant_target,False)[0]
 
-        for move in own_pseudo_legal:
+    # checking a single move for legality without building the lists of all legal moves, for a move that may come from a different position (like the move of a transposition table entry)
+    def is_legal(self, move):
+        return legal_move(self.board,self.castling_rights[self.to_move],self.to_move,self.en_passant_target,move)
 
-            fy,fx,ty,tx,prom = move
-            from_sq, to_sq = YX2INT[(fy,fx)], YX2INT[(ty,tx)]
-            moved_piece = self.board[from_sq]
-            piece_type = PIECE_SPLIT[moved_piece][1]
-
-            # checking if castles moves the king through a check
-            if move in CASTLE["check"] and piece_type == KING:
-                if all(sq not in opponents_pseudo_reachable for sq in CASTLE["check"][move]):
-                    legal.append(move)
-
-            # dealing with non-special moves by first simulating the move, then checking if our king is reachable by the opponent (aka in check) and then taking the move back via restoring a backup
-            else:
-                
-                if self.in_check:
-
-                    # simulating the move
-                    self.move(move)
-
-                    # move is legal and can be appended to list of legal moves
-                    # C ext
-                    if check_possible_king_capt(self.piece_loc[self.opponent],self.board,self.opponent) == 0:
-                        legal.append(move)
-            
-                    # python
-                    #if not self.check_possible_king_capt(self.opponent):
-                        #legal.append(move)
-
-                    # undoing the simulated move
-                    self.undo_move()
-                else:
-
-                    if piece_type == KING:
-
-                        if to_sq not in opponents_pseudo_reachable:
-                            
-                            legal.append(move)
-                    else:
-                        if from_sq not in self.reachable[self.opponent]['king_indirect_blocked'] and not (piece_type == PAWN and to_sq == self.en_passant_target):
-                            legal.append(move)
-                        else:
-                            self.move(move)
-
-                            # C ext
-                            if check_possible_king_capt(self.piece_loc[self.opponent],self.board,self.opponent) == 0:
-                                legal.append(move)
-                            
-                            # python
-                            #if not self.check_possible_king_capt(self.opponent):
-                                #legal.append(move)
-
-
-                            self.undo_move()
-
-        return legal
+    # the static exchange evaluation of each move in a list: the material it wins (positive) or loses (negative) if both sides keep capturing on its target square with their least valuable piece. the list is evaluated in one call to the C extension
+    def static_exchange(self, moves):
+        return static_exchange(self.board, moves)
 
     # for the GUI we need to know if further user input is needed (in case of a promoting move). to easily distinguish the 2 cases, this function splits the legal moves into 2 lists.
     def split_legal_moves(self):
@@ -438,75 +464,111 @@ class Board:
         normal_moves, promote_moves = [], []
         
         for m in legal_moves:
-            if m[4] == 0:
+            if not m >> 12 & FLAG_PROMOTION:
                 normal_moves.append(m)
             else:
                 promote_moves.append(m)
         
         return (normal_moves, promote_moves)
+
+    # packing a move that is given by its squares into the int notation, finding its flags from the current position. promotion is the piece type a pawn promotes to (or NO_PIECE). this is only needed for moves that come from outside (the GUI, uci strings), the move generators set the flags themselves
+    def encode_move(self, from_sq, to_sq, promotion=NO_PIECE):
+        piece_type = PIECE_SPLIT[self.board[from_sq]][1]
+        flags = FLAG_QUIET if self.board[to_sq] == NO_PIECE else FLAG_CAPTURE
+
+        if piece_type == PAWN:
+            if to_sq == self.en_passant_target:
+                flags = FLAG_EN_PASSANT
+            elif abs(to_sq - from_sq) == 16:
+                flags = FLAG_DOUBLE_PUSH
+            elif promotion != NO_PIECE:
+                flags |= FLAG_PROMOTION | (promotion - KNIGHT)
+        elif piece_type == KING and abs(to_sq - from_sq) == 2:
+            flags = FLAG_KING_CASTLE if to_sq > from_sq else FLAG_QUEEN_CASTLE
+
+        return pack_move(from_sq, to_sq, flags)
+
+    # converting a move from the 5-tuple notation (see move2tuple) in the current position
+    def tuple2move(self, move):
+        fy,fx,ty,tx,prom = move
+        return self.encode_move(YX2INT[(fy,fx)], YX2INT[(ty,tx)], PIECE_SPLIT[prom][1])
+
+    # converting a move from the uci notation used by python chess module in the current position
+    def uci2move(self, uci):
+        from_sq, to_sq = YX2INT[cnote2tuple(uci[0:2])], YX2INT[cnote2tuple(uci[2:4])]
+        promotion = PIECE_SPLIT[PIECE_INIT[uci[4]]][1] if len(uci) == 5 else NO_PIECE
+        return self.encode_move(from_sq, to_sq, promotion)
     
     # executing a move on the board. this function provides no protection against passing illegal moves and must therefore be combined with a means of checking for legal moves
     def move(self, move, backup=True):
 
-        # when attempting a move, we append a new item to the changes variable, that will allow us to undo each move without using more extensive backups
-        if backup:
-            self.changes.append({"board": [], 
-                "piece_loc": {"remove": [], "add": []}, 
-                "en_passant_target": None, 
-                "castling_rights": [], 
-                "kings": None})
-
-        self.changes[-1]['last_move'] = move
-
-        # setting up local variables
-        fy,fx,ty,tx,prom = move
-        from_sq, to_sq = YX2INT[(fy,fx)], YX2INT[(ty,tx)]
+        # setting up local variables, the kind of move is told by its flags
+        from_sq, to_sq, flags = move & 63, (move >> 6) & 63, move >> 12
         moved_piece = self.board[from_sq]
-        piece_color, piece_type = PIECE_SPLIT[self.board[from_sq]]
-        capture = False if self.board[to_sq] == NO_PIECE else True
+        piece_color, piece_type = PIECE_SPLIT[moved_piece]
+        capture = bool(flags & FLAG_CAPTURE)
+
+        # when attempting a move, we take the next undo record and fill in what the move is about to change, that will allow us to undo each move without using more extensive backups. the rook move of castling (backup is False) writes to the same record as the king move
+        if backup:
+            self.ply += 1
+            if self.ply == len(self.records):
+                self.records.append(MoveRecord())
+            self.record = self.records[self.ply]
+            self.record.n_squares = 0
+            self.record.n_rights = 0
+            self.record.en_passant_target = self.en_passant_target
+            self.record.zobr_hash = self.zobr_hash
+            self.record.king_color = piece_color
+            self.record.king_sq = self.kings[piece_color]
+
+        record = self.record
+        record.last_move = move
+
+        # the zobrist hash is updated along with every change below. the en passant square of the previous move stops being part of it right away, the new one (if any) is added at the end
+        self.zobr_hash ^= self.zobrist_en_passant()
 
         # squares list is needed for the GUI, it has no function for the chess module itself
         squares = []
 
         # special case of en passant, where we need to update a square that is not directly visible in the fromto variable
-        self.changes[-1]['en_passant_target'] = self.en_passant_target
         if piece_type == PAWN:
-            if to_sq == self.en_passant_target:
-                # clear the pawn that was taken en passant from the board and append squares
-                en_passant_coord = INT2YX[self.en_passant_target]
-                sq_clear_y = 3 if en_passant_coord[0] == 2 else 4
-                sq_clear_x = en_passant_coord[1]
-                sq_clear = YX2INT[(sq_clear_y,sq_clear_x)]
-
-                self.changes[-1]['board'].append((sq_clear_y,sq_clear_x,self.board[sq_clear]))
+            if flags == FLAG_EN_PASSANT:
+                # clear the pawn that was taken en passant from the board (it stands right behind the target square) and append squares
+                sq_clear = to_sq - 8 if piece_color == WHITE else to_sq + 8
+
+                record.squares[record.n_squares] = sq_clear
+                record.pieces[record.n_squares] = self.board[sq_clear]
+                record.n_squares += 1
+                self.zobr_hash ^= self.zobr[sq_clear][self.board[sq_clear]]
+                self.scores[OPPOSITE[piece_color]] -= self.piece_scores[self.board[sq_clear]][sq_clear]
                 self.board[sq_clear] = 0
                 
-                self.changes[-1]['piece_loc']['add'].append((OPPOSITE[piece_color],sq_clear))
                 self.piece_loc[OPPOSITE[piece_color]].remove(sq_clear)
 
-                squares.append((sq_clear_y, sq_clear_x))
-                capture = True
+                squares.append(INT2YX[sq_clear])
                 
                 self.en_passant_target = -1
             else:
                 # update en passant target
-                self.update_en_passant(moved_piece, move)
+                self.update_en_passant(move)
         else:
             self.en_passant_target = -1
 
         # special case castling, which is 2 moves in one, we process the rookmove first in a recursion layer and then proceed with the kingmove as a normal move. note we only need the squares of the rookmove as return value, the other 2 variables are unimportant at this step
         if piece_type == KING:
-            if move in CASTLE['rookmove']:
+            if flags == FLAG_KING_CASTLE or flags == FLAG_QUEEN_CASTLE:
                 sq_rookmove, _, _ = self.move(CASTLE['rookmove'][move], backup=False)
                 squares.extend(sq_rookmove)
                 
                 # re-updating the last move to be the kings move instead of the rooks move
-                self.changes[-1]['last_move'] = move
+                record.last_move = move
             
-            self.update_kings(moved_piece, move)
+            self.update_kings(moved_piece, to_sq)
 
             for right in self.castling_rights[piece_color]:
-                self.changes[-1]['castling_rights'].append((piece_color,right))
+                record.rights[record.n_rights] = right
+                record.n_rights += 1
+                self.zobr_hash ^= self.zobr_castling[right]
             self.castling_rights[piece_color] = []            
 
         # updating castling rights, depending on which rook was moved or if a rook was captured
@@ -514,62 +576,66 @@ class Board:
             self.update_castling(moved_piece, move, capture)
 
         # updating the from-square and the to-square, creating a new piece integer if we promote
-        self.changes[-1]['board'].append((ty,tx,self.board[to_sq]))
-        self.board[to_sq] = moved_piece if prom == 0 else prom
-        self.changes[-1]['board'].append((fy,fx,self.board[from_sq]))
+        n = record.n_squares
+        record.squares[n] = to_sq
+        record.pieces[n] = self.board[to_sq]
+        record.squares[n+1] = from_sq
+        record.pieces[n+1] = moved_piece
+        record.n_squares = n+2
+
+        # the piece-square scores change in the same places as the hash
+        piece_scores = self.piece_scores
+        if self.board[to_sq] != NO_PIECE:
+            self.zobr_hash ^= self.zobr[to_sq][self.board[to_sq]]
+            self.scores[OPPOSITE[piece_color]] -= piece_scores[self.board[to_sq]][to_sq]
+        self.board[to_sq] = moved_piece if not flags & FLAG_PROMOTION else piece_color + KNIGHT + (flags & 3)
+        self.zobr_hash ^= self.zobr[to_sq][self.board[to_sq]]
+        self.zobr_hash ^= self.zobr[from_sq][moved_piece]
+        self.scores[piece_color] += piece_scores[self.board[to_sq]][to_sq] - piece_scores[moved_piece][from_sq]
         self.board[from_sq] = 0
 
-        self.changes[-1]['piece_loc']['remove'].append((piece_color,to_sq))
+        # the piece locations are not recorded, undo_move can tell them from the changed squares
         self.piece_loc[piece_color].add(to_sq)
-        
-        if to_sq in self.piece_loc[OPPOSITE[piece_color]]:
-            self.changes[-1]['piece_loc']['add'].append((OPPOSITE[piece_color],to_sq))
-            self.piece_loc[OPPOSITE[piece_color]].remove(to_sq)
-        
-        self.changes[-1]['piece_loc']['add'].append((piece_color,from_sq))
+        if capture:
+            self.piece_loc[OPPOSITE[piece_color]].discard(to_sq)
         self.piece_loc[piece_color].remove(from_sq)
 
+        self.zobr_hash ^= self.zobrist_en_passant()
+
         # returning a list of squares that have been updated by this function
-        squares.extend([(fy, fx), (ty, tx)])
+        squares.extend([INT2YX[from_sq], INT2YX[to_sq]])
         return (squares, capture, moved_piece)
 
     # this function first updates the board variables and then checks if any game over conditions have been met
     def commit(self, move, capture, moved_piece):
 
-        fy,fx,ty,tx,_ = move
-        from_sq, to_sq = YX2INT[(fy,fx)], YX2INT[(ty,tx)]
         piece_color, piece_type = PIECE_SPLIT[moved_piece]
 
         # when committing a move, it makes sense to update this variable, as it is the basis for the  calculation of next moves
-        # C ext
-        self.reachable[piece_color] = update_reachable(self.piece_loc[piece_color],self.board,piece_color)
+        self.refresh_reachable(piece_color)
 
-        # python
-        #self.update_reachable(piece_color)
-
-        self.changes[-1]['half_moves'] = self.half_moves
+        self.record.half_moves = self.half_moves
         if capture or piece_type == PAWN:
             self.half_moves = 0
         else:
             self.half_moves += 1
         
+        self.record.full_moves = self.full_moves
         if piece_color == BLACK:
-            self.changes[-1]['full_moves'] = self.full_moves
             self.full_moves += 1
 
         # changing who is to move at last
         self.to_move, self.opponent = self.opponent, self.to_move
 
-        # backing up and updating the zobrist hash
-        self.changes[-1]['zobr_hash'] = self.zobr_hash
-        self.zobr_hash = self.hash_zobrist()
+        # the pieces, castling rights and en passant square are already up to date in the zobrist hash (see move), only the player to move is left
+        self.zobr_hash ^= self.zobr_black
 
         # checking if the player that is now to move is standing in check
         self.update_in_check()
 
         # next we check for game_over conditions. checkmate and stalemate are the most common ones and are checked first. the others are more rare and are sequenced roughly in order of difficulty of checking
 
-        self.changes[-1]['gameover'] = self.gameover
+        self.record.gameover = self.gameover
 
         # checkmate and stalemate
         if not self.legal_moves():
@@ -588,6 +654,10 @@ class Board:
         # insufficient material
         self.check_insufficient()
 
+    # creates a C position (see chess_extension) from the current state of the board. it can make and take back moves, generate legal moves and count perft nodes entirely in C, but it only knows the rules of moving, so game over conditions are still checked here
+    def position(self):
+        return Position(self.board, self.to_move, self.castling_rights[WHITE] + self.castling_rights[BLACK], self.en_passant_target, self.half_moves)
+
     # this function is a combination of move and commit, the first just executes the move itself and the second updates game variables. it is feasible to separate these into 2 functions because in order to check legal moves we need to "simulate" moves, in which case an update of game variables would be unnessecary and potentially cause bugs
     def commit_move(self, move):
         # executing the move
@@ -598,49 +668,75 @@ class Board:
         # passing the list of updated squares from the move function
         return sqlist
 
+    # passing the turn to the opponent without moving a piece. this is not a legal chess move, but the bot uses it for null move pruning. the undo record is filled in the same way as for a committed move, so it is taken back with undo_move(commited=True). the en passant square is gone afterwards, and the position is not counted for threefold repetition
+    def make_null_move(self):
+        self.ply += 1
+        if self.ply == len(self.records):
+            self.records.append(MoveRecord())
+        record = self.record = self.records[self.ply]
+        record.last_move = 0
+        record.n_squares = 0
+        record.n_rights = 0
+        record.en_passant_target = self.en_passant_target
+        record.zobr_hash = self.zobr_hash
+        record.king_color = self.to_move
+        record.king_sq = self.kings[self.to_move]
+        record.half_moves = self.half_moves
+        record.full_moves = self.full_moves
+        record.gameover = self.gameover
+        # the threefold dict is handed back to itself by undo_move, instead of taking back a count that was never made
+        record.threefold = self.threefold
+
+        self.zobr_hash ^= self.zobrist_en_passant() ^ self.zobr_black
+        self.en_passant_target = -1
+
+        # the squares the passing player attacks are needed by the other player for its moves
+        self.refresh_reachable(self.to_move)
+        self.to_move, self.opponent = self.opponent, self.to_move
+        self.update_in_check()
+
     # takes a snapshot of the board and the pieces, but NOT the according objects. this is to prevent the threefold repetition rule not triggering if pieces (e.g. 2 knights) are interchanged, which results in the same position on the board, but would not trigger a positive comparison of 2 snapshots, as the 2 knights are represented by different objects. note that it would also be possible and more efficient to do this via the zobrist hash that we use for the bot module, but for now lets keep it as is.
     #def snapshot(self):
         #return tuple(sq for sq in self.board)
 
     # updating the kings position, depending on which color king was moved and where
-    def update_kings(self, moved_piece, move):
+    def update_kings(self, moved_piece, new_sq):
         piece_color = PIECE_SPLIT[moved_piece][0]
-        new_sq = YX2INT[(move[2], move[3])]
 
-        self.changes[-1]['kings'] = (piece_color,self.kings[piece_color])
         self.kings[piece_color] = new_sq
 
-    # updating the possible en passant square, depending on which pawn moved and where
-    def update_en_passant(self, moved_piece, move):
-        from_rank, to_rank, col = move[0], move[2], move[1]
-        piece_color = PIECE_SPLIT[moved_piece][0]
-        
-        if to_rank == EN_PASSANT[piece_color]['to_rank'] and from_rank == EN_PASSANT[piece_color]['from_rank']:
-            self.en_passant_target = YX2INT[(EN_PASSANT[piece_color]['target'], col)]
+    # updating the possible en passant square after a pawn move. only a double push creates one, on the square the pawn passed over
+    def update_en_passant(self, move):
+        if move >> 12 == FLAG_DOUBLE_PUSH:
+            self.en_passant_target = ((move & 63) + ((move >> 6) & 63)) >> 1
         else:
             self.en_passant_target = -1
 
     # updating the castling rights (ONLY called if a rook moves or is captured, because king move sets the castling rights to zero always and does not need a function to handle)
     def update_castling(self, moved_piece, move, capture):
-        from_sq, to_sq = YX2INT[(move[0],move[1])], YX2INT[(move[2],move[3])]
+        from_sq, to_sq = move & 63, (move >> 6) & 63
         piece_color = PIECE_SPLIT[moved_piece][0]
         
         # in case a piece is moved from one original rook square (must be a rook the first time this happens)
         if from_sq in CASTLE['rights']:
             if CASTLE['rights'][from_sq] in self.castling_rights[piece_color]:
-                self.changes[-1]['castling_rights'].append((piece_color,CASTLE['rights'][from_sq]))
+                self.record.rights[self.record.n_rights] = CASTLE['rights'][from_sq]
+                self.record.n_rights += 1
+                self.zobr_hash ^= self.zobr_castling[CASTLE['rights'][from_sq]]
                 self.castling_rights[piece_color].remove(CASTLE['rights'][from_sq])
         
         # in case a piece is captured on one original rook square (must be a rook the first time this happens)
         if capture:
             if to_sq in CASTLE['rights']:
                 if CASTLE['rights'][to_sq] in self.castling_rights[OPPOSITE[piece_color]]:
-                    self.changes[-1]['castling_rights'].append((OPPOSITE[piece_color],CASTLE['rights'][to_sq]))
+                    self.record.rights[self.record.n_rights] = CASTLE['rights'][to_sq]
+                    self.record.n_rights += 1
+                    self.zobr_hash ^= self.zobr_castling[CASTLE['rights'][to_sq]]
                     self.castling_rights[OPPOSITE[piece_color]].remove(CASTLE['rights'][to_sq])  
 
     # simply returning if the king of the current player is standing in check
     def update_in_check(self):
-        self.changes[-1]['in_check'] = self.in_check
+        self.record.in_check = self.in_check
         self.in_check = True if self.kings[self.to_move] in self.reachable[self.opponent]['all_direct'] else False
 
     # draw by insufficient material if both sides have no more than the following: k, k+b, k+n, in all other cases, the game will continue
@@ -664,75 +760,62 @@ class Board:
     def check_threefold(self, capture, moved_piece):
         if not capture and not PIECE_SPLIT[moved_piece][1] == PAWN:
             #snap = self.snapshot()
-            self.changes[-1]['threefold'] = (SUBTRACT,self.zobr_hash)
+            self.record.threefold = None
             self.threefold[self.zobr_hash] += 1
             
             if self.threefold[self.zobr_hash] > 2:
                 self.gameover = (0.5, "draw_threefold")
         else:
-            self.changes[-1]['threefold'] = (REPLACE,self.threefold)
+            self.record.threefold = self.threefold
             self.threefold = defaultdict(int)
 
-    # instead of backing up and restoring the whole board, we are appending change data to the changes variable. this function takes advantage of that and reverses all the changes that were made during the execution of a move, resulting in the undoing of that move. note that this function distinguishes between a move that was simulated ("move") or commited ("commit_move"). the undoing of moves via this function instead of backing up and restoring is only slightly faster, because we modify the changes data with every move. however, we gain the advantage of being able to take back unlimited moves in a row which was not possible with the backup method unless we stored multiple board backups
+    # instead of backing up and restoring the whole board, every move fills in an undo record with what it changed. this function takes advantage of that and restores everything from the record of the last move, resulting in the undoing of that move. note that this function distinguishes between a move that was simulated ("move") or commited ("commit_move"), because only the latter changes the game variables. we gain the advantage of being able to take back unlimited moves in a row, which was not possible with the backup method unless we stored multiple board backups
     def undo_move(self, commited=False):
         
-        # getting the current moves change data
-        change = self.changes.pop()
-        
-        # reversing all changes, depending on which key is given in the data. this works for different lengths, so the change data does not need to contain all keys every time. might need to be switched or C ext
-        for key, value in change.items():
-            key_map = CHANGES_KEYS[key]
-            if key_map == BOARD:
-                for t in value:
-                    y,x,old_piece = t
-                    self.board[YX2INT[(y,x)]] = old_piece
-            elif key_map == PIECE_LOC:
-                for key2, value2 in value.items():
-                    key2_map = CHANGES_KEYS[key2]
-                    if key2_map == REMOVE:
-                        for t in value2:
-                            color, sq = t
-                            self.piece_loc[color].remove(sq)
-                    elif key2_map == ADD:
-                        for t in value2:
-                            color, sq = t
-                            self.piece_loc[color].add(sq)
-            elif key_map == EN_PASSANT_TARGET:
-                self.en_passant_target = value
-            elif key_map == CASTLING_RIGHTS:
-                for t in value:
-                    color, right = t
-                    self.castling_rights[color].append(right)
-            elif key_map == KINGS:
-                if value:
-                    color, sq = value
-                    self.kings[color] = sq
-            elif key_map == REACHABLE:
-                color, backup = value
-                self.reachable[color] = backup
-            elif key_map == HALF_MOVES:
-                self.half_moves = value
-            elif key_map == FULL_MOVES:
-                self.full_moves = value
-            elif key_map == IN_CHECK:
-                self.in_check = value
-            elif key_map == GAMEOVER:
-                self.gameover = value
-            elif key_map == THREEFOLD:
-                action, item = value
-                if action == REPLACE:
-                    self.threefold = item
-                elif action == SUBTRACT:
-                    self.threefold[item] -= 1
-            elif key_map == ZOBR_HASH:
-                self.zobr_hash = value
-
-        # the reason for the distinguishment between a simulated and a committed move is, that in a simulated move, the player that is to move stays the same, whereas in a committed move it switches 
+        # getting the record of the current move and stepping back to the previous one
+        record = self.record
+        self.ply -= 1
+        self.record = self.records[self.ply]
+
+        # the game variables are restored first, because the threefold counter needs the hash of the position that is taken back
         if commited:
-            # no fancy backup necessary, just switch back
+            if record.threefold is None:
+                self.threefold[self.zobr_hash] -= 1
+            else:
+                self.threefold = record.threefold
+            self.reachable[record.reachable_color] = record.reachable
+            self.half_moves = record.half_moves
+            self.full_moves = record.full_moves
+            self.in_check = record.in_check
+            self.gameover = record.gameover
+
+            # the player that is to move only switches in a committed move, whereas in a simulated move it stays the same
             self.to_move, self.opponent = self.opponent, self.to_move
 
-    # this function creates a new zobrist mask by assigning each piece-square combination a random 64bit number, plus another 64bit number that is used if black is to move. it is optional, as a functional zobrist mask is provided as json file. note if you want to use a new mask, the openings database also has to be reloaded with that mask, otherwise a bot instance will not be able to associate zobrist hashes with the opening positions
+        # putting back the pieces. every square appears only once in a record, so the piece that stands there now can be taken out of the piece locations and the piece-square scores and the old one put back in
+        board, piece_loc, scores, piece_scores = self.board, self.piece_loc, self.scores, self.piece_scores
+        squares, pieces = record.squares, record.pieces
+        for i in range(record.n_squares):
+            sq = squares[i]
+            if board[sq] != NO_PIECE:
+                color = PIECE_SPLIT[board[sq]][0]
+                piece_loc[color].remove(sq)
+                scores[color] -= piece_scores[board[sq]][sq]
+            if pieces[i] != NO_PIECE:
+                color = PIECE_SPLIT[pieces[i]][0]
+                piece_loc[color].add(sq)
+                scores[color] += piece_scores[pieces[i]][sq]
+            board[sq] = pieces[i]
+
+        for i in range(record.n_rights):
+            right = record.rights[i]
+            self.castling_rights[PIECE_SPLIT[right][0]].append(right)
+
+        self.kings[record.king_color] = record.king_sq
+        self.en_passant_target = record.en_passant_target
+        self.zobr_hash = record.zobr_hash
+
+    # this function creates a new zobrist mask by assigning each piece-square combination a random 64bit number, plus another 64bit number that is used if black is to move, one for each of the 4 castling rights and one for each file of an en passant square. it is optional, as a functional zobrist mask is provided as json file. note if you want to use a new mask, the openings database also has to be reloaded with that mask, otherwise a bot instance will not be able to associate zobrist hashes with the opening positions
     def create_new_zobrist(self):
         zobr = [{WKING: None, WQUEEN: None, WPAWN: None, WBISHOP: None, WKNIGHT: None, WROOK: None, BKING: None, BQUEEN: None, BPAWN: None, BBISHOP: None, BKNIGHT: None, BROOK: None} for i in range(64)]
         zobr_black = random.getrandbits(64)
@@ -741,7 +824,10 @@ class Board:
                 for key in zobr[sq]:
                     zobr[sq][key] = random.getrandbits(64)
 
-        combined = {"black_mask": zobr_black, "board_mask": zobr}
+        zobr_castling = {right: random.getrandbits(64) for right in (WKING, WQUEEN, BKING, BQUEEN)}
+        zobr_en_passant = [random.getrandbits(64) for i in range(8)]
+
+        combined = {"black_mask": zobr_black, "board_mask": zobr, "castling_mask": zobr_castling, "en_passant_mask": zobr_en_passant}
 
         # serializing json
         json_object = json.dumps(combined, indent=4)
@@ -750,16 +836,11 @@ class Board:
         with open("new_zobrist_mask.json", "w") as outfile:
             outfile.write(json_object)
 
-    # loading in a previously created zobrist mask to make sure we use the same mask for all instances
+    # using the previously created zobrist mask of the process (see load_zobrist) to make sure we use the same mask for all instances
     def init_zobrist(self):
+        self.zobr, self.zobr_black, self.zobr_castling, self.zobr_en_passant = load_zobrist()
 
-        with open(ZOBRIST_FILE) as json_file:
-            temp_zobr = json.load(json_file)
-
-        self.zobr_black = temp_zobr['black_mask']
-        self.zobr = [{int(key): value for key, value in d.items()} for d in temp_zobr['board_mask']]
-
-    # this funciton creates a 64bit zobrist hash to represent the current state of the board. this is done by XORing every random number that gets a hit in the current configuration (e.g. if there is a black knight on e4, then the hash will be XORed with the black knight + e4 number). this function creates the hash from scratch, and it is possible to update it with each move. however, due to special moves en passant and castling, this is a bit tricky and we avoid it for now, since the computation is quite quick
+    # this funciton creates a 64bit zobrist hash to represent the current state of the board. this is done by XORing every random number that gets a hit in the current configuration (e.g. if there is a black knight on e4, then the hash will be XORed with the black knight + e4 number), plus the numbers for the player to move, the castling rights and the en passant file. this function creates the hash from scratch, which is only done when a position is loaded. afterwards, move keeps the hash up to date by XORing only what changed
     def hash_zobrist(self):
         h = 0
         if self.to_move == BLACK:
@@ -769,9 +850,28 @@ class Board:
                 curr_piece = self.board[sq]
                 if curr_piece != NO_PIECE:
                     h = h ^ self.zobr[sq][curr_piece]
+
+        for color in (WHITE, BLACK):
+            for right in self.castling_rights[color]:
+                h = h ^ self.zobr_castling[right]
+
+        h = h ^ self.zobrist_en_passant()
         
         return h
 
+    # the en passant file only becomes part of the hash if a pawn of the player to move stands next to the pawn that just moved 2 squares, meaning it could actually capture. otherwise the same position reached by a different move order would get a different hash. note that this looks at the board as it is right after the double move, so it needs to be called before the next move changes anything
+    def zobrist_en_passant(self):
+        if self.en_passant_target == -1:
+            return 0
+
+        y,x = INT2YX[self.en_passant_target]
+        pawn_y, capturing_pawn = (3, BPAWN) if y == 2 else (4, WPAWN)
+        for capture_x in (x-1, x+1):
+            if 0 <= capture_x <= 7 and self.board[YX2INT[(pawn_y,capture_x)]] == capturing_pawn:
+                return self.zobr_en_passant[x]
+
+        return 0
+
     # goes through all possible variations to the given depth and compares to the python chess engine. in case there is a mismatch, this function will print some debug info and stop early. this is a pure debug function that is not needed for "normal" use of this class
     def find_variations_compare(self, depth, comparison_board):
 
@@ -832,7 +932,7 @@ class Board:
         
         return count
 
-    # python version of the C ext. keep for debug
+    # python version of a former C ext function, which was removed because the legal move generation doesnt need it anymore. keep for debug
     def check_possible_king_capt(self, color):
 
         for sq in self.piece_loc[color]:
@@ -886,7 +986,8 @@ class Board:
     # python version of the C ext. keep for debug
     def update_reachable(self, color):
 
-        self.changes[-1]['reachable'] = (color, self.reachable[color])
+        self.record.reachable_color = color
+        self.record.reachable = self.reachable[color]
         self.reachable[color] = {"all_direct": set(), "king_indirect_blocked": set(), "pawn_attack": set()}
 
         for sq in self.piece_loc[color]:
@@ -0,0 +1,217 @@
+# a script that counts the nodes of the move tree (perft) for the positions in testing/debug_positions.json or a custom FEN, and reports if the counts are correct and how many nodes per second the move generator reaches. unlike Board.find_variations_compare, it does not compare against python chess at every node, so it only measures our own code and can be used to track the speed of the move generator from version to version
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+
+import chess_v5 as my_chess
+
+
+# the engines that can be tested. the python engine plays its moves with the move function of the board class, the C engine is a Position of the C extension, which counts the whole tree without going back to python
+ENGINES = {"board": my_chess.Board, "c": my_chess.Board}
+
+# playing a move on a python board for the move tree. commit_move would also update all game variables and check for game over conditions (which generates the legal moves a second time), so here only the player to move and the zobrist hash are switched on top of the move itself. the legal move generation of the board does not need more than that
+def make_move(board, move):
+    board.move(move)
+    board.to_move, board.opponent = board.opponent, board.to_move
+    board.zobr_hash ^= board.zobr_black
+
+# undo_move restores the zobrist hash, but only a committed move would switch back the player to move
+def unmake_move(board):
+    board.undo_move()
+    board.to_move, board.opponent = board.opponent, board.to_move
+
+# a fixed size table of already counted subtrees, indexed by the zobrist hash. every entry is a tuple (hash, depth, nodes) and a new entry simply replaces the old one at its index
+class PerftTable:
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.table = [None for i in range(entries)]
+        self.hits = 0
+
+    def get(self, zobr_hash, depth):
+        entry = self.table[(zobr_hash ^ depth) % self.entries]
+        if entry and entry[0] == zobr_hash and entry[1] == depth:
+            self.hits += 1
+            return entry[2]
+        return None
+
+    def put(self, zobr_hash, depth, nodes):
+        self.table[(zobr_hash ^ depth) % self.entries] = (zobr_hash, depth, nodes)
+
+# counting the leaf nodes of the tree below the current position of a python board. the last ply is counted in bulk, by the length of the legal moves list, instead of playing each move
+def perft(board, depth, table=None):
+    if depth == 0:
+        return 1
+
+    if table:
+        nodes = table.get(board.zobr_hash, depth)
+        if nodes is not None:
+            return nodes
+
+    moves = board.legal_moves()
+    if depth == 1:
+        nodes = len(moves)
+    else:
+        nodes = 0
+        for move in moves:
+            make_move(board, move)
+            nodes += perft(board, depth-1, table)
+            unmake_move(board)
+
+    if table:
+        table.put(board.zobr_hash, depth, nodes)
+    return nodes
+
+# the same for a C position. without a table, the C extension counts the tree by itself. with a table, the recursion runs in python until the last 2 plies, which are again counted in C, otherwise the table lookups would cost more than they save
+def perft_c(position, depth, table=None):
+    if not table or depth <= 2:
+        return position.perft(depth)
+
+    nodes = table.get(position.hash(), depth)
+    if nodes is not None:
+        return nodes
+
+    nodes = 0
+    for move in position.legal_moves():
+        position.make(move)
+        nodes += perft_c(position, depth-1, table)
+        position.unmake()
+
+    table.put(position.hash(), depth, nodes)
+    return nodes
+
+# sets up a board of an engine from a FEN (reusing the given board, if any) and gives back the board together with the functions to count, make and unmake moves on it
+def setup_engine(fen, engine, board=None):
+    board = board or ENGINES[engine]()
+    board.load_FEN(fen)
+    if engine == "c":
+        board = board.position()
+        return board, perft_c, board.make, board.unmake
+    return board, perft, lambda move: make_move(board, move), lambda: unmake_move(board)
+
+# the boards and the table of a worker process, which are kept from one task to the next
+worker_boards = {}
+worker_tables = {}
+
+# counting one subtree in a worker process. every worker sets up its own board from the FEN and plays the moves that lead to its subtree, so only the FEN, the moves and the counts have to be sent between the processes. gives back the node count and the table hits of the subtree
+def count_subtree(task):
+    fen, moves, depth, engine, hash_entries = task
+    if engine not in worker_boards:
+        worker_boards[engine] = ENGINES[engine]()
+    board, count, make, unmake = setup_engine(fen, engine, worker_boards[engine])
+    for move in moves:
+        make(move)
+
+    table = None
+    if hash_entries:
+        if hash_entries not in worker_tables:
+            worker_tables[hash_entries] = PerftTable(hash_entries)
+        table = worker_tables[hash_entries]
+    hits = table.hits if table else 0
+    nodes = count(board, depth, table)
+    return nodes, table.hits - hits if table else 0
+
+# all move sequences of a certain length from the current position, which are the roots of the subtrees that are counted in parallel
+def split_moves(board, make, unmake, plies):
+    if plies == 0:
+        return [()]
+    sequences = []
+    for move in board.legal_moves():
+        make(move)
+        sequences.extend((move,) + sequence for sequence in split_moves(board, make, unmake, plies-1))
+        unmake()
+    return sequences
+
+# splitting the tree after the first (or the first 2) plies and counting the subtrees in a pool of worker processes. splitting after 2 plies gives many more, smaller tasks, so the workers are kept busy even if the root moves have very different subtree sizes. each worker keeps its own table if hashing is used, and the hits of all tables are added up
+def perft_parallel(fen, depth, engine, workers, split_plies=1, hash_entries=0):
+    board, _, make, unmake = setup_engine(fen, engine)
+    split_plies = min(split_plies, depth)
+    sequences = split_moves(board, make, unmake, split_plies)
+
+    tasks = [(fen, sequence, depth-split_plies, engine, hash_entries) for sequence in sequences]
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.map(count_subtree, tasks, chunksize=max(1, len(tasks) // (4*workers)))
+
+    # merging the counts per root move, so that divide works the same as without workers, and adding up the table hits of all workers
+    root_nodes = {}
+    for sequence, (nodes, hits) in zip(sequences, results):
+        if sequence:
+            root_nodes[sequence[0]] = root_nodes.get(sequence[0], 0) + nodes
+    return root_nodes, sum(nodes for nodes, hits in results), sum(hits for nodes, hits in results)
+
+# running perft for one position and engine. with divide, the node count of each root move is printed separately (in uci notation, the same format as other engines use), which helps to find the move where a wrong count comes from. with more than one worker, the tree is counted in parallel
+def run_perft(fen, depth, engine="board", divide=False, hash_entries=0, workers=1, split_plies=1):
+    if workers > 1 and depth > 1:
+        start = time.perf_counter()
+        root_nodes, nodes, hits = perft_parallel(fen, depth, engine, workers, split_plies, hash_entries)
+        elapsed = time.perf_counter() - start
+        if divide:
+            for move, move_nodes in root_nodes.items():
+                print(f"{my_chess.move2uci(move)}: {move_nodes}")
+        return nodes, elapsed, hits
+
+    board, count, make, unmake = setup_engine(fen, engine)
+    table = PerftTable(hash_entries) if hash_entries else None
+
+    start = time.perf_counter()
+    if divide and depth > 0:
+        nodes = 0
+        for move in board.legal_moves():
+            make(move)
+            move_nodes = count(board, depth-1, table)
+            unmake()
+            print(f"{my_chess.move2uci(move)}: {move_nodes}")
+            nodes += move_nodes
+    else:
+        nodes = count(board, depth, table)
+    elapsed = time.perf_counter() - start
+
+    return nodes, elapsed, table.hits if table else 0
+
+# running all positions of the debug file (or only those up to a maximum number of nodes, because the python engine needs a long time for the biggest ones) and printing one line per position, followed by the totals
+def run_suite(filename, engine="board", max_nodes=None, hash_entries=0, workers=1, split_plies=1):
+    with open(filename) as json_file:
+        tests = json.load(json_file)
+
+    total_nodes, total_time, failed = 0, 0, 0
+    for test in tests:
+        if max_nodes and test['nodes'] > max_nodes:
+            continue
+
+        nodes, elapsed, hits = run_perft(test['fen'], test['depth'], engine, hash_entries=hash_entries, workers=workers, split_plies=split_plies)
+        ok = nodes == test['nodes']
+        failed += not ok
+        total_nodes += nodes
+        total_time += elapsed
+
+        print(f"{'ok  ' if ok else 'FAIL'} depth {test['depth']} nodes {nodes} (expected {test['nodes']}) {elapsed:.2f}s {nodes_per_second(nodes, elapsed)} nps {test['fen']}")
+
+    print(f"total: {total_nodes} nodes in {total_time:.2f}s, {nodes_per_second(total_nodes, total_time)} nps, {failed} failed")
+    return failed
+
+def nodes_per_second(nodes, elapsed):
+    return int(nodes / elapsed) if elapsed > 0 else 0
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Counts the move tree of chess positions and reports the speed of the move generator")
+    parser.add_argument("--engine", choices=ENGINES, default="board", help="the board engine to count with (default: board)")
+    parser.add_argument("--fen", help="a single position to count, instead of the debug positions")
+    parser.add_argument("--depth", type=int, default=4, help="the depth for --fen (default: 4)")
+    parser.add_argument("--divide", action="store_true", help="print the node count of every root move for --fen")
+    parser.add_argument("--hash", type=int, default=0, metavar="ENTRIES", help="use a table with this many entries for already counted subtrees")
+    parser.add_argument("--positions", default=my_chess.TEST_POSITIONS_FILE, help="the json file with the debug positions")
+    parser.add_argument("--max-nodes", type=int, help="skip debug positions with more nodes than this")
+    parser.add_argument("--workers", type=int, default=1, help="count the subtrees in this many processes (default: 1)")
+    parser.add_argument("--split", type=int, choices=(1, 2), default=1, help="split the tree for the workers after 1 or 2 plies (default: 1)")
+    args = parser.parse_args()
+
+    if args.fen:
+        nodes, elapsed, hits = run_perft(args.fen, args.depth, args.engine, args.divide, args.hash, args.workers, args.split)
+        print(f"nodes {nodes} in {elapsed:.2f}s, {nodes_per_second(nodes, elapsed)} nps" + (f", {hits} table hits" if args.hash else ""))
+    else:
+        sys.exit(1 if run_suite(args.positions, args.engine, args.max_nodes, args.hash, args.workers, args.split) else 0)
@@ -0,0 +1,5 @@
+# the tests import the modules of the mchess folder the same way the scripts there do, so the folder is put on the path first. the C extension has to be built in place before (python setup.py build_ext --inplace), or be importable from somewhere else on the path
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
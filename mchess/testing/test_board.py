@@ -0,0 +1,75 @@
+import json
+import random
+
+import pytest
+
+import chess_v5 as my_chess
+import chess_bot_v4 as my_bot
+import perft
+
+
+with open(my_chess.TEST_POSITIONS_FILE) as json_file:
+    TEST_POSITIONS = json.load(json_file)
+
+
+# the sums of the piece scores of both colors, counted from scratch instead of kept up to date by the moves
+def recounted_scores(board):
+    scores = board.scores
+    board.set_piece_scores(board.piece_scores)
+    recounted, board.scores = board.scores, scores
+    return recounted
+
+
+# the zobrist hash and the piece scores are only updated by what a move changes. after every move and every undo of a random game, they have to be the same as if they were calculated from scratch, and taking all moves back has to bring back the hash and scores of the start
+@pytest.mark.parametrize("test", TEST_POSITIONS, ids=[test['fen'] for test in TEST_POSITIONS])
+def test_incremental_hash_and_scores(test):
+    random.seed(test['fen'])
+    board = my_chess.Board()
+    board.load_FEN(test['fen'])
+    board.set_piece_scores(my_bot.PIECE_SCORES)
+    start_hash, start_scores = board.zobr_hash, dict(board.scores)
+
+    for game in range(5):
+        played = 0
+        for ply in range(60):
+            moves = board.legal_moves()
+            if not moves or board.gameover:
+                break
+
+            # a simulated move (without commit) has to be taken back without a trace
+            board_hash, scores = board.zobr_hash, dict(board.scores)
+            board.move(random.choice(moves))
+            board.undo_move()
+            assert (board.zobr_hash, board.scores) == (board_hash, scores)
+
+            board.commit_move(random.choice(moves))
+            played += 1
+            assert board.zobr_hash == board.hash_zobrist()
+            assert board.scores == recounted_scores(board)
+
+            if not board.in_check and random.random() < 0.2:
+                board.make_null_move()
+                assert board.zobr_hash == board.hash_zobrist()
+                board.undo_move(commited=True)
+
+        for i in range(played):
+            board.undo_move(commited=True)
+            assert board.zobr_hash == board.hash_zobrist()
+            assert board.scores == recounted_scores(board)
+        assert (board.zobr_hash, board.scores) == (start_hash, start_scores)
+
+
+# the C position hashes a position with the same zobrist mask as the board
+@pytest.mark.parametrize("test", TEST_POSITIONS, ids=[test['fen'] for test in TEST_POSITIONS])
+def test_position_hash(test):
+    board = my_chess.Board()
+    board.load_FEN(test['fen'])
+    assert board.position().hash() == board.zobr_hash
+
+
+# the node counts of the debug positions, counted by the C position, and also by the python board for the smaller trees. the largest trees are left to perft.py, they take too long for a test run
+@pytest.mark.parametrize("test", [test for test in TEST_POSITIONS if test['nodes'] <= 10**7], ids=[test['fen'] for test in TEST_POSITIONS if test['nodes'] <= 10**7])
+def test_perft(test):
+    assert perft.run_perft(test['fen'], test['depth'], "c")[0] == test['nodes']
+    if test['nodes'] <= 3*10**5:
+        assert perft.run_perft(test['fen'], test['depth'], "board")[0] == test['nodes']
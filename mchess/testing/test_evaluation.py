@@ -0,0 +1,67 @@
+import csv
+import random
+
+import pytest
+
+import chess_v5 as my_chess
+import chess_bot_v4 as my_bot
+
+
+# static exchange values that can be counted by hand, with the piece values of the C extension (pawn 100, knight and bishop 300, rook 500, queen 900)
+SEE_CASES = [
+    # an undefended pawn
+    ("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1e5", 100),
+    # knight takes pawn, and the exchange on e5 goes on through all pieces behind each other
+    ("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3e5", -200),
+    ("4k3/8/8/3n4/4P3/8/8/4K3 w - - 0 1", "e4d5", 300),
+    # queen takes a pawn that a pawn defends
+    ("4k3/8/2p5/3p4/8/8/3Q4/4K3 w - - 0 1", "d2d5", -800),
+    # a quiet move to a square that a pawn attacks
+    ("4k3/8/2p5/8/8/8/3Q4/4K3 w - - 0 1", "d2d5", -900),
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", 100),
+    # promotions count the new piece, the king takes the queen on d8 but cant reach c8
+    ("4k3/3P4/8/8/8/8/8/4K3 w - - 0 1", "d7d8q", -100),
+    ("2r1k3/3P4/8/8/8/8/8/4K3 w - - 0 1", "d7c8q", 1300),
+    # the rooks behind each other on the d file join the exchange one after the other
+    ("3rk3/8/8/3r4/8/8/3R4/3RK3 w - - 0 1", "d2d5", 500),
+    ("3rk3/3r4/8/3p4/8/8/3R4/3RK3 w - - 0 1", "d2d5", -400),
+]
+
+
+@pytest.mark.parametrize("fen, uci, value", SEE_CASES)
+def test_static_exchange(fen, uci, value):
+    board = my_chess.Board()
+    board.load_FEN(fen)
+    move = board.uci2move(uci)
+    assert move in board.legal_moves()
+    assert board.static_exchange([move]) == [value]
+    assert board.position().see(move) == value
+
+
+# the batch evaluation gives the same numbers as rel_evaluate, for the puzzle positions (given as FEN strings) and for the positions of random games (given as boards)
+def test_evaluate_batch():
+    np = pytest.importorskip("numpy")
+    random.seed(3)
+
+    with open(my_bot.PUZZLES_FILE) as puzzles_file:
+        fens = [row['FEN'] for row in csv.DictReader(puzzles_file)]
+    board = my_chess.Board()
+    bot = my_bot.Chessbot(board)
+    expected = []
+    for fen in fens:
+        board.load_FEN(fen)
+        expected.append(bot.rel_evaluate())
+    squares, to_move = my_bot.encode_positions(fens)
+
+    for game in range(20):
+        board.new_game()
+        for ply in range(120):
+            moves = board.legal_moves()
+            if not moves or board.gameover:
+                break
+            board.commit_move(random.choice(moves))
+            expected.append(bot.rel_evaluate())
+            game_squares, game_to_move = my_bot.encode_positions([board])
+            squares, to_move = np.concatenate([squares, game_squares]), np.concatenate([to_move, game_to_move])
+
+    assert list(my_bot.evaluate_batch(squares, to_move)) == expected
@@ -0,0 +1,67 @@
+import json
+import random
+from collections import Counter
+
+import chess_v5 as my_chess
+import chess_bot_v4 as my_bot
+
+
+# a stream of (hash, move) with repeated pairs, built into a book with a small counting dict, so that the counts go through several run files and are added up again in the merge
+def test_build_and_lookup(tmp_path):
+    random.seed(5)
+    stream = [(random.randrange(1 << 64), random.randrange(1, 1 << 16)) for i in range(200)]
+    stream += random.choices(stream, k=800)
+    random.shuffle(stream)
+    path = tmp_path / "book.bin"
+    my_bot.build_opening_book(iter(stream), path, max_entries=16)
+
+    book = my_bot.OpeningBook(path)
+    counts = Counter(stream)
+    for zobr_hash in {zobr_hash for zobr_hash, move in stream}:
+        expected = sorted((move, weight) for (other_hash, move), weight in counts.items() if other_hash == zobr_hash)
+        assert book.lookup(zobr_hash) == expected
+        assert book.choose(zobr_hash) in [move for move, weight in expected]
+    assert book.lookup(12345) == []
+    assert book.choose(12345) is None
+    book.close()
+
+
+def test_empty_book(tmp_path):
+    path = tmp_path / "book.bin"
+    my_bot.build_opening_book(iter([]), path)
+    book = my_bot.OpeningBook(path)
+    assert book.lookup(0) == []
+    book.close()
+
+
+# two openings with the same first moves, read from a tsv file like the ones in rawdata/openings
+def test_book_from_openings(tmp_path):
+    tsv_path = tmp_path / "openings.tsv"
+    tsv_path.write_text("eco\tname\tpgn\tuci\n"
+        "C50\tItalian Game\t1. e4 e5 2. Nf3 Nc6 3. Bc4\te2e4 e7e5 g1f3 b8c6 f1c4\n"
+        "C60\tRuy Lopez\t1. e4 e5 2. Nf3 Nc6 3. Bb5\te2e4 e7e5 g1f3 b8c6 f1b5\n"
+        "A00\tPolish Opening\t1. b4\tb2b4\n")
+    path = tmp_path / "book.bin"
+    my_bot.build_opening_book(my_bot.opening_moves([tsv_path]), path)
+    book = my_bot.OpeningBook(path)
+
+    board = my_chess.Board()
+    board.new_game()
+    assert book.lookup(board.zobr_hash) == sorted([(board.uci2move("e2e4"), 2), (board.uci2move("b2b4"), 1)])
+    for uci in ["e2e4", "e7e5", "g1f3", "b8c6"]:
+        board.commit_move(board.uci2move(uci))
+    assert book.lookup(board.zobr_hash) == sorted([(board.uci2move("f1c4"), 1), (board.uci2move("f1b5"), 1)])
+    book.close()
+
+
+# the book file that comes with the bot has the same moves and weights as the json database it was converted from
+def test_shipped_book_matches_database():
+    with open(my_bot.OPENINGS_DATABASE_JSON) as json_file:
+        openings = json.load(json_file)
+    book = my_bot.shared_opening_book()
+    for key, moves in openings.items():
+        assert book.lookup(int(key)) == sorted(Counter(moves).items())
+
+    board = my_chess.Board()
+    board.new_game()
+    assert book.choose(board.zobr_hash) in board.legal_moves()
@@ -0,0 +1,136 @@
+import pytest
+
+import chess_v5 as my_chess
+import chess_bot_v4 as my_bot
+
+
+# a position where black is stalemated, loaded directly, so the board doesnt know it is game over
+STALEMATE_FEN = "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1"
+MIDDLEGAME_FEN = "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N2N2/PP2BPPP/R2QKB1R w KQ - 0 8"
+
+
+# a bot that can call the search functions directly, without going through iterative_deepening
+def prepared_bot(fen):
+    board = my_chess.Board()
+    board.load_FEN(fen)
+    bot = my_bot.Chessbot(board)
+    bot.nodes = 0
+    bot.root_ply = board.ply
+    bot.hard_stop = float('inf')
+    return bot
+
+
+# a table with a single bucket, so that all positions compete for the same 2 slots
+@pytest.fixture
+def table():
+    return my_bot.TranspositionTable(buckets=1)
+
+
+# every bound comes back with its depth, score and move, also for negative and fractional scores and for mate scores
+@pytest.mark.parametrize("bound", [my_bot.EXACT, my_bot.LOWER_BOUND, my_bot.UPPER_BOUND])
+@pytest.mark.parametrize("score", [0, 37.5, -412.25, 10**6+3, -(10**6+3)])
+def test_store_and_probe(bound, score):
+    table = my_bot.TranspositionTable(buckets=64)
+    table.store(123456789, 7, score, bound, 0x1234)
+    assert table.probe(123456789) == (7, score, bound, 0x1234)
+    assert table.probe(987654321) is None
+
+
+def test_shallower_entry_goes_to_second_slot(table):
+    table.store(1, 5, 10, my_bot.EXACT, 7)
+    table.store(2, 3, 20, my_bot.LOWER_BOUND, 8)
+    assert table.probe(1) == (5, 10, my_bot.EXACT, 7)
+    assert table.probe(2) == (3, 20, my_bot.LOWER_BOUND, 8)
+
+
+def test_replaced_entry_moves_to_second_slot(table):
+    table.store(1, 5, 10, my_bot.EXACT, 7)
+    table.store(2, 3, 20, my_bot.LOWER_BOUND, 8)
+    table.store(3, 9, 30, my_bot.UPPER_BOUND, 9)
+    assert table.probe(3) == (9, 30, my_bot.UPPER_BOUND, 9)
+    assert table.probe(1) == (5, 10, my_bot.EXACT, 7)
+    assert table.probe(2) is None
+
+
+# a deeper result of a position that also has an older, shallower copy in the second slot leaves no outdated bound behind
+def test_no_outdated_copy(table):
+    table.store(1, 5, 10, my_bot.EXACT, 7)
+    table.store(2, 2, -50, my_bot.UPPER_BOUND, 8)
+    table.store(2, 6, 40, my_bot.LOWER_BOUND, 9)
+    assert table.probe(2) == (6, 40, my_bot.LOWER_BOUND, 9)
+    assert table.probe(1) == (5, 10, my_bot.EXACT, 7)
+
+    # processes that share a table can also leave the same position in both slots, the store has to clear the second one
+    table.table[2], table.table[3] = table.table[0], table.table[1]
+    table.store(2, 8, 45, my_bot.EXACT, 9)
+    assert table.probe(2) == (8, 45, my_bot.EXACT, 9)
+    assert table.table[2] == table.table[3] == 0
+
+
+# an entry of an older search is replaced even by a shallower one
+def test_old_entry_is_replaced(table):
+    table.store(1, 9, 10, my_bot.EXACT, 7)
+    table.new_search()
+    table.store(2, 1, 20, my_bot.EXACT, 8)
+    assert table.probe(2) == (1, 20, my_bot.EXACT, 8)
+    assert table.probe(1) == (9, 10, my_bot.EXACT, 7)
+
+
+# the bounds of the table end the search only where they are outside the window
+def test_search_uses_bounds():
+    bot = prepared_bot(MIDDLEGAME_FEN)
+    zobr_hash = bot.board.zobr_hash
+    bot.transpositions.store(zobr_hash, 10, 500, my_bot.LOWER_BOUND, None)
+    assert bot.recursive_search(2, -100, 100) == (100, None)
+    bot.transpositions.store(zobr_hash, 10, -500, my_bot.UPPER_BOUND, None)
+    assert bot.recursive_search(2, -100, 100) == (-100, None)
+    bot.transpositions.store(zobr_hash, 1, 500, my_bot.LOWER_BOUND, None)
+    assert bot.recursive_search(2, -100, 100)[1] is not None
+
+
+# a stalemate that the board doesnt know about leaves alpha at the infinite bound, which must not be stored
+def test_infinite_alpha_is_not_stored():
+    bot = prepared_bot(STALEMATE_FEN)
+    assert bot.recursive_search(2, my_bot.ALPHA_INITIAL, my_bot.BETA_INITIAL) == (my_bot.ALPHA_INITIAL, None)
+    assert bot.transpositions.probe(bot.board.zobr_hash) is None
+
+
+# a root that is already drawn by repetition gives back a score without a move inside any window, which must end the aspiration search and the iterative deepening
+def test_drawn_root_ends_search():
+    board = my_chess.Board()
+    board.new_game()
+    for uci in ["g1f3", "g8f6", "f3g1", "f6g8"] * 2:
+        board.commit_move(board.uci2move(uci))
+    assert board.gameover == (0.5, "draw_threefold")
+    bot = my_bot.Chessbot(board)
+    assert bot.iterative_deepening(10, 20) == (1, 0, None)
+
+
+# the move picker gives out every legal move exactly once, the move from the table first
+def test_pick_moves():
+    bot = prepared_bot(MIDDLEGAME_FEN)
+    legal = bot.board.legal_moves()
+    for start_move in [None, legal[0], legal[-1], my_chess.pack_move(0, 63)]:
+        picked = list(bot.pick_moves(start_move, 0))
+        assert sorted(picked) == sorted(legal)
+        if start_move in legal:
+            assert picked[0] == start_move
+
+
+# only quiet moves become killers and countermoves, a capture only counts in the history
+def test_cutoff_keeps_quiet_killers():
+    bot = prepared_bot(MIDDLEGAME_FEN)
+    quiet = bot.board.uci2move("a2a3")
+    capture = bot.board.uci2move("c4d5")
+    bot.update_cutoff(quiet, 0, 4)
+    bot.update_cutoff(capture, 0, 4)
+    assert list(bot.killers[0:2]) == [quiet, 0]
+    assert bot.history[capture & 4095] == 16
+
+
+def test_order_moves_start_move_once():
+    bot = prepared_bot(MIDDLEGAME_FEN)
+    legal = bot.board.legal_moves()
+    ordered = bot.order_moves(legal, legal[5])
+    assert ordered[0] == legal[5]
+    assert sorted(ordered) == sorted(legal)